@@ -8,6 +8,8 @@ import os
 from flask import Flask
 from models import db, User, Trade, TradeAnalysis, TradingJournal, UserSettings
 from config import Config
+from migrations import upgrade_schema
+from database import init_db
 
 def create_app(config_class=Config):
     """Create and configure the Flask application"""
@@ -15,7 +17,7 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     
     # Initialize extensions
-    db.init_app(app)
+    init_db(app)
     
     # Initialize upload folder
     Config.init_app(app)
@@ -25,8 +27,8 @@ def create_app(config_class=Config):
 def init_database(app):
     """Initialize the database with tables"""
     with app.app_context():
-        # Create all tables
-        db.create_all()
+        # Create all tables (and add columns introduced since the database was created)
+        upgrade_schema()
         print("Database tables created successfully!")
         
         # Check if admin user exists, create if not
@@ -39,22 +41,17 @@ def init_database(app):
             admin_user.set_password('admin123')  # Change this password!
             admin_user.account_size = 10000.0  # $10,000 account
             
+            # Default settings for the admin user, saved with the user in one commit
+            admin_user.settings = UserSettings(
+                auto_analyze_trades=True,
+                analysis_detail_level='detailed',
+                default_risk_percent=2.0
+            )
             db.session.add(admin_user)
             
             try:
-                # Commit the user first to get the ID
                 db.session.commit()
                 print("Admin user created! Username: admin, Password: admin123")
-                
-                # Now create default settings for admin user using the committed user's ID
-                settings = UserSettings(
-                    user_id=admin_user.id,
-                    auto_analyze_trades=True,
-                    analysis_detail_level='detailed',
-                    default_risk_percent=2.0
-                )
-                db.session.add(settings)
-                db.session.commit()
                 print("Admin user settings created successfully!")
                 print("Please change the admin password after first login!")
                 
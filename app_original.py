@@ -1,22 +1,41 @@
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify
+from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from config import Config
 from models import db, User, Trade, TradeAnalysis, TradingJournal, UserSettings
 from forms import (LoginForm, RegistrationForm, TradeForm, QuickTradeForm, 
                    JournalForm, EditTradeForm, UserSettingsForm, BulkAnalysisForm)
 from ai_analysis import TradingAIAnalyzer
+from marking import (PositionMarker, get_users_with_open_trades, get_last_marked_at,
+                     record_position_marks, get_mark_history)
+from database import init_db, reads_from_replica, get_pool_stats
+from migrations import upgrade_schema, check_index_usage
+from rollups import rebuild_rollups, get_rollups, get_rollup_summary
+from pagination import paginate_trades, paginate_journals, InvalidCursor, DEFAULT_PER_PAGE
+from trade_import import import_trades_csv, DEFAULT_CHUNK_SIZE as DEFAULT_IMPORT_CHUNK_SIZE
+from trade_export import stream_export, check_format, ExportFormatError, EXPORT_FORMATS
+from market_data import (tradier_client, single_flight, fetch_quotes, chain_cache, expirations_cache,
+                         chain_price_index, chain_iv_index, occ_symbol, get_cache_stats, get_http_stats)
+from pricing import bs_price, bs_greeks, implied_volatility
+from lattice import american_price, american_greeks, DEFAULT_STEPS
+from portfolio import portfolio_greeks, get_betas
+from scenarios import (build_surface, surface_to_columnar, surface_to_npz, strategy_from_json, days_until, price_axis,
+                       DEFAULT_PRICE_POINTS, DEFAULT_DAY_POINTS, DEFAULT_PRICE_RANGE, DEFAULT_RATE, FALLBACK_VOL,
+                       DEFAULT_LATTICE_STEPS, MAX_LATTICE_STEPS)
+from strategies import MODELS
+from vol_surface import vol_surfaces, surface_marks, MAX_GRID_STRIKES, MAX_GRID_DAYS
 from datetime import datetime, timedelta, date
 import pandas as pd
 import plotly.graph_objs as go
 import plotly.utils
+import io
 import json
 import os
 import secrets
-import requests
 import yfinance as yf
 import numpy as np
-from scipy.stats import norm
 import math
+import time
+import click
 from werkzeug.utils import secure_filename
 
 # Load environment variables from .env file
@@ -35,7 +54,7 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 # Initialize extensions
-db.init_app(app)
+init_db(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -56,118 +75,81 @@ TRADIER_TOKEN = "fImjhesSMVWnq15UN5PWUvARApRX"  # Your actual token
 print(f"Tradier token configured: {'Yes' if TRADIER_TOKEN != 'your_tradier_token_here' else 'No'}")
 print(f"Using Tradier API endpoint: {TRADIER_API_BASE}")
 
+# Every Tradier call goes through the shared pooled client
+tradier_client.token = TRADIER_TOKEN
+tradier_client.base_url = TRADIER_API_BASE
+
 def get_tradier_headers():
     """Get headers for Tradier API requests"""
-    if TRADIER_TOKEN == 'your_tradier_token_here' or not TRADIER_TOKEN:
-        return None  # Token not configured
+    return tradier_client.get_headers()  # None if token not configured
+
+def get_option_expirations_tradier(symbol, max_age=None):
+    """Get available option expiration dates (cached longer than chains, they change at most daily)"""
+    expirations = expirations_cache.get(symbol, max_age)
+    if expirations is not None:
+        return expirations
     
-    return {
-        'Authorization': f'Bearer {TRADIER_TOKEN}',
-        'Accept': 'application/json'
-    }
+    headers = get_tradier_headers()
+    if not headers:
+        print("Tradier API token not configured, skipping Tradier API call")
+        return None
+    
+    # Concurrent requests for the same symbol share one in-flight fetch
+    return single_flight.do(('expirations', symbol), _fetch_option_expirations_tradier, symbol)
+
+def _fetch_option_expirations_tradier(symbol):
+    """Fetch expiration dates from Tradier and store them in the expirations cache"""
+    print(f"Getting expirations for {symbol}")
+    exp_response = tradier_client.get('/markets/options/expirations', params={'symbol': symbol})
+    
+    print(f"Expiration response status: {exp_response.status_code}")
+    if exp_response.status_code != 200:
+        print(f"Error getting expirations for {symbol}: {exp_response.status_code}")
+        print(f"Response content: {exp_response.text[:500]}")
+        return None
+    
+    exp_data = exp_response.json()
+    if 'expirations' not in exp_data or not exp_data['expirations']:
+        print(f"No expirations found for {symbol}")
+        print(f"Response: {exp_data}")
+        return None
+        
+    expirations = exp_data['expirations']['date']
+    if isinstance(expirations, str):
+        expirations = [expirations]
+    expirations = list(expirations)
+    
+    print(f"Found {len(expirations)} expiration dates for {symbol}: {expirations[:3]}...")
+    expirations_cache.set(symbol, expirations)
+    return expirations
 
-def get_options_chain_tradier(symbol, expiration_date=None):
-    """Get options chain data using Tradier API"""
+def get_options_chain_tradier(symbol, expiration_date=None, max_age=None):
+    """
+    Get options chain data using Tradier API
+    
+    Parsed chains are cached per (symbol, expiration) for CHAIN_CACHE_TTL seconds;
+    pass max_age to require data no older than that many seconds. The returned
+    DataFrames are shared with the cache and must not be modified in place.
+    """
     try:
         headers = get_tradier_headers()
         if not headers:
             print("Tradier API token not configured, skipping Tradier API call")
             return None, None, None, None
 
-        print(f"Fetching options data for {symbol} using Tradier API...")
-        
-        # First get available expiration dates
-        exp_url = f"{TRADIER_API_BASE}/markets/options/expirations"
-        exp_params = {'symbol': symbol}
-        
-        print(f"Getting expirations from: {exp_url}")
-        exp_response = requests.get(exp_url, params=exp_params, headers=headers)
-        
-        print(f"Expiration response status: {exp_response.status_code}")
-        if exp_response.status_code != 200:
-            print(f"Error getting expirations for {symbol}: {exp_response.status_code}")
-            print(f"Response content: {exp_response.text[:500]}")
+        expirations = get_option_expirations_tradier(symbol)
+        if not expirations:
             return None, None, None, None
         
-        exp_data = exp_response.json()
-        print(f"Expiration data keys: {list(exp_data.keys()) if exp_data else 'None'}")
-        
-        if 'expirations' not in exp_data or not exp_data['expirations']:
-            print(f"No expirations found for {symbol}")
-            print(f"Response: {exp_data}")
-            return None, None, None, None
-            
-        expirations = exp_data['expirations']['date']
-        if isinstance(expirations, str):
-            expirations = [expirations]
-        
-        print(f"Found {len(expirations)} expiration dates for {symbol}: {expirations[:3]}...")
-        
         # Use provided expiration or first available
         target_date = expiration_date if expiration_date and expiration_date in expirations else expirations[0]
-        print(f"Using expiration date: {target_date}")
-        
-        # Get options chain for the target date
-        chain_url = f"{TRADIER_API_BASE}/markets/options/chains"
-        chain_params = {
-            'symbol': symbol,
-            'expiration': target_date
-        }
-        
-        print(f"Getting options chain from: {chain_url} with params: {chain_params}")
-        chain_response = requests.get(chain_url, params=chain_params, headers=headers)
         
-        print(f"Options chain response status: {chain_response.status_code}")
-        if chain_response.status_code != 200:
-            print(f"Error getting options chain for {symbol}: {chain_response.status_code}")
-            print(f"Response content: {chain_response.text[:500]}")
+        chain = get_option_chain_frames(symbol, target_date, max_age)
+        if chain is None:
             return None, None, None, None
         
-        chain_data = chain_response.json()
-        print(f"Chain data keys: {list(chain_data.keys()) if chain_data else 'None'}")
-        
-        if 'options' not in chain_data or not chain_data['options']:
-            print(f"No options data for {symbol} on {target_date}")
-            print(f"Response: {chain_data}")
-            return None, None, None, None
-        
-        options = chain_data['options']['option']
-        if not isinstance(options, list):
-            options = [options]
-        
-        print(f"Found {len(options)} options for {symbol}")
-        
-        # Separate calls and puts
-        calls_data = []
-        puts_data = []
-        
-        for option in options:
-            option_data = {
-                'strike': float(option['strike']),
-                'last': float(option.get('last', 0)) if option.get('last') else 0,
-                'bid': float(option.get('bid', 0)) if option.get('bid') else 0,
-                'ask': float(option.get('ask', 0)) if option.get('ask') else 0,
-                'volume': int(option.get('volume', 0)) if option.get('volume') else 0,
-                'open_interest': int(option.get('open_interest', 0)) if option.get('open_interest') else 0,
-                'implied_volatility': float(option.get('greeks', {}).get('mid_iv', 0)) if option.get('greeks') else 0
-            }
-            
-            if option['option_type'] == 'call':
-                calls_data.append(option_data)
-            else:
-                puts_data.append(option_data)
-        
-        print(f"Processed {len(calls_data)} calls and {len(puts_data)} puts")
-        
-        # Convert to DataFrames for compatibility
-        calls_df = pd.DataFrame(calls_data) if calls_data else pd.DataFrame()
-        puts_df = pd.DataFrame(puts_data) if puts_data else pd.DataFrame()
-        
-        # Get current stock price
-        current_price = get_stock_price_tradier(symbol)
-        print(f"Current price for {symbol}: {current_price}")
-        
-        return calls_df, puts_df, current_price, expirations
+        calls_df, puts_df = chain
+        return calls_df, puts_df, get_stock_price_tradier(symbol), expirations
         
     except Exception as e:
         print(f"Error fetching options data from Tradier for {symbol}: {e}")
@@ -175,52 +157,218 @@ def get_options_chain_tradier(symbol, expiration_date=None):
         traceback.print_exc()
         return None, None, None, None
 
-def get_stock_price_tradier(symbol):
-    """Get current stock price using Tradier API"""
-    try:
-        headers = get_tradier_headers()
-        if not headers:
-            print("No Tradier headers available")
-            return None
-            
-        url = f"{TRADIER_API_BASE}/markets/quotes"
-        params = {'symbols': symbol}
-        
-        print(f"Getting stock price for {symbol} from: {url}")
-        response = requests.get(url, params=params, headers=headers)
-        
-        print(f"Stock price response status: {response.status_code}")
-        if response.status_code != 200:
-            print(f"Error getting stock price: {response.text[:500]}")
-            return None
-        
-        data = response.json()
-        print(f"Stock price data keys: {list(data.keys()) if data else 'None'}")
-        
-        if 'quotes' in data and 'quote' in data['quotes']:
-            quote = data['quotes']['quote']
-            if isinstance(quote, list):
-                quote = quote[0]
-            price = float(quote.get('last', 0))
-            print(f"Extracted price for {symbol}: {price}")
-            return price
-        
-        print(f"No valid price data in response: {data}")
+def get_option_chain_frames(symbol, expiration_date, max_age=None):
+    """
+    (calls_df, puts_df) for one exact expiration ('YYYY-MM-DD'), or None
+    
+    Unlike get_options_chain_tradier this skips the expirations lookup and the
+    underlying quote, for callers that already know the contract they want.
+    """
+    chain = chain_cache.get((symbol, expiration_date), max_age)
+    if chain is None and tradier_client.is_configured():
+        # Concurrent requests for the same chain share one in-flight fetch
+        chain = single_flight.do(('chain', symbol, expiration_date),
+                                 _fetch_options_chain_tradier, symbol, expiration_date)
+    return chain
+
+def _fetch_options_chain_tradier(symbol, target_date):
+    """Fetch and parse one expiration's chain, store it in the chain cache and return (calls_df, puts_df)"""
+    print(f"Fetching options data for {symbol} {target_date} using Tradier API...")
+    
+    # Get options chain for the target date
+    chain_params = {
+        'symbol': symbol,
+        'expiration': target_date
+    }
+    
+    print(f"Getting options chain with params: {chain_params}")
+    chain_response = tradier_client.get('/markets/options/chains', params=chain_params)
+    
+    print(f"Options chain response status: {chain_response.status_code}")
+    if chain_response.status_code != 200:
+        print(f"Error getting options chain for {symbol}: {chain_response.status_code}")
+        print(f"Response content: {chain_response.text[:500]}")
+        return None
+    
+    chain_data = chain_response.json()
+    
+    if 'options' not in chain_data or not chain_data['options']:
+        print(f"No options data for {symbol} on {target_date}")
+        print(f"Response: {chain_data}")
         return None
+    
+    options = chain_data['options']['option']
+    if not isinstance(options, list):
+        options = [options]
+    
+    print(f"Found {len(options)} options for {symbol}")
+    
+    # Separate calls and puts
+    calls_data = []
+    puts_data = []
+    
+    for option in options:
+        option_data = {
+            'strike': float(option['strike']),
+            'last': float(option.get('last', 0)) if option.get('last') else 0,
+            'bid': float(option.get('bid', 0)) if option.get('bid') else 0,
+            'ask': float(option.get('ask', 0)) if option.get('ask') else 0,
+            'volume': int(option.get('volume', 0)) if option.get('volume') else 0,
+            'open_interest': int(option.get('open_interest', 0)) if option.get('open_interest') else 0,
+            'implied_volatility': float(option.get('greeks', {}).get('mid_iv', 0)) if option.get('greeks') else 0
+        }
         
-    except Exception as e:
-        print(f"Error getting stock price from Tradier for {symbol}: {e}")
-        import traceback
-        traceback.print_exc()
+        if option['option_type'] == 'call':
+            calls_data.append(option_data)
+        else:
+            puts_data.append(option_data)
+    
+    print(f"Processed {len(calls_data)} calls and {len(puts_data)} puts")
+    
+    # Convert to DataFrames for compatibility
+    calls_df = pd.DataFrame(calls_data) if calls_data else pd.DataFrame()
+    puts_df = pd.DataFrame(puts_data) if puts_data else pd.DataFrame()
+    
+    # Get current stock price
+    current_price = get_stock_price_tradier(symbol)
+    print(f"Current price for {symbol}: {current_price}")
+    
+    # Solve our own IV for every contract in one batched pass
+    if current_price:
+        add_calculated_iv(calls_df, current_price, target_date, 'call')
+        add_calculated_iv(puts_df, current_price, target_date, 'put')
+    
+    chain_cache.set((symbol, target_date), (calls_df, puts_df))
+    
+    # Refit this expiration's smile; the symbol's other expirations keep their fits
+    if current_price:
+        vol_surfaces.update(symbol, target_date, calls_df, puts_df, current_price)
+    return calls_df, puts_df
+
+def build_vol_surface(symbol, max_expirations=None):
+    """
+    Fitted IV surface for a symbol across its nearest expirations, or None
+    
+    Chains come through the chain cache, so only expirations whose chain is
+    missing or stale are fetched (and refitted as they arrive); cached chains
+    are fitted only if their smile isn't already on the surface.
+    """
+    expirations = get_option_expirations_tradier(symbol)
+    if not expirations:
+        return vol_surfaces.get(symbol)
+    
+    current_price = None
+    for expiration in expirations[:max_expirations or Config.VOL_SURFACE_MAX_EXPIRATIONS]:
+        try:
+            chain = get_option_chain_frames(symbol, expiration)
+        except Exception as e:
+            print(f"Error fetching options chain for {symbol} {expiration}: {e}")
+            continue
+        if chain is None:
+            continue
+        current_price = current_price or get_quotes_tradier([symbol]).get(symbol)
+        if current_price:
+            vol_surfaces.update(symbol, expiration, chain[0], chain[1], current_price)
+    return vol_surfaces.get(symbol)
+
+def add_calculated_iv(options_df, underlying_price, expiration_date, option_type, risk_free_rate=0.05):
+    """Add a 'calculated_iv' column (percent, NaN where unsolvable) solved from bid/ask mid or last"""
+    if options_df is None or options_df.empty:
+        return options_df
+    
+    days_to_exp = (datetime.strptime(expiration_date, '%Y-%m-%d').date() - date.today()).days
+    mid = (options_df['bid'] + options_df['ask']) / 2
+    market_price = mid.where((options_df['bid'] > 0) & (options_df['ask'] > 0), options_df['last'])
+    
+    result = implied_volatility(market_price.to_numpy(), underlying_price, options_df['strike'].to_numpy(),
+                                days_to_exp / 365.0, risk_free_rate, option_type)
+    options_df['calculated_iv'] = np.round(result.iv * 100, 2)
+    return options_df
+
+def get_stock_price_tradier(symbol):
+    """Get current stock price using Tradier API (served from the shared quote cache when fresh)"""
+    headers = get_tradier_headers()
+    if not headers:
+        print("No Tradier headers available")
         return None
+    
+    price = get_quotes_tradier([symbol]).get(symbol)
+    if price is None:
+        print(f"No valid price data for {symbol}")
+    return price
+
+def get_quotes_tradier(symbols):
+    """Get current prices for many stock and OCC option symbols in batched Tradier requests"""
+    return fetch_quotes(symbols)
 
-def get_options_chain(symbol, expiration_date=None):
+def _iter_leg_chains(trades):
+    """
+    Yield (symbol, expiration, legs, chain) for every (symbol, expiration) the trades hold
+    
+    legs is the set of (option_type, strike) on that expiration and chain the
+    cached (calls_df, puts_df), fetched once per group, or None if unavailable.
+    """
+    groups = {}
+    for trade in trades:
+        for option_type, strike in trade.get_option_legs():
+            groups.setdefault((trade.symbol, trade.expiration_date), set()).add((option_type, strike))
+    
+    for (symbol, expiration), legs in groups.items():
+        chain = None
+        try:
+            chain = get_option_chain_frames(symbol, expiration.strftime('%Y-%m-%d'))
+        except Exception as e:
+            print(f"Error fetching options chain for {symbol} {expiration}: {e}")
+        yield symbol, expiration, legs, chain
+
+def get_option_leg_quotes(trades, underlying_prices=None):
+    """
+    Prices for every option leg of the given trades, keyed by OCC symbol
+    
+    Legs are grouped by (symbol, expiration) so each chain is fetched once and
+    every position on it is priced from a strike index. Legs missing from
+    their chain (e.g. expired or unlisted) are quoted individually in one batch.
+    Legs nobody quotes (no last trade, bid or ask) are marked off the symbol's
+    fitted IV surface when underlying_prices (symbol -> price) is given.
+    """
+    prices = {}
+    unpriced = []
+    for symbol, expiration, legs, chain in _iter_leg_chains(trades):
+        index = {'call': chain_price_index(chain[0]), 'put': chain_price_index(chain[1])} if chain else None
+        
+        for option_type, strike in legs:
+            contract = occ_symbol(symbol, expiration, option_type, strike)
+            price = index[option_type].get(round(strike, 3)) if index else None
+            if price:
+                prices[contract] = price
+            else:
+                unpriced.append((contract, symbol, expiration, option_type, strike))
+    
+    if unpriced:
+        prices.update(get_quotes_tradier(leg[0] for leg in unpriced))
+        unquoted = [leg for leg in unpriced if not prices.get(leg[0])]
+        if unquoted and underlying_prices:
+            prices.update(surface_marks(unquoted, underlying_prices))
+    return prices
+
+def get_option_leg_vols(trades):
+    """Chain implied volatility (decimal) for every option leg of the given trades, keyed by OCC symbol"""
+    vols = {}
+    for symbol, expiration, legs, chain in _iter_leg_chains(trades):
+        if not chain:
+            continue
+        index = {'call': chain_iv_index(chain[0]), 'put': chain_iv_index(chain[1])}
+        for option_type, strike in legs:
+            iv = index[option_type].get(round(strike, 3))
+            if iv:
+                vols[occ_symbol(symbol, expiration, option_type, strike)] = iv
+    return vols
+
+def get_options_chain(symbol, expiration_date=None, max_age=None):
     """Get options chain data using Tradier API only (no Yahoo Finance fallback)"""
     try:
-        print(f"Getting options chain for {symbol} using Tradier API only...")
-        
         # Use Tradier API only
-        calls, puts, current_price, expirations = get_options_chain_tradier(symbol, expiration_date)
+        calls, puts, current_price, expirations = get_options_chain_tradier(symbol, expiration_date, max_age)
         
         if calls is not None and puts is not None:
             print(f"Successfully retrieved options data for {symbol}")
@@ -235,56 +383,51 @@ def get_options_chain(symbol, expiration_date=None):
         traceback.print_exc()
         return None, None, None
 
-def black_scholes(S, K, T, r, sigma, option_type='call'):
+def black_scholes(S, K, T, r, sigma, option_type='call', q=0.0):
     """Calculate Black-Scholes option price"""
     try:
-        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-        d2 = d1 - sigma * np.sqrt(T)
-        
-        if option_type == 'call':
-            price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-        else:  # put
-            price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-        
-        return max(price, 0)
-    except:
+        return float(bs_price(S, K, T, r, sigma, option_type, q))
+    except Exception:
         return 0
 
-def calculate_greeks(S, K, T, r, sigma, option_type='call'):
+def calculate_greeks(S, K, T, r, sigma, option_type='call', q=0.0):
     """Calculate option Greeks"""
     try:
-        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-        d2 = d1 - sigma * np.sqrt(T)
-        
-        # Delta
-        if option_type == 'call':
-            delta = norm.cdf(d1)
-        else:
-            delta = norm.cdf(d1) - 1
-        
-        # Gamma
-        gamma = norm.pdf(d1) / (S * sigma * np.sqrt(T))
-        
-        # Theta
-        if option_type == 'call':
-            theta = (-(S * norm.pdf(d1) * sigma) / (2 * np.sqrt(T)) 
-                    - r * K * np.exp(-r * T) * norm.cdf(d2)) / 365
-        else:
-            theta = (-(S * norm.pdf(d1) * sigma) / (2 * np.sqrt(T)) 
-                    + r * K * np.exp(-r * T) * norm.cdf(-d2)) / 365
-        
-        # Vega
-        vega = S * norm.pdf(d1) * np.sqrt(T) / 100
-        
-        return {
-            'delta': round(delta, 4),
-            'gamma': round(gamma, 4),
-            'theta': round(theta, 4),
-            'vega': round(vega, 4)
-        }
-    except:
+        greeks = bs_greeks(S, K, T, r, sigma, option_type, q)
+        return {name: round(float(greeks[name]), 4) for name in ('delta', 'gamma', 'theta', 'vega')}
+    except Exception:
         return {'delta': 0, 'gamma': 0, 'theta': 0, 'vega': 0}
 
+def calculate_american(S, K, T, r, sigma, option_type='call', q=0.0, steps=DEFAULT_STEPS, method='binomial'):
+    """
+    American price, Greeks and early-exercise boundary from a lattice
+    
+    Raises:
+        LatticeError: Unknown method or steps out of range
+    """
+    result = american_price(S, K, T, r, sigma, option_type, q, steps, method, boundary=True)
+    greeks = american_greeks(S, K, T, r, sigma, option_type, q, steps, method)
+    price = float(result.price)
+    european = black_scholes(S, K, T, r, sigma, option_type, q)
+    
+    # Boundary as (days remaining, critical stock price) for the steps where early exercise pays
+    exercisable = np.isfinite(result.boundary)
+    days_remaining = (T - result.boundary_times[exercisable]) * 365.0
+    return {
+        'success': True,
+        'model': 'american',
+        'method': method,
+        'steps': steps,
+        'price': round(price, 4),
+        'european_price': round(european, 4),
+        'early_exercise_premium': round(price - european, 4),
+        'greeks': {name: round(float(greeks[name]), 4) for name in ('delta', 'gamma', 'theta', 'vega')},
+        'exercise_boundary': {
+            'days_remaining': np.round(days_remaining, 2).tolist(),
+            'stock_price': np.round(result.boundary[exercisable], 2).tolist()
+        }
+    }
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
@@ -378,15 +521,10 @@ def dashboard():
                              stats=stats,
                              recent_journals=None,
                              today_journal=None)
-    # Authenticated user: show real data
-    update_open_positions_pnl(current_user.id)
+    # Authenticated user: show real data (open P&L comes from the background marker)
+    position_marker.touch(current_user.id)
     recent_trades = current_user.get_recent_trades(10)
-    stats = {
-        'total_trades': Trade.query.filter_by(user_id=current_user.id).count(),
-        'win_rate': current_user.get_win_rate(),
-        'total_pnl': current_user.get_total_pnl(),
-        'trades_analyzed': Trade.query.filter_by(user_id=current_user.id, is_analyzed=True).count()
-    }
+    stats = current_user.get_trade_stats()
     recent_journals = TradingJournal.query.filter_by(user_id=current_user.id)\
                                          .order_by(TradingJournal.journal_date.desc())\
                                          .limit(5).all()
@@ -398,7 +536,8 @@ def dashboard():
                          recent_trades=recent_trades,
                          stats=stats,
                          recent_journals=recent_journals,
-                         today_journal=today_journal)
+                         today_journal=today_journal,
+                         marked_at=get_last_marked_at(current_user.id))
 
 def update_open_positions_pnl(user_id):
     """Update P&L for all open positions using current market prices"""
@@ -406,6 +545,12 @@ def update_open_positions_pnl(user_id):
                             .filter(Trade.exit_price.is_(None))\
                             .all()
     
+    # One batched quote request for the underlyings, then one chain per (symbol, expiration) for the option legs
+    quotes = get_quotes_tradier(trade.symbol for trade in open_trades)
+    quotes.update(get_option_leg_quotes(open_trades, quotes))
+    underlying_prices = {trade.id: quotes.get(trade.symbol) for trade in open_trades}
+    option_prices = {}  # trade id -> contract (or spread) price, for the mark history
+    
     for trade in open_trades:
         try:
             # Check if trade was entered recently (within last 2 hours)
@@ -413,8 +558,8 @@ def update_open_positions_pnl(user_id):
             is_recent_trade = time_since_entry.total_seconds() < 7200  # 2 hours
             
             if trade.is_option_trade():
-                # For options, get current stock price first to check underlying movement
-                current_stock_price = get_stock_price_tradier(trade.symbol)
+                # For options, check underlying movement first
+                current_stock_price = quotes.get(trade.symbol)
                 
                 # Check underlying stock price movement
                 if trade.underlying_price_at_entry and current_stock_price:
@@ -428,60 +573,34 @@ def update_open_positions_pnl(user_id):
                         print(f"Setting options P&L to zero for {trade.symbol}: {'Recent trade' if is_recent_trade else f'Stock movement only {stock_change_percent*100:.1f}%'}")
                         continue
                 
+                if trade.is_spread_trade():
+                    # Both legs were quoted in the batch above
+                    option_prices[trade.id] = trade.get_current_market_price(quotes)
+                    trade.calculate_unrealized_pnl(quotes)
+                    continue
+                
                 # Only calculate option P&L if stock has moved significantly
-                if trade.expiration_date:
-                    exp_date_str = trade.expiration_date.strftime('%Y-%m-%d')
-                    calls, puts, current_stock_price = get_options_chain(trade.symbol, exp_date_str)
+                current_option_price = quotes.get(trade.get_quote_symbol())
+                
+                # Calculate P&L only when we have significant stock movement
+                if current_option_price and current_option_price > 0:
+                    option_prices[trade.id] = current_option_price
+                    unrealized_pnl = (current_option_price - trade.entry_price) * trade.quantity * 100
+                    cost_basis = trade.entry_price * trade.quantity * 100
+                    unrealized_pnl_percent = (unrealized_pnl / cost_basis) * 100 if cost_basis > 0 else 0
                     
-                    current_option_price = None
-                    if calls is not None and puts is not None and trade.strike_price:
-                        # Find the specific option in the chain
-                        if trade.trade_type == 'option_call' and hasattr(calls, 'empty') and not calls.empty:
-                            matching_option = calls[calls['strike'] == trade.strike_price]
-                            if not matching_option.empty:
-                                row = matching_option.iloc[0]
-                                # Use last price if available, otherwise use midpoint of bid/ask
-                                current_option_price = row.get('last', 0)
-                                if not current_option_price or current_option_price <= 0:
-                                    bid = row.get('bid', 0)
-                                    ask = row.get('ask', 0)
-                                    if bid > 0 and ask > 0:
-                                        current_option_price = (bid + ask) / 2
-                        
-                        elif trade.trade_type == 'option_put' and hasattr(puts, 'empty') and not puts.empty:
-                            matching_option = puts[puts['strike'] == trade.strike_price]
-                            if not matching_option.empty:
-                                row = matching_option.iloc[0]
-                                # Use last price if available, otherwise use midpoint of bid/ask
-                                current_option_price = row.get('last', 0)
-                                if not current_option_price or current_option_price <= 0:
-                                    bid = row.get('bid', 0)
-                                    ask = row.get('ask', 0)
-                                    if bid > 0 and ask > 0:
-                                        current_option_price = (bid + ask) / 2
+                    trade.profit_loss = unrealized_pnl
+                    trade.profit_loss_percent = unrealized_pnl_percent
                     
-                    # Calculate P&L only when we have significant stock movement
-                    if current_option_price and current_option_price > 0:
-                        unrealized_pnl = (current_option_price - trade.entry_price) * trade.quantity * 100
-                        cost_basis = trade.entry_price * trade.quantity * 100
-                        unrealized_pnl_percent = (unrealized_pnl / cost_basis) * 100 if cost_basis > 0 else 0
-                        
-                        trade.profit_loss = unrealized_pnl
-                        trade.profit_loss_percent = unrealized_pnl_percent
-                        
-                        print(f"Updated option P&L for {trade.symbol}: Stock moved from ${trade.underlying_price_at_entry} to ${current_stock_price}, Option P&L=${unrealized_pnl:.2f}")
-                    else:
-                        # No current option price available, keep P&L at 0
-                        trade.profit_loss = 0.0
-                        trade.profit_loss_percent = 0.0
-                        print(f"No current option price for {trade.symbol} ${trade.strike_price} {trade.trade_type}")
+                    print(f"Updated option P&L for {trade.symbol}: Stock moved from ${trade.underlying_price_at_entry} to ${current_stock_price}, Option P&L=${unrealized_pnl:.2f}")
                 else:
-                    # No expiration date, can't get options chain
+                    # No current option price available, keep P&L at 0
                     trade.profit_loss = 0.0
                     trade.profit_loss_percent = 0.0
+                    print(f"No current option price for {trade.symbol} ${trade.strike_price} {trade.trade_type}")
             else:
-                # For stocks, get current stock price
-                current_stock_price = get_stock_price_tradier(trade.symbol)
+                # For stocks, use the batched quote
+                current_stock_price = quotes.get(trade.symbol)
                 if current_stock_price and current_stock_price != trade.entry_price:
                     price_difference = abs(current_stock_price - trade.entry_price)
                     price_change_percent = price_difference / trade.entry_price if trade.entry_price > 0 else 0
@@ -518,103 +637,97 @@ def update_open_positions_pnl(user_id):
             trade.profit_loss = 0.0
             trade.profit_loss_percent = 0.0
     
-    # Save all updates
+    marked_at = datetime.utcnow()
+    for trade in open_trades:
+        trade.marked_at = marked_at
+    
+    # Save all updates (P&L and the changed marks' history rows go in one commit)
     try:
+        record_position_marks(open_trades, underlying_prices, option_prices, marked_at)
         db.session.commit()
     except Exception as e:
         print(f"Error saving P&L updates: {e}")
         db.session.rollback()
 
+# Open positions are re-marked out of band; page views only read the stored marks. The marking
+# thread is never started on import (every gunicorn worker and CLI command imports this module):
+# deployments run `mark-positions --loop` as one process, the dev server starts it below.
+position_marker = PositionMarker(app, update_open_positions_pnl,
+                                 interval=app.config['MARKING_INTERVAL'],
+                                 active_window=app.config['MARKING_ACTIVE_WINDOW'])
+
+@app.cli.command('mark-positions')
+@click.option('--loop', is_flag=True, help='Keep re-marking every MARKING_INTERVAL seconds')
+def mark_positions_command(loop):
+    """Mark open positions for every user (run once with --loop as the deployment's marking process)"""
+    while True:
+        with app.app_context():
+            user_ids = get_users_with_open_trades()
+        marked = position_marker.run_once(user_ids)
+        print(f"Marked open positions for {marked} user(s)")
+        if not loop:
+            break
+        time.sleep(position_marker.interval)
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables, columns and indexes in the configured database"""
+    with app.app_context():
+        changes = upgrade_schema()
+    print(f"Schema up to date ({len(changes)} change(s) applied)")
+
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, help='Only rebuild this user\'s rollups')
+def rebuild_rollups_command(user_id):
+    """Recompute performance rollups from the trades table"""
+    with app.app_context():
+        rows = rebuild_rollups(user_id)
+    print(f"Rebuilt {rows} rollup row(s)")
+
+@app.cli.command('import-trades')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Username that will own the trades')
+@click.option('--chunk-size', default=DEFAULT_IMPORT_CHUNK_SIZE, show_default=True, help='Rows per transaction')
+@click.option('--no-journal', is_flag=True, help='Do not create/merge journal entries')
+def import_trades_command(csv_path, username, chunk_size, no_journal):
+    """Bulk import trades from a CSV file"""
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            raise click.ClickException(f"No user named {username!r}")
+        started = time.perf_counter()
+        with open(csv_path, newline='', encoding='utf-8-sig') as stream:
+            result = import_trades_csv(stream, user.id, chunk_size=chunk_size, create_journals=not no_journal)
+    
+    print(f"Imported {result.imported} trade(s) in {time.perf_counter() - started:.2f}s, "
+          f"skipped {result.skipped}; journals created {result.journals_created}, updated {result.journals_updated}")
+    for error in result.errors:
+        print(f"  {error}")
+
+@app.cli.command('check-indexes')
+def check_indexes_command():
+    """Fail unless the planner uses the expected index for each hot query"""
+    with app.app_context():
+        results = check_index_usage()
+    for name, result in results.items():
+        print(f"{'OK  ' if result['used'] else 'MISS'} {name}: {result['index']}")
+        for line in result['plan']:
+            print(f"       {line}")
+    if not all(result['used'] for result in results.values()):
+        raise SystemExit(1)
+
 @app.route('/trades')
 @login_required
+@reads_from_replica
 def trades():
-    # Update open positions with current market prices
-    update_open_positions_pnl(current_user.id)
-    
-    page = request.args.get('page', 1, type=int)
-    trades = Trade.query.filter_by(user_id=current_user.id)\
-                       .order_by(Trade.entry_date.desc())\
-                       .paginate(
-                           page=page, 
-                           per_page=20, 
-                           error_out=False
-                       )
-    return render_template('trades.html', trades=trades)
-
-def create_or_update_journal_from_trade(trade):
-    """Create or update journal entry template based on trade information"""
-    trade_date = trade.entry_date.date()
-    
-    # Check if journal entry already exists for this day
-    journal = TradingJournal.query.filter_by(
-        user_id=current_user.id,
-        journal_date=trade_date
-    ).first()
+    # Open positions are kept marked by the background marker
+    position_marker.touch(current_user.id)
     
-    # Create template content based on trade
-    setup_description = f"Entered {trade.symbol} {trade.trade_type.replace('_', ' ').title()}"
-    if trade.setup_type:
-        setup_description += f" - {trade.setup_type} setup"
-    if trade.market_condition:
-        setup_description += f" in {trade.market_condition.replace('_', ' ')} market conditions"
-    
-    # Create entry reason template
-    entry_template = ""
-    if trade.entry_reason:
-        entry_template = f"Trade Rationale: {trade.entry_reason}\n\n"
-    
-    # Create market outlook template
-    market_template = ""
-    if trade.market_condition:
-        condition_desc = trade.market_condition.replace('_', ' ').title()
-        market_template = f"Market appeared to be {condition_desc.lower()}. "
-    
-    # Add options-specific context
-    if trade.is_option_trade():
-        if trade.expiration_date:
-            days_to_exp = (trade.expiration_date - trade_date).days
-            entry_template += f"Options Trade: {trade.option_type.title()} option with {days_to_exp} days to expiration. "
-            if trade.strike_price:
-                entry_template += f"Strike: ${trade.strike_price}. "
-        if trade.implied_volatility:
-            entry_template += f"IV: {trade.implied_volatility:.1f}%. "
-    
-    if not journal:
-        # Create new journal entry with template
-        journal = TradingJournal(
-            user_id=current_user.id,
-            journal_date=trade_date,
-            market_outlook=market_template + "Focused on identifying quality setups.",
-            daily_goals=f"Execute {setup_description.lower()} with proper risk management.",
-            what_went_well="",  # To be filled later
-            what_went_wrong="",  # To be filled later  
-            lessons_learned="",  # To be filled later
-            tomorrow_focus="Review today's trades and prepare for tomorrow's setups.",
-            emotional_state="focused",  # Default starting state
-            stress_level=3,  # Default moderate level
-            discipline_score=8  # Default good discipline
-        )
-        
-        # Add trade-specific notes to daily goals
-        if entry_template:
-            journal.daily_goals += f"\n\n{entry_template.strip()}"
-            
-        db.session.add(journal)
-        db.session.commit()
-        return journal, True  # True indicates new journal created
-    else:
-        # Update existing journal with additional trade info
-        if entry_template and entry_template.strip() not in journal.daily_goals:
-            journal.daily_goals += f"\n\n{entry_template.strip()}"
-            
-        # Update market outlook if it's empty or add to it
-        if not journal.market_outlook and market_template:
-            journal.market_outlook = market_template + "Focused on identifying quality setups."
-        elif market_template and market_template.strip() not in journal.market_outlook:
-            journal.market_outlook += f" {market_template.strip()}"
-            
-        db.session.commit()
-        return journal, False  # False indicates existing journal updated
+    try:
+        trades = paginate_trades(current_user.id, request.args.get('cursor'))
+    except InvalidCursor:
+        return redirect(url_for('trades'))
+    return render_template('trades.html', trades=trades, marked_at=get_last_marked_at(current_user.id))
 
 @app.route('/add_trade', methods=['GET', 'POST'])
 @login_required
@@ -687,18 +800,23 @@ def add_trade():
         # Calculate P&L if trade is closed
         trade.calculate_pnl()
         
+        # Trade, rollups and journal entry are written in one transaction (one commit)
         db.session.add(trade)
-        db.session.commit()
         
         # Auto-create or update journal entry based on trade
         journal_action = None
         if hasattr(current_user, 'settings') and current_user.settings and current_user.settings.auto_create_journal:
             try:
-                journal, is_new = create_or_update_journal_from_trade(trade)
+                journal_id, is_new = TradingJournal.upsert_from_trade(trade)
                 journal_action = "created" if is_new else "updated"
             except Exception as e:
+                # Keep the trade even if the journal can't be written
+                db.session.rollback()
+                db.session.add(trade)
                 print(f"Journal auto-creation failed: {e}")
         
+        db.session.commit()
+        
         # Auto-analyze if trade is closed and user has auto-analysis enabled
         if trade.exit_price and hasattr(current_user, 'settings') and current_user.settings.auto_analyze_trades:
             try:
@@ -771,16 +889,16 @@ def analyze_trade(id):
 
 @app.route('/journal')
 @login_required
+@reads_from_replica
 def journal():
-    page = request.args.get('page', 1, type=int)
-    journals = TradingJournal.query.filter_by(user_id=current_user.id)\
-                                  .order_by(TradingJournal.journal_date.desc())\
-                                  .paginate(
-                                      page=page, 
-                                      per_page=20, 
-                                      error_out=False
-                                  )
-    return render_template('journal.html', journals=journals)
+    try:
+        journals = paginate_journals(current_user.id, request.args.get('cursor'))
+    except InvalidCursor:
+        return redirect(url_for('journal'))
+    # Trades for the whole page in one query instead of one per entry
+    trades_by_day = TradingJournal.get_trades_by_day(current_user.id, [j.journal_date for j in journals.items])
+    return render_template('journal.html', journals=journals, trades_by_day=trades_by_day,
+                         day_trade_counts={day: len(day_trades) for day, day_trades in trades_by_day.items()})
 
 @app.route('/journal/add', methods=['GET', 'POST'])
 @app.route('/journal/<journal_date>/edit', methods=['GET', 'POST'])
@@ -842,45 +960,23 @@ def add_edit_journal(journal_date=None):
 
 @app.route('/analytics')
 @login_required
+@reads_from_replica
 def analytics():
-    # Get all closed trades for analysis
-    closed_trades = Trade.query.filter_by(user_id=current_user.id)\
-                              .filter(Trade.exit_price.isnot(None))\
-                              .all()
+    # Totals come from the incrementally maintained rollups, not the trade history
+    summary = get_rollup_summary(current_user.id)
     
-    if not closed_trades:
+    if not summary:
         return render_template('analytics.html', 
                              no_data=True,
                              charts_json=None,
                              stats=None)
     
-    # Create analytics data
-    df = pd.DataFrame([{
-        'date': trade.exit_date,
-        'symbol': trade.symbol,
-        'pnl': trade.profit_loss or 0,
-        'pnl_percent': trade.profit_loss_percent or 0,
-        'setup_type': trade.setup_type,
-        'timeframe': trade.timeframe,
-        'is_winner': trade.is_winner()
-    } for trade in closed_trades])
-    
-    # Calculate statistics
-    stats = {
-        'total_trades': len(closed_trades),
-        'winning_trades': len([t for t in closed_trades if t.is_winner()]),
-        'losing_trades': len([t for t in closed_trades if t.profit_loss and t.profit_loss < 0]),
-        'win_rate': len([t for t in closed_trades if t.is_winner()]) / len(closed_trades) * 100,
-        'total_pnl': sum(t.profit_loss for t in closed_trades if t.profit_loss),
-        'avg_win': df[df['pnl'] > 0]['pnl'].mean() if len(df[df['pnl'] > 0]) > 0 else 0,
-        'avg_loss': df[df['pnl'] < 0]['pnl'].mean() if len(df[df['pnl'] < 0]) > 0 else 0,
-        'largest_win': df['pnl'].max(),
-        'largest_loss': df['pnl'].min(),
-        'profit_factor': abs(df[df['pnl'] > 0]['pnl'].sum() / df[df['pnl'] < 0]['pnl'].sum()) if df[df['pnl'] < 0]['pnl'].sum() != 0 else 0
-    }
+    stats = summary.get_stats()
     
     # Create charts
-    charts = create_analytics_charts(df)
+    charts = create_analytics_charts(get_rollups(current_user.id, 'day'),
+                                     get_rollups(current_user.id, 'setup'),
+                                     summary)
     charts_json = json.dumps(charts, cls=plotly.utils.PlotlyJSONEncoder)
     
     return render_template('analytics.html', 
@@ -888,18 +984,18 @@ def analytics():
                          stats=stats,
                          no_data=False)
 
-def create_analytics_charts(df):
-    """Create analytics charts"""
+def create_analytics_charts(day_rollups, setup_rollups, summary):
+    """Create analytics charts from per-day, per-setup and overall rollups"""
     charts = {}
     
     # P&L over time
-    df_sorted = df.sort_values('date')
-    df_sorted['cumulative_pnl'] = df_sorted['pnl'].cumsum()
+    days = [rollup.bucket for rollup in day_rollups]
+    cumulative_pnl = np.cumsum([rollup.total_pnl for rollup in day_rollups]).tolist()
     
     charts['pnl_over_time'] = {
         'data': [{
-            'x': df_sorted['date'].tolist(),
-            'y': df_sorted['cumulative_pnl'].tolist(),
+            'x': days,
+            'y': cumulative_pnl,
             'type': 'scatter',
             'mode': 'lines',
             'name': 'Cumulative P&L',
@@ -914,10 +1010,9 @@ def create_analytics_charts(df):
     }
     
     # Win/Loss distribution
-    win_loss_counts = df['is_winner'].value_counts()
     charts['win_loss_pie'] = {
         'data': [{
-            'values': [win_loss_counts.get(True, 0), win_loss_counts.get(False, 0)],
+            'values': [summary.winning_trades, summary.trade_count - summary.winning_trades],
             'labels': ['Wins', 'Losses'],
             'type': 'pie',
             'colors': ['#2ecc71', '#e74c3c']
@@ -929,13 +1024,14 @@ def create_analytics_charts(df):
     }
     
     # Setup type performance
-    setup_performance = df.groupby('setup_type')['pnl'].sum().sort_values(ascending=False)
+    setup_performance = sorted((rollup for rollup in setup_rollups if rollup.bucket),
+                               key=lambda rollup: rollup.total_pnl, reverse=True)
     charts['setup_performance'] = {
         'data': [{
-            'x': setup_performance.index.tolist(),
-            'y': setup_performance.values.tolist(),
+            'x': [rollup.bucket for rollup in setup_performance],
+            'y': [rollup.total_pnl for rollup in setup_performance],
             'type': 'bar',
-            'marker': {'color': ['#2ecc71' if x > 0 else '#e74c3c' for x in setup_performance.values]}
+            'marker': {'color': ['#2ecc71' if rollup.total_pnl > 0 else '#e74c3c' for rollup in setup_performance]}
         }],
         'layout': {
             'title': 'P&L by Setup Type',
@@ -1058,6 +1154,45 @@ def api_quick_trade():
         'errors': form.errors
     })
 
+@app.route('/api/trades/import', methods=['POST'])
+@login_required
+def api_import_trades():
+    """Bulk import trades from an uploaded CSV file (multipart field 'file')"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'No CSV file uploaded'}), 400
+    
+    create_journals = bool(current_user.settings and current_user.settings.auto_create_journal)
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        result = import_trades_csv(stream, current_user.id, create_journals=create_journals)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Import failed: {e}'}), 500
+    
+    return jsonify({
+        'success': True,
+        'message': f'Imported {result.imported} trade(s), skipped {result.skipped}',
+        **result._asdict()
+    })
+
+@app.route('/api/trades/export')
+@login_required
+def api_export_trades():
+    """Stream all of the user's trades as csv (default), jsonl, parquet or arrow"""
+    export_format = request.args.get('format', 'csv').lower()
+    try:
+        check_format(export_format)
+    except ExportFormatError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"trades_{current_user.username}_{date.today().isoformat()}.{extension}"
+    return Response(
+        stream_with_context(stream_export(current_user.id, export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename)}"'}
+    )
+
 @app.route('/tools')
 @login_required
 def tools():
@@ -1105,20 +1240,7 @@ def options_calculator():
                 # Get expiration dates - try Tradier first
                 expiration_dates = []
                 try:
-                    headers = get_tradier_headers()
-                    if headers:  # Only try Tradier if token is configured
-                        exp_url = f"{TRADIER_API_BASE}/markets/options/expirations"
-                        exp_params = {'symbol': symbol}
-                        
-                        exp_response = requests.get(exp_url, params=exp_params, headers=headers)
-                        if exp_response.status_code == 200:
-                            exp_data = exp_response.json()
-                            if 'expirations' in exp_data and exp_data['expirations']:
-                                dates = exp_data['expirations']['date']
-                                if isinstance(dates, str):
-                                    expiration_dates = [dates]
-                                else:
-                                    expiration_dates = list(dates)
+                    expiration_dates = list(get_option_expirations_tradier(symbol) or [])
                 except Exception as e:
                     print(f"Tradier API error for expirations: {e}")
                     pass
@@ -1225,31 +1347,36 @@ def options_calculator():
     
     return render_template('tools/options_calculator.html', context=context)
 
+def _request_strategy(data):
+    """Strategy from a JSON body: a 'legs' list, or the single-option fields (option_type, strike, premium, ...)"""
+    if data.get('legs'):
+        return strategy_from_json(data['legs'])
+    leg = {key: data.get(key) for key in ('option_type', 'strike', 'expiration_date', 'days_to_expiration', 'premium')}
+    leg['quantity'] = data.get('quantity', 1)
+    return strategy_from_json([leg])
+
 @app.route('/tools/options-pnl', methods=['POST'])
 def calculate_options_pnl():
     """Scenario analysis for options P&L, matching stockappvscode logic and output structure."""
     try:
-        import numpy as np
-        from datetime import datetime
-        print('--- OPTIONS PNL DEBUG START ---')
         data = request.get_json()
-        print('Input data:', data)
         option_type = data.get('option_type')
-        strike_price = float(data.get('strike'))
         current_price = float(data.get('current_price'))
-        expiration_date = data.get('expiration_date')
-        premium = float(data.get('premium'))
-        quantity = int(data.get('quantity', 1))
-        print(f'Parsed: option_type={option_type}, strike_price={strike_price}, current_price={current_price}, expiration_date={expiration_date}, premium={premium}, quantity={quantity}')
+        rate = float(data.get('risk_free_rate', DEFAULT_RATE * 100)) / 100.0
+        dividend_yield = float(data.get('dividend_yield', 0)) / 100.0
+        model = data.get('model', 'european')
+        if model not in MODELS:
+            raise ValueError(f"model must be one of {', '.join(MODELS)}")
+        strategy = _request_strategy(data)
 
         # Calculate days until expiration
-        exp_date = datetime.strptime(expiration_date, '%Y-%m-%d')
-        days_to_exp = (exp_date - datetime.now()).days
-        print(f'days_to_exp: {days_to_exp}')
+        if data.get('expiration_date') and not data.get('legs'):
+            days_to_exp = days_until(data['expiration_date'])
+        else:
+            days_to_exp = math.ceil(strategy.front_days)
 
         # Generate price range (±15% from current price, 11 points)
-        price_range = np.linspace(current_price * 0.85, current_price * 1.15, 11)
-        print('price_range:', price_range)
+        price_range = price_axis(current_price, 11, DEFAULT_PRICE_RANGE)
 
         # Generate realistic time points
         time_points = []
@@ -1269,83 +1396,46 @@ def calculate_options_pnl():
         if 0 not in time_points:
             time_points.append(0)
             time_points.sort(reverse=True)
-        print('time_points:', time_points)
-
-        # Calculate implied volatility from current premium (Newton-Raphson)
-        def black_scholes(S, K, T, r, sigma, option_type='call'):
-            r = 0.05
-            d1 = (np.log(S/K) + (r + sigma**2/2)*T) / (sigma*np.sqrt(T))
-            d2 = d1 - sigma*np.sqrt(T)
-            if option_type == 'call':
-                price = S*np.exp(-0*T)*norm.cdf(d1) - K*np.exp(-r*T)*norm.cdf(d2)
-            else:
-                price = K*np.exp(-r*T)*norm.cdf(-d2) - S*np.exp(-0*T)*norm.cdf(-d1)
-            return price
-        def calculate_implied_volatility(market_price, S, K, T, r, option_type):
-            if T <= 0:
-                return 0.3
-            volatility = 0.3
-            for _ in range(10):
-                try:
-                    theoretical_price = black_scholes(S, K, T, r, volatility, option_type)
-                    d1 = (np.log(S/K) + (r + volatility**2/2)*T) / (volatility*np.sqrt(T))
-                    vega = S * norm.pdf(d1) * np.sqrt(T)
-                    if abs(vega) < 1e-6:
-                        break
-                    price_diff = theoretical_price - market_price
-                    if abs(price_diff) < 0.01:
-                        break
-                    volatility = volatility - price_diff / vega
-                    volatility = max(0.05, min(2.0, volatility))
-                except Exception as e:
-                    print('IV calc error:', e)
-                    break
-            return volatility
-        years_to_exp = days_to_exp / 365.0
-        print('years_to_exp:', years_to_exp)
-        if years_to_exp > 0 and premium > 0:
-            implied_vol = calculate_implied_volatility(premium, current_price, strike_price, years_to_exp, 0.05, option_type)
+
+        # Back out each leg's implied volatility from its premium (30% where it can't be solved),
+        # then price the whole price x time grid for all legs in one vectorized call
+        implied_vols = strategy.implied_vols(current_price, rate, FALLBACK_VOL)
+        pnl_grid = strategy.surface(price_range, time_points, implied_vols, rate, q=dividend_yield, model=model,
+                                    steps=min(int(data.get('steps', DEFAULT_LATTICE_STEPS)), MAX_LATTICE_STEPS))[0]
+        # Returns are on the debit paid, or on the capital at risk for credit strategies
+        cost_basis = strategy.cost if strategy.cost > 0 else strategy.max_loss()
+        if 0 < cost_basis < float('inf'):
+            return_grid = np.round(pnl_grid / cost_basis * 100, 2)
         else:
-            implied_vol = 0.3
-        print('implied_vol:', implied_vol)
-
-        pnl_data = []
-        contract_multiplier = 100
-        for price in price_range:
-            time_data = []
-            for days_left in time_points:
-                years_left = days_left / 365.0
-                if years_left > 0:
-                    theoretical_price = black_scholes(price, strike_price, years_left, 0.05, implied_vol, option_type)
-                else:
-                    if option_type == 'call':
-                        theoretical_price = max(0, price - strike_price)
-                    else:
-                        theoretical_price = max(0, strike_price - price)
-                pnl = (theoretical_price - premium) * contract_multiplier
-                return_percent = (pnl / (premium * contract_multiplier)) * 100 if premium > 0 else 0
-                time_data.append({
-                    'days_remaining': days_left,
-                    'pnl': round(pnl, 2),
-                    'return_percent': round(return_percent, 2)
-                })
-            pnl_data.append({
-                'stock_price': round(price, 2),
-                'time_data': time_data
-            })
+            return_grid = np.zeros_like(pnl_grid)
+        pnl_grid = np.round(pnl_grid, 2)
+
+        pnl_data = [{
+            'stock_price': round(float(price), 2),
+            'time_data': [{
+                'days_remaining': days_left,
+                'pnl': float(pnl),
+                'return_percent': float(ret)
+            } for days_left, pnl, ret in zip(time_points, pnl_row, return_row)]
+        } for price, pnl_row, return_row in zip(price_range, pnl_grid, return_grid)]
+        max_profit, max_loss = strategy.max_profit(), strategy.max_loss()
         response_data = {
             'pnl_data': pnl_data,
             'option_info': {
                 'type': option_type,
-                'strike': strike_price,
-                'premium': premium,
+                'strike': data.get('strike'),
+                'premium': data.get('premium'),
+                'legs': len(strategy),
                 'days_to_expiration': days_to_exp,
                 'time_points': time_points,
-                'implied_volatility': round(implied_vol * 100, 1),
-                'current_stock_price': current_price
+                'implied_volatility': round(float(implied_vols.mean()) * 100, 1),
+                'current_stock_price': current_price,
+                'model': model,
+                'breakevens': strategy.breakevens(2),
+                'max_profit': round(max_profit, 2) if max_profit < float('inf') else None,
+                'max_loss': round(max_loss, 2) if max_loss < float('inf') else None
             }
         }
-        print('--- OPTIONS PNL DEBUG END ---')
         return jsonify({'success': True, 'analysis': response_data})
     except Exception as e:
         import traceback
@@ -1353,6 +1443,56 @@ def calculate_options_pnl():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/scenario-surface', methods=['POST'])
+@login_required
+def api_scenario_surface():
+    """
+    High-resolution P&L surface over price x days-to-expiration x IV shift
+    
+    JSON body: current_price plus either a 'legs' list (option_type, strike,
+    quantity (negative = short), premium, expiration_date or
+    days_to_expiration) or the single-option fields option_type, strike,
+    premium, quantity and expiration_date/days_to_expiration. Optional:
+    price_points, day_points, price_range (fraction), iv_shifts (volatility
+    points, e.g. [-10, 0, 10]), risk_free_rate, dividend_yield and volatility
+    (percent), model ('european', or 'american' for a trinomial lattice
+    with early exercise, with steps time steps per tree), and
+    vol_source='surface' with a symbol to read each leg's volatility off the
+    symbol's fitted IV surface instead of backing it out of the premium.
+    ?format=npz returns the arrays as a NumPy .npz file instead of columnar JSON.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        volatility = data.get('volatility')
+        vol_surface = None
+        if data.get('vol_source') == 'surface':
+            if not data.get('symbol'):
+                raise ValueError("vol_source 'surface' needs a symbol")
+            vol_surface = build_vol_surface(str(data['symbol']).upper())
+            if vol_surface is None or not len(vol_surface):
+                raise ValueError(f"No IV surface available for {data['symbol']}")
+        surface = build_surface(
+            _request_strategy(data),
+            current_price=float(data.get('current_price')),
+            price_points=int(data.get('price_points', DEFAULT_PRICE_POINTS)),
+            day_points=int(data.get('day_points', DEFAULT_DAY_POINTS)),
+            price_range=float(data.get('price_range', DEFAULT_PRICE_RANGE)),
+            iv_shifts=[float(shift) / 100.0 for shift in data.get('iv_shifts') or [0]],
+            rate=float(data.get('risk_free_rate', DEFAULT_RATE * 100)) / 100.0,
+            volatility=float(volatility) / 100.0 if volatility is not None else None,
+            q=float(data.get('dividend_yield', 0)) / 100.0,
+            model=data.get('model', 'european'),
+            steps=int(data.get('steps', DEFAULT_LATTICE_STEPS)),
+            vol_surface=vol_surface
+        )
+    except (TypeError, ValueError) as e:  # ScenarioError is a ValueError
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if request.args.get('format') == 'npz':
+        return Response(surface_to_npz(surface), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': 'attachment; filename="scenario_surface.npz"'})
+    return jsonify({'success': True, 'surface': surface_to_columnar(surface)})
+
 @app.route('/tools/black-scholes')
 @login_required
 def black_scholes_calculator():
@@ -1362,7 +1502,7 @@ def black_scholes_calculator():
 @app.route('/tools/calculate-bs', methods=['POST'])
 @login_required
 def calculate_black_scholes():
-    """Calculate Black-Scholes price and Greeks"""
+    """Calculate the option price and Greeks (Black-Scholes, or an American lattice with model='american')"""
     try:
         data = request.get_json()
         
@@ -1371,16 +1511,23 @@ def calculate_black_scholes():
         T = float(data.get('time_to_expiration')) / 365.0
         r = float(data.get('risk_free_rate')) / 100.0
         sigma = float(data.get('volatility')) / 100.0
+        q = float(data.get('dividend_yield') or 0) / 100.0
         option_type = data.get('option_type')
         
+        if data.get('model', 'european') == 'american':
+            return jsonify(calculate_american(S, K, T, r, sigma, option_type, q,
+                                              steps=int(data.get('steps') or DEFAULT_STEPS),
+                                              method=data.get('method') or 'binomial'))
+        
         # Calculate price
-        price = black_scholes(S, K, T, r, sigma, option_type)
+        price = black_scholes(S, K, T, r, sigma, option_type, q)
         
         # Calculate Greeks
-        greeks = calculate_greeks(S, K, T, r, sigma, option_type)
+        greeks = calculate_greeks(S, K, T, r, sigma, option_type, q)
         
         return jsonify({
             'success': True,
+            'model': 'european',
             'price': round(price, 4),
             'greeks': greeks
         })
@@ -1703,9 +1850,7 @@ def test_tradier_api(symbol):
     try:
         headers = get_tradier_headers()
         if headers:
-            exp_url = f"{TRADIER_API_BASE}/markets/options/expirations"
-            exp_params = {'symbol': symbol}
-            exp_response = requests.get(exp_url, params=exp_params, headers=headers)
+            exp_response = tradier_client.get('/markets/options/expirations', params={'symbol': symbol})
             
             result['expirations_test'] = {
                 'status_code': exp_response.status_code,
@@ -1770,12 +1915,14 @@ def refresh_pnl():
                                 .all()
         
         total_unrealized = sum(trade.profit_loss for trade in open_trades if trade.profit_loss)
+        marked_at = get_last_marked_at(current_user.id)
         
         return jsonify({
             'success': True,
             'message': f'Updated P&L for {len(open_trades)} open position(s)',
             'open_positions': len(open_trades),
-            'total_unrealized_pnl': round(total_unrealized, 2)
+            'total_unrealized_pnl': round(total_unrealized, 2),
+            'marked_at': marked_at.isoformat() if marked_at else None
         })
         
     except Exception as e:
@@ -1784,6 +1931,131 @@ def refresh_pnl():
             'error': str(e)
         })
 
+@app.route('/api/portfolio/greeks')
+@login_required
+def api_portfolio_greeks():
+    """
+    Live Greeks for the open book: per position, per underlying and totals
+    
+    Every leg is repriced in one vectorized pass from the cached quotes and
+    chain IVs. Beta-weighted delta is in shares of PORTFOLIO_BENCHMARK.
+    """
+    open_trades = Trade.query.filter_by(user_id=current_user.id)\
+                            .filter(Trade.exit_price.is_(None))\
+                            .all()
+    benchmark = app.config['PORTFOLIO_BENCHMARK']
+    quotes = get_quotes_tradier([benchmark] + [trade.symbol for trade in open_trades])
+    greeks = portfolio_greeks(open_trades, quotes, get_option_leg_vols(open_trades),
+                              get_betas([trade.symbol for trade in open_trades], benchmark),
+                              benchmark_price=quotes.get(benchmark))
+    greeks['benchmark'] = benchmark
+    return jsonify({'success': True, 'portfolio': greeks})
+
+@app.route('/api/vol-surface/<symbol>')
+@login_required
+def api_vol_surface(symbol):
+    """
+    Fitted IV surface for a symbol: one row of smile parameters per expiration
+
+    Optional ?strikes=95,100,105&days=30,60 also returns IV (percent) on that
+    strike x days grid, interpolated from the surface.
+    """
+    symbol = symbol.upper()
+    surface = build_vol_surface(symbol)
+    if surface is None or not len(surface):
+        return jsonify({'success': False, 'error': f'No IV surface available for {symbol}'}), 404
+
+    result = surface.to_dict()
+    if request.args.get('strikes') and request.args.get('days'):
+        try:
+            strikes = np.array([float(value) for value in request.args['strikes'].split(',')])
+            days = np.array([float(value) for value in request.args['days'].split(',')])
+        except ValueError:
+            return jsonify({'success': False, 'error': 'strikes and days must be comma-separated numbers'}), 400
+        if len(strikes) > MAX_GRID_STRIKES or len(days) > MAX_GRID_DAYS:
+            return jsonify({'success': False,
+                            'error': f'Grid is limited to {MAX_GRID_STRIKES} strikes and {MAX_GRID_DAYS} days'}), 400
+        if not (np.isfinite(strikes).all() and np.isfinite(days).all()):
+            return jsonify({'success': False, 'error': 'strikes and days must be finite'}), 400
+        if not (strikes > 0).all() or not (days >= 0).all():
+            return jsonify({'success': False, 'error': 'strikes must be positive and days non-negative'}), 400
+        iv = np.round(surface.iv(strikes[:, None], days[None, :]) * 100, 2)
+        result['grid'] = {
+            'strikes': strikes.tolist(),
+            'days': days.tolist(),
+            'implied_volatility': np.where(np.isfinite(iv), iv, None).tolist()  # null, not NaN, in JSON
+        }
+    return jsonify({'success': True, 'surface': result})
+
+@app.route('/api/trades')
+@login_required
+@reads_from_replica
+def api_list_trades():
+    """Trades newest first; pass next_cursor back as ?cursor= for the following page"""
+    try:
+        page = paginate_trades(current_user.id, request.args.get('cursor'),
+                               request.args.get('limit', DEFAULT_PER_PAGE, type=int))
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'trades': [trade.to_dict() for trade in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+@app.route('/api/journal')
+@login_required
+@reads_from_replica
+def api_list_journals():
+    """Journal entries newest first; pass next_cursor back as ?cursor= for the following page"""
+    try:
+        page = paginate_journals(current_user.id, request.args.get('cursor'),
+                                 request.args.get('limit', DEFAULT_PER_PAGE, type=int))
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'journals': [journal.to_dict() for journal in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+@app.route('/api/trade/<int:id>/marks')
+@login_required
+def trade_mark_history(id):
+    """Mark history for one position, oldest first (intraday equity curve)"""
+    trade = Trade.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    since = request.args.get('since')
+    try:
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since must be an ISO timestamp'}), 400
+    
+    return jsonify({
+        'success': True,
+        'trade_id': trade.id,
+        'marks': [mark.to_dict() for mark in get_mark_history(trade.id, since)]
+    })
+
+@app.route('/api/market-data/cache-stats')
+@login_required
+def market_data_cache_stats():
+    """Hit/miss/eviction counters for the market data caches plus HTTP pool stats"""
+    return jsonify({
+        'success': True,
+        'caches': get_cache_stats(),
+        'vol_surfaces': vol_surfaces.stats(),
+        'http': get_http_stats()
+    })
+
+@app.route('/api/db/pool-stats')
+@login_required
+def db_pool_stats():
+    """Connection pool occupancy and checkout wait times per database bind"""
+    return jsonify({
+        'success': True,
+        'pools': get_pool_stats()
+    })
+
 def calculate_option_pnl(option_type, strike_price, premium, price):
     """Calculate P&L for a single price point"""
     contract_multiplier = 100
@@ -1810,4 +2082,7 @@ def calculate_option_pnl(option_type, strike_price, premium, price):
     }
 
 if __name__ == '__main__':
+    # With the reloader only the serving child (WERKZEUG_RUN_MAIN) marks, not the watcher parent
+    if app.config.get('BACKGROUND_MARKING_ENABLED') and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        position_marker.start()
     app.run(debug=True) 
\ No newline at end of file
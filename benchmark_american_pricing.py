@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark the American-option lattice pricer
+
+Prices a batch of random contracts (calls and puts, with dividends) on
+binomial and trinomial trees, with and without the early-exercise boundary,
+and checks the batch against the target time (500 steps x 100 contracts in
+under a second). Also reports the error against a fine reference tree and a
+lattice scenario surface for an iron condor.
+
+Usage:
+    python benchmark_american_pricing.py [--contracts 100] [--steps 500] [--repeat 5]
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from lattice import american_price, american_greeks, LATTICE_METHODS
+from strategies import Leg, Strategy
+
+TARGET_SECONDS = 1.0
+
+
+def random_contracts(count, seed=7):
+    rng = np.random.default_rng(seed)
+    return {
+        'S': rng.uniform(80, 120, count),
+        'K': rng.uniform(80, 120, count),
+        'T': rng.uniform(0.05, 1.0, count),
+        'r': 0.05,
+        'sigma': rng.uniform(0.1, 0.6, count),
+        'option_type': rng.choice(['call', 'put'], count),
+        'q': rng.uniform(0.0, 0.04, count),
+    }
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contracts', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    contracts = random_contracts(args.contracts)
+    reference = american_price(**contracts, steps=2000, method='trinomial')
+
+    for method in LATTICE_METHODS:
+        for boundary in (False, True):
+            result, seconds = timed(lambda: american_price(**contracts, steps=args.steps, method=method,
+                                                           boundary=boundary), args.repeat)
+            price = result.price if boundary else result
+            verdict = 'OK' if seconds < TARGET_SECONDS else 'SLOW'
+            print(f"{method:<10} boundary={str(boundary):<5} {args.contracts} contracts x {args.steps} steps: "
+                  f"{seconds * 1000:7.1f} ms [{verdict}]  max error vs 2000-step tree "
+                  f"{np.abs(price - reference).max():.4f}")
+
+    _, seconds = timed(lambda: american_greeks(**contracts, steps=args.steps), args.repeat)
+    print(f"greeks     binomial   {args.contracts} contracts x {args.steps} steps: {seconds * 1000:7.1f} ms")
+
+    condor = Strategy([Leg('put', 90, 30, 1, 0.5), Leg('put', 95, 30, -1, 1.2),
+                       Leg('call', 105, 30, -1, 1.1), Leg('call', 110, 30, 1, 0.4)])
+    prices, days = np.linspace(85, 115, 200), np.linspace(30, 0, 60)
+    for model in ('european', 'american'):
+        surface, seconds = timed(lambda: condor.surface(prices, days, 0.25, 0.05, (-0.05, 0.0, 0.05), 0.01,
+                                                        model=model, steps=100), args.repeat)
+        print(f"condor surface {model:<9} {'x'.join(map(str, surface.shape))}: {seconds * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
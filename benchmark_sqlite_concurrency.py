@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent SQLite reads and writes with and without the tuning profile
+
+Simulates gunicorn workers: reader processes run the dashboard queries while
+writer processes re-mark open positions (update + commit), all against one
+database file. Reports operations per second and "database is locked" errors
+for the driver defaults and for SQLITE_PERFORMANCE_PRAGMAS.
+
+Usage:
+    python benchmark_sqlite_concurrency.py [--readers 4] [--writers 2] [--seconds 5]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, update, func
+from sqlalchemy.exc import OperationalError
+
+from config import SQLITE_PERFORMANCE_PRAGMAS
+from database import install_sqlite_pragmas
+from models import db, User, Trade
+
+USERS = 20
+TRADES_PER_USER = 500
+OPEN_TRADES_PER_USER = 25
+
+
+def make_engine(path, pragmas):
+    engine = create_engine(f"sqlite:///{path}")
+    install_sqlite_pragmas(engine, pragmas)
+    return engine
+
+
+def seed(path, pragmas):
+    engine = make_engine(path, pragmas)
+    db.metadata.create_all(engine)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {'id': u, 'username': f'user{u}', 'email': f'user{u}@example.com', 'password_hash': 'x',
+             'created_at': start}
+            for u in range(1, USERS + 1)
+        ])
+        conn.execute(Trade.__table__.insert(), [
+            {'user_id': u, 'symbol': 'SPY', 'trade_type': 'long', 'entry_price': 100.0, 'quantity': 10,
+             'entry_date': start + timedelta(hours=i), 'setup_type': 'breakout', 'timeframe': 'swing',
+             'exit_price': None if i < OPEN_TRADES_PER_USER else 101.0,
+             'profit_loss': 0.0 if i < OPEN_TRADES_PER_USER else 10.0, 'is_analyzed': False}
+            for u in range(1, USERS + 1) for i in range(TRADES_PER_USER)
+        ])
+    engine.dispose()
+
+
+def reader(path, pragmas, seconds, results):
+    engine = make_engine(path, pragmas)
+    ops = errors = 0
+    deadline = time.monotonic() + seconds
+    with engine.connect() as conn:
+        while time.monotonic() < deadline:
+            user_id = random.randint(1, USERS)
+            try:
+                conn.execute(select(Trade.__table__).where(Trade.user_id == user_id)
+                             .order_by(Trade.entry_date.desc()).limit(10)).fetchall()
+                conn.execute(select(func.count(Trade.id), func.sum(Trade.profit_loss))
+                             .where(Trade.user_id == user_id)).one()
+                conn.rollback()
+                ops += 1
+            except OperationalError:
+                conn.rollback()
+                errors += 1
+    results.put(('read', ops, errors))
+
+
+def writer(path, pragmas, seconds, results):
+    engine = make_engine(path, pragmas)
+    ops = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        user_id = random.randint(1, USERS)
+        try:
+            with engine.begin() as conn:
+                conn.execute(update(Trade.__table__)
+                             .where(Trade.user_id == user_id, Trade.exit_price.is_(None))
+                             .values(profit_loss=random.uniform(-50, 50), marked_at=datetime.utcnow()))
+            ops += 1
+        except OperationalError:
+            errors += 1
+    results.put(('write', ops, errors))
+
+
+def run(profile, pragmas, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, pragmas)
+
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=reader, args=(path, pragmas, seconds, results))
+                 for _ in range(readers)]
+        procs += [multiprocessing.Process(target=writer, args=(path, pragmas, seconds, results))
+                  for _ in range(writers)]
+        for proc in procs:
+            proc.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in procs:
+            kind, ops, errors = results.get()
+            totals[kind][0] += ops
+            totals[kind][1] += errors
+        for proc in procs:
+            proc.join()
+
+    print(f"{profile:<8} reads/s {totals['read'][0] / seconds:>9.0f}  writes/s {totals['write'][0] / seconds:>7.0f}"
+          f"  locked errors {totals['read'][1] + totals['write'][1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.readers} reader / {args.writers} writer processes, {args.seconds:g}s each")
+    run('default', {}, args.readers, args.writers, args.seconds)
+    run('tuned', SQLITE_PERFORMANCE_PRAGMAS, args.readers, args.writers, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark trade-entry latency: two commits vs one unit of work
+
+Replays the database work of add_trade against a SQLite file, once the old
+way (commit the trade, look up the journal entry, commit again) and once the
+current way (trade, rollups and an INSERT ... ON CONFLICT journal upsert in a
+single transaction). Several trades share each day, so both the create and
+merge branches of the journal are exercised. Run with the driver defaults and
+with SQLITE_PERFORMANCE_PRAGMAS.
+
+Usage:
+    python benchmark_trade_entry.py [--trades 500] [--trades-per-day 4]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from config import SQLITE_PERFORMANCE_PRAGMAS
+from database import init_db
+from models import db, User, Trade, TradingJournal, UserSettings
+import rollups  # noqa: F401  (registers the rollup flush hooks, as in the app)
+
+
+def make_app(path, pragmas):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", SQLITE_PRAGMAS=pragmas)
+    init_db(app)
+    return app
+
+
+def make_trade(user_id, i, trades_per_day):
+    entry_date = datetime(2024, 1, 2, 9, 30) + timedelta(days=i // trades_per_day, minutes=i % trades_per_day)
+    trade = Trade(user_id=user_id, symbol='SPY', trade_type='option_call', entry_date=entry_date,
+                  entry_price=2.5, quantity=1, exit_price=3.0 if i % 3 else None, exit_date=entry_date,
+                  strike_price=400.0 + i % trades_per_day, expiration_date=(entry_date + timedelta(days=30)).date(),
+                  setup_type='breakout', market_condition='trending_up', entry_reason=f"Setup {i % trades_per_day}",
+                  option_type='call')
+    trade.calculate_pnl()
+    return trade
+
+
+def enter_two_commits(trade):
+    """add_trade before: commit the trade, then look up and commit the journal"""
+    db.session.add(trade)
+    db.session.commit()
+    journal = TradingJournal.query.filter_by(user_id=trade.user_id, journal_date=trade.entry_date.date()).first()
+    if journal is None:
+        db.session.add(TradingJournal.from_trade(trade))
+    else:
+        journal.merge_trade(trade)
+    db.session.commit()
+
+
+def enter_single_commit(trade):
+    """add_trade now: trade and journal upsert flushed and committed together"""
+    db.session.add(trade)
+    TradingJournal.upsert_from_trade(trade)
+    db.session.commit()
+
+
+def run(profile, pragmas, enter, trades, trades_per_day):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'), pragmas)
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', password_hash='x')
+            user.settings = UserSettings()
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            latencies = []
+            for i in range(trades):
+                trade = make_trade(user_id, i, trades_per_day)
+                started = time.perf_counter()
+                enter(trade)
+                latencies.append(time.perf_counter() - started)
+
+            journals = TradingJournal.query.count()
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    latencies.sort()
+    print(f"{profile:<8} {enter.__name__:<20} median {statistics.median(latencies) * 1000:6.2f} ms"
+          f"  p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.2f} ms  ({journals} journal entries)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trades', type=int, default=500)
+    parser.add_argument('--trades-per-day', type=int, default=4)
+    args = parser.parse_args()
+
+    for profile, pragmas in (('default', {}), ('tuned', SQLITE_PERFORMANCE_PRAGMAS)):
+        for enter in (enter_two_commits, enter_single_commit):
+            run(profile, pragmas, enter, args.trades, args.trades_per_day)
+
+
+if __name__ == '__main__':
+    main()
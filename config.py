@@ -1,6 +1,16 @@
 import os
 from datetime import timedelta
 
+# SQLite connection profile: WAL so page reads don't block on the marking writer,
+# and writers wait up to busy_timeout ms for the lock instead of raising "database is locked"
+SQLITE_PERFORMANCE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # Durable across app crashes in WAL mode; only an OS crash can lose the last commits
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # Negative = KiB, so 64 MB of page cache per connection
+    'mmap_size': 268435456,  # 256 MB memory-mapped reads
+}
+
 class Config:
     # Basic Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -8,6 +18,20 @@ class Config:
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///trading_app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pragmas applied to every SQLite connection (ignored for other databases); {} keeps driver defaults
+    SQLITE_PRAGMAS = SQLITE_PERFORMANCE_PRAGMAS if os.environ.get('SQLITE_TUNING', 'true').lower() in ['true', 'on', '1'] else {}
+    
+    # Connection pool and statement limits (PostgreSQL/MySQL), turned into SQLALCHEMY_ENGINE_OPTIONS
+    # by database.init_db(). Size the pool for gunicorn threads per worker; workers each get their own.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # Reconnect before server/proxy idle timeouts
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 0)  # 0 = no limit
+    
+    # Optional read-only replica for analytics and listing pages
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
     
     # File upload configuration
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'static', 'uploads')
@@ -28,6 +52,35 @@ class Config:
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     TRADIER_API_TOKEN = os.environ.get('TRADIER_API_TOKEN')
     
+    # Market data caching (seconds / entries)
+    QUOTE_CACHE_TTL = float(os.environ.get('QUOTE_CACHE_TTL') or 5)
+    QUOTE_CACHE_MAXSIZE = int(os.environ.get('QUOTE_CACHE_MAXSIZE') or 1024)
+    QUOTE_BATCH_SIZE = int(os.environ.get('QUOTE_BATCH_SIZE') or 100)  # Symbols per /markets/quotes request
+    CHAIN_CACHE_TTL = float(os.environ.get('CHAIN_CACHE_TTL') or 30)
+    CHAIN_CACHE_MAXSIZE = int(os.environ.get('CHAIN_CACHE_MAXSIZE') or 256)
+    EXPIRATIONS_CACHE_TTL = float(os.environ.get('EXPIRATIONS_CACHE_TTL') or 3600)
+    BETA_CACHE_TTL = float(os.environ.get('BETA_CACHE_TTL') or 86400)  # Betas move slowly; refresh daily
+    BETA_FAILURE_TTL = float(os.environ.get('BETA_FAILURE_TTL') or 300)  # Failed lookups use DEFAULT_BETA this long
+    BETA_FETCH_WORKERS = int(os.environ.get('BETA_FETCH_WORKERS') or 8)  # Concurrent Yahoo Finance lookups
+    VOL_SURFACE_MAXSIZE = int(os.environ.get('VOL_SURFACE_MAXSIZE') or 256)  # Symbols with a fitted IV surface
+    VOL_SURFACE_MAX_EXPIRATIONS = int(os.environ.get('VOL_SURFACE_MAX_EXPIRATIONS') or 12)  # Chains fetched per build
+    
+    # Tradier HTTP client (pooled keep-alive session)
+    TRADIER_CONNECT_TIMEOUT = float(os.environ.get('TRADIER_CONNECT_TIMEOUT') or 3.05)
+    TRADIER_READ_TIMEOUT = float(os.environ.get('TRADIER_READ_TIMEOUT') or 10)
+    TRADIER_POOL_CONNECTIONS = int(os.environ.get('TRADIER_POOL_CONNECTIONS') or 4)
+    TRADIER_POOL_MAXSIZE = int(os.environ.get('TRADIER_POOL_MAXSIZE') or 16)  # >= gunicorn threads per worker
+    TRADIER_MAX_RETRIES = int(os.environ.get('TRADIER_MAX_RETRIES') or 2)
+    
+    # Background position marking (page views read stored marks); the flag only starts the
+    # marking thread under the dev server (python app_original.py), see `mark-positions --loop`
+    BACKGROUND_MARKING_ENABLED = os.environ.get('BACKGROUND_MARKING_ENABLED', 'false').lower() in ['true', 'on', '1']
+    MARKING_INTERVAL = float(os.environ.get('MARKING_INTERVAL') or 60)  # Seconds between marking passes
+    MARKING_ACTIVE_WINDOW = float(os.environ.get('MARKING_ACTIVE_WINDOW') or 900)  # Keep marking users seen this recently
+    
+    # Portfolio Greeks (beta-weighted delta is expressed in shares of this symbol)
+    PORTFOLIO_BENCHMARK = os.environ.get('PORTFOLIO_BENCHMARK') or 'SPY'
+    
     # Application settings
     TRADES_PER_PAGE = 20
     DEBUG = os.environ.get('DEBUG', 'False').lower() in ['true', '1', 'on']
@@ -51,6 +104,9 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///trading_app_prod.db'
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)
     
     @classmethod
     def init_app(cls, app):
@@ -66,7 +122,9 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLITE_PRAGMAS = {}
     WTF_CSRF_ENABLED = False
+    BACKGROUND_MARKING_ENABLED = False
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,203 @@
+"""
+Database Engine Configuration
+
+Builds the SQLAlchemy engine options from the config class and applies
+connection-level tuning:
+
+- SQLite: the SQLITE_PRAGMAS profile is set on every new connection. WAL lets
+  readers run alongside the single writer, and a busy timeout makes writers
+  wait for the lock instead of failing with "database is locked".
+- Server databases: pool size/overflow/recycle/pre-ping and a per-statement
+  timeout come from the DB_* settings, and an optional read-only replica is
+  registered as the 'replica' bind.
+
+Every pool records how long checkouts wait, so the pool can be sized from
+real numbers (see get_pool_stats()).
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from models import db, REPLICA_BIND
+
+
+class CheckoutTimer:
+    """Checkout wait times for one pool (recent samples kept for percentiles)"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self._recent.append(seconds)
+            self.checkouts += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+            return {
+                'checkouts': self.checkouts,
+                'avg_wait_ms': round(self.total_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'p95_wait_ms': round(p95 * 1000, 3),
+                'max_wait_ms': round(self.max_seconds * 1000, 3)
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_timer = CheckoutTimer()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkout_timer.record(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkout_timer = self.checkout_timer
+        return pool
+
+
+def build_engine_options(config, database_uri, read_only=False):
+    """
+    Engine options for one database URL from the config's DB_* settings
+
+    Args:
+        config: Flask config (or any mapping with the DB_* keys)
+        database_uri: URL the options are for
+        read_only: Open connections read-only (replica bind)
+    """
+    url = make_url(database_uri)
+    backend = url.get_backend_name()
+
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}  # Flask-SQLAlchemy uses a static single-connection pool
+        return {'poolclass': TimedQueuePool}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+    timeout_ms = config.get('DB_STATEMENT_TIMEOUT_MS') or 0
+    if backend == 'postgresql':
+        server_options = []
+        if timeout_ms:
+            server_options.append(f"-c statement_timeout={timeout_ms}")
+        if read_only:
+            server_options.append("-c default_transaction_read_only=on")
+        if server_options:
+            options['connect_args'] = {'options': ' '.join(server_options)}
+    elif backend in ('mysql', 'mariadb'):
+        init_commands = []
+        if timeout_ms:
+            init_commands.append(f"SET SESSION max_execution_time={timeout_ms}")
+        if read_only:
+            init_commands.append("SET SESSION TRANSACTION READ ONLY")
+        if init_commands:
+            options['connect_args'] = {'init_command': '; '.join(init_commands)}
+
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """Run PRAGMA statements on a raw sqlite3 connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Apply pragmas to every connection the engine opens (no-op for other backends or an empty profile)"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return False
+    if engine.url.database in (None, '', ':memory:'):
+        # In-memory databases can't use WAL or mmap
+        pragmas = {k: v for k, v in pragmas.items() if k not in ('journal_mode', 'mmap_size')}
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return True
+
+
+def init_db(app):
+    """Derive engine options and binds from the config, then initialize db on the app"""
+    config = app.config
+    options = build_engine_options(config, config['SQLALCHEMY_DATABASE_URI'])
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})  # Explicit options win
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_url = config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_url, **build_engine_options(config, replica_url, read_only=True)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            install_sqlite_pragmas(engine, config.get('SQLITE_PRAGMAS'))
+
+
+@contextmanager
+def replica_reads():
+    """Send this block's queries to the read-only replica when one is configured"""
+    session = db.session()
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = True
+    try:
+        yield session
+    finally:
+        session.info['use_replica'] = previous
+
+
+def reads_from_replica(view):
+    """View decorator: run the whole view under replica_reads()"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def get_pool_stats():
+    """Pool occupancy and checkout wait times per bind ('default' for the primary database)"""
+    stats = {}
+    for bind_key, engine in db.engines.items():
+        pool = engine.pool
+        entry = {'pool': pool.status()}
+        timer = getattr(pool, 'checkout_timer', None)
+        if timer is not None:
+            entry.update(timer.stats())
+        stats[bind_key or 'default'] = entry
+    return stats
@@ -0,0 +1,291 @@
+"""
+American Option Lattices
+
+Binomial (Cox-Ross-Rubinstein) and trinomial (Hull/Kamrad-Ritchken) trees
+for American-style options with a continuous dividend yield. A whole batch
+of contracts is priced together: every backward-induction step updates every
+node of every tree in one NumPy operation, so the Python loop runs once per
+time step rather than once per node or contract.
+
+Exercise values are computed once per tree for every price level the tree
+can reach; each step reads its row as a slice of that table.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from pricing import bs_price, intrinsic_value, is_call_flag, DAYS_PER_YEAR
+
+LATTICE_METHODS = ('binomial', 'trinomial')
+DEFAULT_STEPS = 200
+MAX_STEPS = 2000
+
+# Widest t=0 row (in nodes either side of the root) american_price_curve will build
+# before falling back to max(European, intrinsic) for a contract
+MAX_CURVE_NODES = 2000
+
+# Node updates (trees x steps x (steps + row width)) one american_price_curve call may do,
+# roughly two to three seconds of induction; larger batches raise LatticeError
+MAX_CURVE_WORK = 100_000_000
+_CHUNK_LEVELS = 1_000_000  # Price levels held per induction batch (bounds memory, not work)
+
+LatticeResult = namedtuple('LatticeResult', ['price', 'boundary', 'boundary_times'])
+
+
+class LatticeError(ValueError):
+    """Invalid lattice method or step count"""
+
+
+def _check(method, steps):
+    if method not in LATTICE_METHODS:
+        raise LatticeError(f"Unknown lattice method {method!r} (expected one of {', '.join(LATTICE_METHODS)})")
+    if not 1 <= steps <= MAX_STEPS:
+        raise LatticeError(f"steps must be between 1 and {MAX_STEPS}")
+
+
+def _tree(method, T, r, sigma, q, steps):
+    """
+    Per-contract step size, log spacing between price levels, discount factor
+    and branch probabilities (lowest branch first), each shaped (n, 1)
+    """
+    dt = T / steps
+    if method == 'binomial':
+        h = sigma * np.sqrt(dt)
+        p_up = (np.exp((r - q) * dt) - np.exp(-h)) / (np.exp(h) - np.exp(-h))
+        p_up = np.clip(p_up, 0.0, 1.0)  # Only leaves [0, 1] when sigma is tiny next to the carry
+        probs = (1.0 - p_up, p_up)
+    else:
+        h = sigma * np.sqrt(3.0 * dt)
+        drift = (r - q - 0.5 * sigma ** 2) * np.sqrt(dt / (12.0 * sigma ** 2))
+        probs = (np.clip(1.0 / 6.0 - drift, 0.0, 1.0), np.full_like(h, 2.0 / 3.0), np.clip(1.0 / 6.0 + drift, 0.0, 1.0))
+    return dt, h, np.exp(-r * dt), probs
+
+
+def _row(method, levels, steps, i, width):
+    """Slice of the price-level table holding the nodes of time step i"""
+    offset = steps - i
+    if method == 'binomial':
+        return slice(offset, levels - offset, 2)
+    return slice(offset, levels - offset)
+
+
+def _induct(S0, K, T, r, sigma, q, is_call, steps, method, width=0, boundary=False):
+    """
+    Backward induction over a batch of flat (n,) contracts
+
+    The t=0 row holds the root plus `width` price levels either side of it
+    (spaced two levels apart on a binomial tree), so one tree can value a
+    contract at a whole range of spot prices.
+
+    Returns:
+        (values at t=0 shaped (n, row), log offset of each t=0 node from S0
+        shaped (n, row), boundary or None, boundary times or None)
+    """
+    col = (lambda x: x[:, None])
+    S0, K, T, r, sigma, q, is_call = (col(x) for x in (S0, K, T, r, sigma, q, is_call))
+    dt, h, disc, probs = _tree(method, T, r, sigma, q, steps)
+
+    # Every reachable price level, lowest first, and its exercise value
+    levels = 2 * (steps + width) + 1
+    log_offsets = (np.arange(levels) - (steps + width)) * h
+    level_prices = S0 * np.exp(log_offsets)
+    exercise = np.where(is_call, np.maximum(level_prices - K, 0.0), np.maximum(K - level_prices, 0.0))
+
+    values = exercise[:, _row(method, levels, steps, steps, width)]
+    critical = np.full((len(S0), steps), np.nan) if boundary else None
+    for i in range(steps - 1, -1, -1):
+        continuation = disc * sum(p * values[:, k:values.shape[1] - len(probs) + 1 + k] for k, p in enumerate(probs))
+        row = _row(method, levels, steps, i, width)
+        exercise_now = exercise[:, row]
+        values = np.maximum(continuation, exercise_now)
+        if boundary:
+            early = (exercise_now > continuation) & (exercise_now > 0)
+            prices = level_prices[:, row]
+            lowest = np.min(prices, axis=1, initial=np.inf, where=early)
+            highest = np.max(prices, axis=1, initial=-np.inf, where=early)
+            edge = np.where(is_call[:, 0], lowest, highest)
+            critical[:, i] = np.where(np.isfinite(edge), edge, np.nan)
+
+    times = dt * np.arange(steps) if boundary else None
+    return values, log_offsets[:, _row(method, levels, steps, 0, width)], critical, times
+
+
+def _flat_inputs(S, K, T, r, sigma, option_type, q):
+    S, K, T, r, sigma, q = (np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q))
+    arrays = np.broadcast_arrays(S, K, np.maximum(T, 0.0), r, sigma, q, is_call_flag(option_type))
+    return arrays[0].shape, [a.ravel() for a in arrays]
+
+
+def american_price(S, K, T, r, sigma, option_type='call', q=0.0, steps=DEFAULT_STEPS,
+                   method='binomial', boundary=False):
+    """
+    Price American options on a binomial or trinomial lattice
+
+    Arguments broadcast like bs_price, and every contract in the batch is
+    priced in the same backward induction. Expired and zero-volatility
+    contracts are worth the larger of intrinsic and Black-Scholes value.
+
+    Args:
+        S, K, T, r, sigma, option_type, q: As bs_price (T in years, q a continuous yield)
+        steps: Time steps per tree
+        method: 'binomial' or 'trinomial'
+        boundary: Also return the early-exercise boundary
+
+    Returns:
+        ndarray of prices, or with boundary=True a LatticeResult whose boundary
+        has shape (..., steps): the critical underlying price at each time step
+        (highest price where a put is exercised, lowest for a call; NaN where
+        early exercise never pays) and boundary_times the years from now of
+        each step
+
+    Raises:
+        LatticeError: Unknown method or steps out of range
+    """
+    _check(method, steps)
+    shape, (S, K, T, r, sigma, q, is_call) = _flat_inputs(S, K, T, r, sigma, option_type, q)
+
+    degenerate = (T <= 0) | (sigma <= 0)
+    tree_T, tree_sigma = np.where(degenerate, 1.0, T), np.where(degenerate, 1.0, sigma)
+    values, _, critical, times = _induct(S, K, tree_T, r, tree_sigma, q, is_call, steps, method, boundary=boundary)
+
+    price = values[:, 0]
+    if degenerate.any():
+        floor = np.maximum(intrinsic_value(S, K, is_call), bs_price(S, K, T, r, sigma, is_call, q))
+        price = np.where(degenerate, floor, price)
+    price = price.reshape(shape)
+    if not boundary:
+        return price
+
+    critical[degenerate] = np.nan
+    times[degenerate] = np.nan
+    return LatticeResult(price, critical.reshape(shape + (steps,)), times.reshape(shape + (steps,)))
+
+
+def american_price_curve(prices, K, T, r, sigma, option_type='call', q=0.0, steps=DEFAULT_STEPS, method='trinomial'):
+    """
+    American prices of a batch of contracts across a shared axis of spot prices
+
+    Instead of one tree per (contract, spot) pair, each contract gets one tree
+    rooted in the middle of the axis whose t=0 row is widened to cover it; the
+    row is then interpolated (linearly in log price) at the requested spots.
+    That makes a scenario surface cost one tree per column instead of one per
+    cell. Contracts whose row would need more than MAX_CURVE_NODES levels
+    (very short-dated or very low volatility over a wide axis, where the
+    early-exercise premium is negligible) are valued at max(European, intrinsic).
+    Trees are inducted in batches of similar row width, which bounds memory.
+
+    Args:
+        prices: 1-D spot prices (positive)
+        K, T, r, sigma, option_type, q: Broadcastable contract batch (as bs_price)
+
+    Returns:
+        ndarray of shape (*batch_shape, len(prices))
+
+    Raises:
+        LatticeError: Unknown method, steps out of range or more than
+            MAX_CURVE_WORK node updates
+    """
+    _check(method, steps)
+    prices = np.asarray(prices, dtype=float)
+    shape, (_, K, T, r, sigma, q, is_call) = _flat_inputs(1.0, K, T, r, sigma, option_type, q)
+
+    root = np.sqrt(prices.min() * prices.max())
+    log_spots = np.log(prices / root)
+    european = bs_price(prices, K[:, None], T[:, None], r[:, None], sigma[:, None], is_call[:, None], q[:, None])
+    result = np.maximum(european, intrinsic_value(prices, K[:, None], is_call[:, None]))
+
+    # Spacing of the t=0 row, and how many nodes either side of the root reach the axis ends
+    live = (T > 0) & (sigma > 0)
+    dt = np.where(live, T, 0.0) / steps
+    spacing = sigma * np.sqrt(3.0 * dt) if method == 'trinomial' else 2.0 * sigma * np.sqrt(dt)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        needed = np.ceil(np.abs(log_spots).max() / spacing) + 1
+    on_tree = np.flatnonzero(live & (needed <= MAX_CURVE_NODES))
+    if on_tree.size == 0:
+        return result.reshape(shape + prices.shape)
+
+    widths = np.where(live & (needed <= MAX_CURVE_NODES), needed, 0).astype(int) * (2 if method == 'binomial' else 1)
+    work = float(steps) * (steps + widths[on_tree]).sum()
+    if work > MAX_CURVE_WORK:
+        raise LatticeError(f"Lattice batch needs {work:.3g} node updates (limit {MAX_CURVE_WORK:.3g}); "
+                           f"use fewer steps or contracts")
+
+    # Widest trees first, so each batch is as wide as its first tree
+    order = on_tree[np.argsort(-widths[on_tree], kind='stable')]
+    start = 0
+    while start < order.size:
+        width = int(widths[order[start]])
+        batch = order[start:start + max(1, _CHUNK_LEVELS // (2 * (steps + width) + 1))]
+        start += batch.size
+        values, offsets, _, _ = _induct(np.full(batch.size, root), K[batch], T[batch], r[batch], sigma[batch],
+                                        q[batch], is_call[batch], steps, method, width=width)
+
+        # Linear interpolation on each contract's uniform log-price row; the chord across the
+        # exercise kink can dip below intrinsic, which an American contract never is
+        position = (log_spots[None, :] - offsets[:, :1]) / (offsets[:, 1:2] - offsets[:, :1])
+        lower = np.clip(np.floor(position).astype(int), 0, values.shape[1] - 2)
+        weight = position - lower
+        interpolated = (np.take_along_axis(values, lower, axis=1) * (1.0 - weight) +
+                        np.take_along_axis(values, lower + 1, axis=1) * weight)
+        result[batch] = np.maximum(interpolated, intrinsic_value(prices, K[batch, None], is_call[batch, None]))
+    return result.reshape(shape + prices.shape)
+
+
+def american_greeks(S, K, T, r, sigma, option_type='call', q=0.0, steps=DEFAULT_STEPS, method='binomial'):
+    """
+    Lattice Greeks in the same units as bs_greeks
+
+    Delta and gamma come from the tree itself: its t=0 row is widened by one
+    node either side of the spot, which avoids the odd/even noise of bumping
+    the spot on a fixed tree. Theta, vega and rho are bumps (one day less,
+    +1 vol point, +1 rate point); the base contract and its three bumps are
+    stacked into one batch and priced in a single induction.
+
+    Returns:
+        Dict of ndarrays: delta, gamma, theta, vega, rho
+
+    Raises:
+        LatticeError: Unknown method or steps out of range
+    """
+    _check(method, steps)
+    shape, (S, K, T, r, sigma, q, is_call) = _flat_inputs(S, K, T, r, sigma, option_type, q)
+    n = S.size
+    one_day = 1.0 / DAYS_PER_YEAR
+    batch = [np.tile(x, 4) for x in (S, K, T, r, sigma, q, is_call)]
+    batch[2] = np.concatenate([T, np.maximum(T - one_day, 0.0), T, T])
+    batch[3] = np.concatenate([r, r, r, r + 0.01])
+    batch[4] = np.concatenate([sigma, sigma, sigma + 0.01, sigma])
+
+    # Degenerate contracts run on a dummy tree and are overwritten below
+    degenerate = (batch[2] <= 0) | (batch[4] <= 0)
+    tree = list(batch)
+    tree[2], tree[4] = np.where(degenerate, 1.0, batch[2]), np.where(degenerate, 1.0, batch[4])
+    width = 2 if method == 'binomial' else 1
+    values, offsets, _, _ = _induct(*tree, steps, method, width=width)
+
+    price = values[:, 1]
+    if degenerate.any():
+        floor = np.maximum(intrinsic_value(batch[0], batch[1], batch[6]), bs_price(*batch[:5], batch[6], batch[5]))
+        price = np.where(degenerate, floor, price)
+    base, decayed, vol_up, rate_up = price.reshape(4, n)
+
+    down, up = (S * np.exp(offsets[:n, 0]), S * np.exp(offsets[:n, 2]))
+    v_down, v_base, v_up = values[:n, 0], values[:n, 1], values[:n, 2]
+    delta = (v_up - v_down) / (up - down)
+    gamma = ((v_up - v_base) / (up - S) - (v_base - v_down) / (S - down)) / (0.5 * (up - down))
+
+    # Expired or zero-vol contracts: delta from the payoff, no convexity
+    live = ~degenerate[:n]
+    itm = np.where(is_call, S > K, S < K)
+    delta = np.where(live, delta, np.where(itm, np.where(is_call, 1.0, -1.0), 0.0))
+    gamma = np.where(live, gamma, 0.0)
+
+    greeks = {
+        'delta': delta,
+        'gamma': gamma,
+        'theta': decayed - base,
+        'vega': vol_up - base,
+        'rho': rate_up - base,
+    }
+    return {name: value.reshape(shape) for name, value in greeks.items()}
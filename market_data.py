@@ -0,0 +1,399 @@
+"""
+Market Data Module
+
+Process-wide caching and batched fetching for Tradier market data, so
+repeated lookups of the same symbol within a short window are served from
+memory and a whole portfolio is quoted in as few requests as possible.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+TRADIER_API_BASE = "https://api.tradier.com/v1"
+
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry TTL, bounded size and LRU eviction"""
+
+    def __init__(self, ttl=5.0, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (stored_at, value, ttl), oldest use first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, max_age=None):
+        """
+        Return the cached value for key, or None if missing or stale
+
+        Args:
+            key: Cache key
+            max_age: Optional freshness bound in seconds, tighter than the cache TTL
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value, ttl = entry
+            age = time.monotonic() - stored_at
+            if age >= (ttl if max_age is None else min(ttl, max_age)):
+                if age >= ttl:
+                    # Past the entry's TTL, nobody can use it any more
+                    del self._data[key]
+                    self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key (for ttl seconds, default the cache TTL), evicting LRU entries beyond maxsize"""
+        with self._lock:
+            self._data[key] = (time.monotonic(), value, self.ttl if ttl is None else ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Counters for tuning TTL and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0.0
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TradierClient:
+    """
+    Shared Tradier REST client
+
+    Holds one pooled requests.Session so connections (and their TLS sessions)
+    are kept alive and reused across calls and threads, and applies
+    connect/read timeouts so a stalled socket can't hang a worker.
+    """
+
+    def __init__(self, token=None, base_url=TRADIER_API_BASE, pool_connections=None,
+                 pool_maxsize=None, connect_timeout=None, read_timeout=None, max_retries=None):
+        self.token = token
+        self.base_url = base_url
+        self.timeout = (connect_timeout or Config.TRADIER_CONNECT_TIMEOUT,
+                        read_timeout or Config.TRADIER_READ_TIMEOUT)
+
+        self.pool_connections = pool_connections or Config.TRADIER_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or Config.TRADIER_POOL_MAXSIZE
+        self.max_retries = Config.TRADIER_MAX_RETRIES if max_retries is None else max_retries
+
+        retries = Retry(
+            total=self.max_retries,
+            backoff_factor=0.2,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST'])  # every Tradier call we make is a read
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retries
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers.update({'Accept': 'application/json', 'Connection': 'keep-alive'})
+
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.total_seconds = 0.0
+
+    def get_token(self):
+        return self.token or Config.TRADIER_API_TOKEN or os.getenv('TRADIER_API_TOKEN')
+
+    def get_headers(self):
+        """Authorization headers, or None when no token is configured"""
+        token = self.get_token()
+        if not token or token == 'your_tradier_token_here':
+            return None
+        return {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+
+    def is_configured(self):
+        return self.get_headers() is not None
+
+    def request(self, method, path, **kwargs):
+        """Send a request to base_url + path on the pooled session; raises requests exceptions"""
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('headers', self.get_headers())
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.error_count += 1
+            raise
+        finally:
+            with self._lock:
+                self.request_count += 1
+                self.total_seconds += time.perf_counter() - started
+
+    def get(self, path, params=None, **kwargs):
+        return self.request('GET', path, params=params, **kwargs)
+
+    def post(self, path, data=None, **kwargs):
+        return self.request('POST', path, data=data, **kwargs)
+
+    def stats(self):
+        """Request and latency counters plus the configured pool settings"""
+        with self._lock:
+            return {
+                'requests': self.request_count,
+                'errors': self.error_count,
+                'avg_latency_ms': round(self.total_seconds / self.request_count * 1000, 2) if self.request_count else 0.0,
+                'pool_connections': self.pool_connections,
+                'pool_maxsize': self.pool_maxsize,
+                'max_retries': self.max_retries,
+                'timeout': self.timeout
+            }
+
+
+class SingleFlight:
+    """
+    Request coalescing for identical concurrent fetches
+
+    The first caller for a key runs the fetch; callers arriving while it is in
+    flight wait for it and share its result (or its exception) instead of
+    issuing their own request.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.executed += 1
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'shared': self.shared,
+                'in_flight': len(self._calls)
+            }
+
+
+tradier_client = TradierClient()
+single_flight = SingleFlight()
+
+# Shared quote cache: symbol -> last price
+quote_cache = TTLCache(ttl=Config.QUOTE_CACHE_TTL, maxsize=Config.QUOTE_CACHE_MAXSIZE)
+
+# Parsed option chains: (symbol, expiration) -> (calls_df, puts_df)
+chain_cache = TTLCache(ttl=Config.CHAIN_CACHE_TTL, maxsize=Config.CHAIN_CACHE_MAXSIZE)
+
+# Expiration date lists change at most daily, so they live longer: symbol -> [dates]
+expirations_cache = TTLCache(ttl=Config.EXPIRATIONS_CACHE_TTL, maxsize=Config.CHAIN_CACHE_MAXSIZE)
+
+# Betas against the portfolio benchmark: symbol -> beta
+beta_cache = TTLCache(ttl=Config.BETA_CACHE_TTL, maxsize=Config.QUOTE_CACHE_MAXSIZE)
+
+
+def occ_symbol(underlying, expiration_date, option_type, strike):
+    """OCC option symbol, e.g. AAPL250620C00195000"""
+    return "{}{}{}{:08d}".format(
+        underlying.upper(),
+        expiration_date.strftime('%y%m%d'),
+        'C' if option_type == 'call' else 'P',
+        int(round(strike * 1000))
+    )
+
+
+def quote_price(quote):
+    """Last trade price, or the bid/ask mid when there is no last (illiquid options)"""
+    last = quote.get('last') or 0
+    if not last:
+        bid, ask = quote.get('bid'), quote.get('ask')
+        if bid and ask:
+            last = (bid + ask) / 2
+    return float(last) if last else None
+
+
+def fetch_quotes(symbols, batch_size=None):
+    """
+    Get prices for many stock and OCC option symbols at once
+
+    Fresh prices come from the quote cache; the rest are requested from
+    Tradier's /markets/quotes endpoint in comma-separated batches.
+
+    Args:
+        symbols: Iterable of symbols (duplicates are fetched once)
+        batch_size: Symbols per request (defaults to Config.QUOTE_BATCH_SIZE)
+
+    Returns:
+        Dict of symbol -> price; symbols without a usable quote are omitted
+    """
+    batch_size = batch_size or Config.QUOTE_BATCH_SIZE
+    prices = {}
+    missing = []
+    for symbol in dict.fromkeys(s for s in symbols if s):
+        price = quote_cache.get(symbol)
+        if price is not None:
+            prices[symbol] = price
+        else:
+            missing.append(symbol)
+
+    if not missing or not tradier_client.is_configured():
+        return prices
+
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        try:
+            # Identical batches requested concurrently (e.g. the same book marked twice) share one fetch
+            prices.update(single_flight.do(('quotes', tuple(batch)), _fetch_quote_batch, batch))
+        except Exception as e:
+            print(f"Error fetching quotes for {len(batch)} symbol(s): {e}")
+
+    return prices
+
+
+def _fetch_quote_batch(symbols):
+    """Request one batch of quotes and store them in the quote cache"""
+    # POST keeps long symbol lists out of the URL
+    response = tradier_client.post('/markets/quotes', data={'symbols': ','.join(symbols)})
+    response.raise_for_status()
+    quotes = (response.json().get('quotes') or {}).get('quote') or []
+    if isinstance(quotes, dict):
+        quotes = [quotes]
+
+    prices = {}
+    for quote in quotes:
+        price = quote_price(quote)
+        if price is not None:
+            prices[quote['symbol']] = price
+            quote_cache.set(quote['symbol'], price)
+    return prices
+
+
+def chain_price_index(chain_df):
+    """
+    Map strike -> price for one side of a parsed chain
+
+    Uses the last trade, or the bid/ask mid when there is none (same rule as
+    quote_price), computed column-wise so a whole chain is indexed at once.
+    Strikes without a usable price are left out.
+    """
+    if chain_df is None or chain_df.empty:
+        return {}
+    bid, ask, last = (chain_df[col].to_numpy(dtype=float) for col in ('bid', 'ask', 'last'))
+    mid = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, 0.0)
+    price = np.where(last > 0, last, mid)
+    strikes = np.round(chain_df['strike'].to_numpy(dtype=float), 3)
+    usable = price > 0
+    return dict(zip(strikes[usable].tolist(), price[usable].tolist()))
+
+
+def chain_ivs(chain_df):
+    """
+    Implied volatility (decimal) of every row of one side of a parsed chain
+
+    Prefers our own solved IV (calculated_iv, percent) and falls back to
+    Tradier's mid_iv; NaN where neither is usable. The one place the two
+    sources are merged, for both the strike index and the IV surface fits.
+    """
+    vendor = chain_df['implied_volatility'].to_numpy(dtype=float) if 'implied_volatility' in chain_df else \
+        np.full(len(chain_df), np.nan)
+    if 'calculated_iv' in chain_df:
+        solved = chain_df['calculated_iv'].to_numpy(dtype=float) / 100.0
+        iv = np.where(np.isfinite(solved) & (solved > 0), solved, vendor)
+    else:
+        iv = vendor
+    return np.where(np.isfinite(iv) & (iv > 0), iv, np.nan)
+
+
+def chain_iv_index(chain_df):
+    """Map strike -> implied volatility (decimal) for one side of a parsed chain (strikes without one left out)"""
+    if chain_df is None or chain_df.empty:
+        return {}
+    iv = chain_ivs(chain_df)
+    strikes = np.round(chain_df['strike'].to_numpy(dtype=float), 3)
+    usable = np.isfinite(iv)
+    return dict(zip(strikes[usable].tolist(), iv[usable].tolist()))
+
+
+def get_http_stats():
+    stats = tradier_client.stats()
+    stats['coalesced'] = single_flight.stats()
+    return stats
+
+
+def get_cache_stats():
+    """Stats for every market-data cache, keyed by cache name"""
+    return {
+        'quotes': quote_cache.stats(),
+        'chains': chain_cache.stats(),
+        'expirations': expirations_cache.stats(),
+        'betas': beta_cache.stats()
+    }
@@ -0,0 +1,216 @@
+"""
+Position Marking Module
+
+Re-marks open positions on a background thread so page views read the latest
+stored marks instead of waiting on Tradier while the user watches a spinner.
+"""
+
+import threading
+import time
+from datetime import datetime, date
+
+import numpy as np
+
+from models import db, Trade, PositionMark
+from pricing import implied_volatility, DAYS_PER_YEAR, IV_CONVERGED, IV_BRACKETED
+
+# Risk-free rate used when backing out IV for mark history
+MARK_RISK_FREE_RATE = 0.05
+
+
+class PositionMarker:
+    """Periodically re-marks open trades for recently active users on a daemon thread"""
+
+    def __init__(self, app, mark_fn, interval=60, active_window=900):
+        """
+        Args:
+            app: Flask app (marking runs inside its app context)
+            mark_fn: Callable taking a user_id that marks and commits that user's open trades
+            interval: Seconds between marking passes
+            active_window: Users seen within this many seconds are kept marked
+        """
+        self.app = app
+        self.mark_fn = mark_fn
+        self.interval = interval
+        self.active_window = active_window
+
+        self._active = {}  # user_id -> last seen (monotonic seconds)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.errors = 0
+        self.last_run_at = None
+
+    def touch(self, user_id):
+        """Record a page view; users not marked yet wake the worker right away"""
+        with self._lock:
+            is_new = user_id not in self._active
+            self._active[user_id] = time.monotonic()
+        if is_new:
+            self._wake.set()
+
+    def active_user_ids(self):
+        """Users seen within the active window (expired ones are forgotten)"""
+        cutoff = time.monotonic() - self.active_window
+        with self._lock:
+            for user_id in [u for u, seen in self._active.items() if seen < cutoff]:
+                del self._active[user_id]
+            return list(self._active)
+
+    def run_once(self, user_ids=None):
+        """Mark the given users (default: all active users) and return how many were marked"""
+        user_ids = self.active_user_ids() if user_ids is None else user_ids
+        marked = 0
+        with self.app.app_context():
+            try:
+                for user_id in user_ids:
+                    try:
+                        self.mark_fn(user_id)
+                        marked += 1
+                    except Exception as e:
+                        self.errors += 1
+                        db.session.rollback()
+                        print(f"Background marking failed for user {user_id}: {e}")
+            finally:
+                db.session.remove()
+        self.runs += 1
+        self.last_run_at = datetime.utcnow()
+        return marked
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='position-marker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Background marking pass failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def stats(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'interval': self.interval,
+            'active_users': len(self.active_user_ids()),
+            'runs': self.runs,
+            'errors': self.errors,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None
+        }
+
+
+def get_users_with_open_trades():
+    """Ids of every user holding at least one open position"""
+    rows = db.session.query(Trade.user_id).filter(Trade.exit_price.is_(None)).distinct().all()
+    return [row.user_id for row in rows]
+
+
+def get_last_marked_at(user_id):
+    """Most recent mark time across a user's open trades, or None if never marked"""
+    return db.session.query(db.func.max(Trade.marked_at))\
+                     .filter(Trade.user_id == user_id, Trade.exit_price.is_(None))\
+                     .scalar()
+
+
+def _mark_key(underlying_price, option_price, profit_loss):
+    """Values compared to decide whether a mark changed"""
+    return tuple(None if v is None else round(v, 4) for v in (underlying_price, option_price, profit_loss))
+
+
+def record_position_marks(trades, underlying_prices, option_prices, marked_at):
+    """
+    Append a PositionMark for every trade whose mark changed since its last one
+
+    Rows are added to the current session with a single batched insert, so they
+    commit together with the P&L updates. IVs for single-leg options are solved
+    in one vectorized pass.
+
+    Args:
+        trades: Open trades that were just marked
+        underlying_prices: Dict of trade id -> underlying price used
+        option_prices: Dict of trade id -> option (or spread) price used
+        marked_at: Timestamp for the new rows
+
+    Returns:
+        Number of rows written
+    """
+    if not trades:
+        return 0
+
+    rows = [{
+        'trade_id': trade.id,
+        'marked_at': marked_at,
+        'underlying_price': underlying_prices.get(trade.id),
+        'option_price': option_prices.get(trade.id),
+        'profit_loss': trade.profit_loss,
+        'implied_volatility': None
+    } for trade in trades]
+
+    # Latest existing mark per trade, in one query
+    trade_ids = [row['trade_id'] for row in rows]
+    latest_ids = db.session.query(db.func.max(PositionMark.id))\
+                           .filter(PositionMark.trade_id.in_(trade_ids))\
+                           .group_by(PositionMark.trade_id)
+    last_marks = {mark.trade_id: mark for mark in
+                  PositionMark.query.filter(PositionMark.id.in_(latest_ids)).all()}
+
+    changed = []
+    for trade, row in zip(trades, rows):
+        last = last_marks.get(trade.id)
+        if last is not None and \
+                _mark_key(row['underlying_price'], row['option_price'], row['profit_loss']) == \
+                _mark_key(last.underlying_price, last.option_price, last.profit_loss):
+            continue
+        changed.append((trade, row))
+
+    _fill_implied_volatility(changed)
+
+    if changed:
+        db.session.execute(db.insert(PositionMark), [row for _, row in changed])
+    return len(changed)
+
+
+def _fill_implied_volatility(changed):
+    """Solve IV for the single-leg option rows that have both prices"""
+    solvable = [(trade, row) for trade, row in changed
+                if trade.is_option_trade() and not trade.is_spread_trade()
+                and trade.strike_price and trade.expiration_date
+                and row['underlying_price'] and row['option_price']]
+    if not solvable:
+        return
+
+    today = date.today()
+    result = implied_volatility(
+        [row['option_price'] for _, row in solvable],
+        [row['underlying_price'] for _, row in solvable],
+        [trade.strike_price for trade, _ in solvable],
+        [(trade.expiration_date - today).days / DAYS_PER_YEAR for trade, _ in solvable],
+        MARK_RISK_FREE_RATE,
+        [trade.get_option_type() for trade, _ in solvable]
+    )
+    solved = np.isin(result.status, (IV_CONVERGED, IV_BRACKETED))
+    for (trade, row), iv, ok in zip(solvable, result.iv, solved):
+        row['implied_volatility'] = round(float(iv) * 100, 2) if ok else None
+
+
+def get_mark_history(trade_id, since=None):
+    """Marks for one trade in time order, optionally only those after `since`"""
+    query = PositionMark.query.filter_by(trade_id=trade_id)
+    if since is not None:
+        query = query.filter(PositionMark.marked_at >= since)
+    return query.order_by(PositionMark.marked_at).all()
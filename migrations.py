@@ -0,0 +1,176 @@
+"""
+Schema Migrations
+
+db.create_all() creates missing tables but never alters existing ones, so
+databases created by an older version of the app would be missing newer
+columns and indexes. upgrade_schema() applies those additive changes in place,
+and drops the one constraint older schemas got wrong (a table-wide unique
+journal date).
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import inspect, text
+
+from models import db, Trade, TradingJournal, PerformanceRollup
+from rollups import rebuild_rollups
+from pagination import paginated_trades_query, DEFAULT_PER_PAGE
+
+
+def add_missing_columns():
+    """Add model columns missing from existing tables (new columns must be nullable)"""
+    engine = db.engine
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+            added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def add_missing_indexes():
+    """Create model indexes missing from existing tables"""
+    engine = db.engine
+    inspector = inspect(engine)
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            index.create(bind=engine)
+            added.append(index.name)
+
+    return added
+
+
+def drop_journal_date_unique():
+    """
+    Drop the table-wide UNIQUE (journal_date) older schemas put on trading_journal
+
+    Journal dates are unique per user (ix_trading_journal_user_date); the old
+    constraint let only one user journal any given day. SQLite can't drop the
+    constraint's autoindex, so there the table is rebuilt and its rows copied.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    table = TradingJournal.__table__
+    if not inspector.has_table(table.name):
+        return []
+    legacy = [constraint for constraint in inspector.get_unique_constraints(table.name)
+              if constraint['column_names'] == ['journal_date']]
+    if not legacy:
+        return []
+
+    preparer = engine.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            old = preparer.quote(f"{table.name}_old")
+            columns = ', '.join(preparer.format_column(column) for column in table.columns)
+            # Named indexes follow a renamed table, so drop them for create() to rebuild
+            for index in inspector.get_indexes(table.name):
+                conn.execute(text(f"DROP INDEX {preparer.quote(index['name'])}"))
+            conn.execute(text(f"ALTER TABLE {name} RENAME TO {old}"))
+            table.create(conn)
+            conn.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {old}"))
+            conn.execute(text(f"DROP TABLE {old}"))
+        else:
+            for constraint in legacy:
+                drop = 'INDEX' if engine.dialect.name == 'mysql' else 'CONSTRAINT'
+                conn.execute(text(f"ALTER TABLE {name} DROP {drop} {preparer.quote(constraint['name'])}"))
+    return [f"{table.name} UNIQUE (journal_date)"]
+
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes; returns the list of changes applied"""
+    had_rollups = inspect(db.engine).has_table(PerformanceRollup.__tablename__)
+    db.create_all()
+    columns = add_missing_columns()
+    for change in columns:
+        print(f"Added column {change}")
+    dropped = drop_journal_date_unique()
+    for change in dropped:
+        print(f"Dropped constraint {change}")
+    indexes = add_missing_indexes()
+    for change in indexes:
+        print(f"Added index {change}")
+    if not had_rollups:
+        # Backfill from existing trades; from here on they are kept up to date incrementally
+        print(f"Built {rebuild_rollups()} performance rollup row(s)")
+    return columns + dropped + indexes
+
+
+# Hot query shapes and the index each one should be planned with
+INDEXED_QUERIES = {
+    'get_recent_trades': 'ix_trade_user_entry_date',
+    'trades_pagination': 'ix_trade_user_entry_date',
+    'update_open_positions_pnl': 'ix_trade_user_open',
+    'journal_by_date': 'ix_trading_journal_user_date',
+    'journal_day_trades': 'ix_trade_user_entry_date',
+}
+
+
+def _hot_queries(user_id=1):
+    """The statements behind INDEXED_QUERIES, built the same way the app builds them"""
+    return {
+        'get_recent_trades': Trade.query.filter_by(user_id=user_id)
+                                        .order_by(Trade.entry_date.desc()).limit(10),
+        'trades_pagination': paginated_trades_query(user_id, after=(datetime.utcnow(), 0))
+                                 .limit(DEFAULT_PER_PAGE + 1),
+        'update_open_positions_pnl': Trade.query.filter_by(user_id=user_id)
+                                                .filter(Trade.exit_price.is_(None)),
+        'journal_by_date': TradingJournal.query.filter_by(user_id=user_id, journal_date=date.today()),
+        'journal_day_trades': TradingJournal(user_id=user_id, journal_date=date.today()).day_trades_query(),
+    }
+
+
+def explain_query(query):
+    """The database's query plan for an ORM query, as text lines"""
+    engine = db.engine
+    statement = query.statement.compile(engine, compile_kwargs={'literal_binds': True})
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+            return [row[-1] for row in rows]
+        if engine.dialect.name == 'postgresql':
+            # Small tables would otherwise be planned as sequential scans
+            conn.execute(text("SET enable_seqscan = off"))
+            return [row[0] for row in conn.execute(text(f"EXPLAIN {statement}")).fetchall()]
+        return [str(row) for row in conn.execute(text(f"EXPLAIN {statement}")).fetchall()]
+
+
+def check_index_usage():
+    """
+    Explain each hot query and check the planner picks its index
+
+    Returns:
+        Dict of query name -> {'index', 'used', 'plan'}
+    """
+    results = {}
+    for name, query in _hot_queries().items():
+        plan = explain_query(query)
+        index = INDEXED_QUERIES[name]
+        results[name] = {
+            'index': index,
+            'used': any(index in line for line in plan),
+            'plan': plan
+        }
+    return results
@@ -1,16 +1,35 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import secrets
 import json
 import os
-import requests
 from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy.dialects import postgresql, sqlite
 from config import Config      # <‑‑ grabs TRADIER_API_TOKEN
+from market_data import fetch_quotes, occ_symbol
+from pricing import CONTRACT_MULTIPLIER
+from strategies import Leg, Strategy
 
 
-db = SQLAlchemy()
+# Bind key of the optional read-only replica (Config.DATABASE_REPLICA_URL)
+REPLICA_BIND = 'replica'
+
+
+class ReplicaRoutingSession(FlaskSession):
+    """Session that reads from the replica bind while session.info['use_replica'] is set and nothing is pending"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not (self.new or self.dirty or self.deleted):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': ReplicaRoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,18 +48,38 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def get_trade_stats(self):
+        """
+        Dashboard stats from one aggregate query over the user's trades
+        
+        Returns:
+            Dict with total_trades, trades_analyzed, win_rate (percent of closed
+            trades with positive P&L) and total_pnl (sum of all recorded P&L)
+        """
+        is_closed = Trade.exit_price.isnot(None)
+        row = db.session.query(
+            db.func.count(Trade.id).label('total_trades'),
+            db.func.sum(db.case((Trade.is_analyzed.is_(True), 1), else_=0)).label('trades_analyzed'),
+            db.func.sum(db.case((is_closed, 1), else_=0)).label('closed_trades'),
+            db.func.sum(db.case((is_closed & (Trade.profit_loss > 0), 1), else_=0)).label('winning_trades'),
+            db.func.sum(Trade.profit_loss).label('total_pnl')
+        ).filter(Trade.user_id == self.id).one()
+        
+        closed_trades = row.closed_trades or 0
+        return {
+            'total_trades': row.total_trades,
+            'trades_analyzed': row.trades_analyzed or 0,
+            'win_rate': (row.winning_trades or 0) / closed_trades * 100 if closed_trades else 0,
+            'total_pnl': row.total_pnl or 0
+        }
+    
     def get_win_rate(self):
         """Calculate user's win rate"""
-        closed_trades = Trade.query.filter_by(user_id=self.id).filter(Trade.exit_price.isnot(None)).all()
-        if not closed_trades:
-            return 0
-        winning_trades = [t for t in closed_trades if t.profit_loss and t.profit_loss > 0]
-        return len(winning_trades) / len(closed_trades) * 100
+        return self.get_trade_stats()['win_rate']
     
     def get_total_pnl(self):
         """Calculate total P&L"""
-        closed_trades = Trade.query.filter_by(user_id=self.id).filter(Trade.profit_loss.isnot(None)).all()
-        return sum(trade.profit_loss for trade in closed_trades if trade.profit_loss)
+        return self.get_trade_stats()['total_pnl']
     
     def get_recent_trades(self, limit=10):
         """Get recent trades"""
@@ -57,48 +96,20 @@ def _r(value, places=2):
 
 
 class Trade(db.Model):
+    __table_args__ = (
+        # Recent trades, trade list pagination and dashboard stats
+        db.Index('ix_trade_user_entry_date', 'user_id', 'entry_date', 'id'),
+        # Open positions (partial where the backend supports it, else user_id + exit_price)
+        db.Index('ix_trade_user_open', 'user_id', 'exit_price',
+                 sqlite_where=db.text('exit_price IS NULL'),
+                 postgresql_where=db.text('exit_price IS NULL')),
+        db.Index('ix_trade_user_analyzed', 'user_id', 'is_analyzed'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
 
-    # ────────────────────────────────────────────────────────────
-    # NEW: live quote via Tradier REST
-    # ────────────────────────────────────────────────────────────
-    def get_current_market_price(self):
-        """
-        Return the latest trade price (or bid/ask mid) from Tradier.
-        Works for stocks/ETFs and OCC‑formatted option symbols.
-        Falls back to entry_price on API failure.
-        """
-        token = Config.TRADIER_API_TOKEN or os.getenv("TRADIER_API_TOKEN")
-        if not token:
-            return self.entry_price     # graceful fallback
-
-        url = "https://api.tradier.com/v1/markets/quotes"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json"
-        }
-        try:
-            resp = requests.get(url, headers=headers,
-                                params={"symbols": self.symbol})
-            resp.raise_for_status()
-            data = resp.json()["quotes"]["quote"]
-            if isinstance(data, list):
-                data = data[0]
-
-            last = data.get("last") or 0
-            if last == 0:                       # illiquid option
-                bid, ask = data.get("bid"), data.get("ask")
-                if bid and ask:
-                    last = (bid + ask) / 2
-
-            return float(last) if last else self.entry_price
-
-        except Exception:
-            return self.entry_price        # network / JSON error fallback
-
-
     # Basic trade information
     symbol = db.Column(db.String(10), nullable=False)
     trade_type = db.Column(db.String(20), nullable=False)  # 'long', 'short', 'option_call', 'option_put'
@@ -146,6 +157,7 @@ class Trade(db.Model):
     # P&L (calculated automatically)
     profit_loss = db.Column(db.Float)
     profit_loss_percent = db.Column(db.Float)
+    marked_at = db.Column(db.DateTime)  # When open-position P&L was last marked to market
     
     # Trade context
     market_condition = db.Column(db.String(50))  # 'trending_up', 'trending_down', 'ranging', etc.
@@ -186,48 +198,32 @@ class Trade(db.Model):
         return 100 if self.is_option_trade() else 1
     
     def calculate_spread_metrics(self):
-        """Calculate spread-specific metrics"""
-        if not self.is_spread_trade() or not self.long_strike or not self.short_strike:
+        """Calculate spread-specific metrics (max profit/loss and breakeven at expiration)"""
+        if not self.is_spread_trade():
+            return
+        strategy = self.get_strategy()
+        if strategy is None:
             return
         
-        strike_width = abs(self.short_strike - self.long_strike)
-        
-        if self.trade_type == 'credit_put_spread':
-            # Bull Put Spread: Sell higher strike put, buy lower strike put
-            self.max_profit = self.net_credit * self.quantity * 100 if self.net_credit else 0
-            self.max_loss = (strike_width * self.quantity * 100) - self.max_profit
-            self.breakeven_price = self.short_strike - (self.net_credit or 0)
-        
-        elif self.trade_type == 'credit_call_spread':
-            # Bear Call Spread: Sell lower strike call, buy higher strike call
-            self.max_profit = self.net_credit * self.quantity * 100 if self.net_credit else 0
-            self.max_loss = (strike_width * self.quantity * 100) - self.max_profit
-            self.breakeven_price = self.short_strike + (self.net_credit or 0)
+        self.max_profit = strategy.max_profit()
+        self.max_loss = strategy.max_loss()
+        breakevens = strategy.breakevens()
+        self.breakeven_price = breakevens[0] if breakevens else None
     
     def calculate_spread_pnl(self):
-        """Calculate P&L for spread trades"""
-        if not self.is_spread_trade() or not self.exit_price:
+        """Calculate P&L for spread trades (exit_price is the per-spread cost to close)"""
+        if not self.is_spread_trade() or self.exit_price is None:
+            return
+        strategy = self.get_strategy()
+        if strategy is None:
             return
         
-        if self.trade_type == 'credit_put_spread':
-            # P&L = Net credit received - cost to close
-            # If expired worthless, keep full credit
-            # If assigned, pay intrinsic value
-            if self.underlying_price_at_exit and self.underlying_price_at_exit >= self.short_strike:
-                # Expired worthless - keep full credit
-                self.profit_loss = self.net_credit * self.quantity * 100
-            else:
-                # Calculate based on exit premium
-                self.profit_loss = (self.net_credit - self.exit_price) * self.quantity * 100
-        
-        elif self.trade_type == 'credit_call_spread':
-            # Similar logic for call spreads
-            if self.underlying_price_at_exit and self.underlying_price_at_exit <= self.short_strike:
-                # Expired worthless - keep full credit
-                self.profit_loss = self.net_credit * self.quantity * 100
-            else:
-                # Calculate based on exit premium
-                self.profit_loss = (self.net_credit - self.exit_price) * self.quantity * 100
+        if self.underlying_price_at_exit and strategy.expiry_value(self.underlying_price_at_exit) == 0:
+            # Expired worthless - keep the full credit
+            self.profit_loss = -strategy.cost
+        else:
+            # Credit received minus the cost to close
+            self.profit_loss = -strategy.cost - self.exit_price * self.quantity * CONTRACT_MULTIPLIER
         
         # Calculate percentage return
         if self.net_credit and self.net_credit > 0:
@@ -236,7 +232,7 @@ class Trade(db.Model):
     
     def calculate_pnl(self):
         """Calculate P&L for both open and closed trades"""
-        if self.exit_price:
+        if self.exit_price is not None:
             # Closed trade - use actual exit price
             if self.is_spread_trade():
                 self.calculate_spread_pnl()
@@ -274,50 +270,101 @@ class Trade(db.Model):
     
 
 
-# helper for finance‑style rounding
-def _r(val, places=2):
-    return float(Decimal(val).quantize(Decimal(10) ** -places,
-                                       rounding=ROUND_HALF_UP))
-
-# ‑‑‑ inside the Trade class (replace the two methods you just removed) ‑‑‑
+    def get_option_type(self):
+        """'call' or 'put' for option trades, falling back to the trade type"""
+        return self.option_type or ('put' if 'put' in self.trade_type else 'call')
+    
+    def get_quote_symbol(self):
+        """Symbol to quote for marking: OCC symbol for single-leg options, ticker otherwise"""
+        if self.is_option_trade() and not self.is_spread_trade():
+            if self.expiration_date and self.strike_price:
+                return occ_symbol(self.symbol, self.expiration_date, self.get_option_type(), self.strike_price)
+            return None
+        return self.symbol
+    
+    def get_strategy_legs(self):
+        """
+        The trade as strategy legs (quantity signed: + long, - short); empty if incomplete
+        
+        Spreads are short leg first. When the leg premiums aren't both recorded the
+        whole net credit is put on the short leg, which leaves the payoff unchanged.
+        """
+        if self.is_spread_trade():
+            if not (self.long_strike and self.short_strike):
+                return []
+            option_type = self.get_option_type()
+            days = self.get_days_to_expiration() or 0
+            net_credit = self.net_credit or 0.0
+            long_premium = self.long_premium if self.long_premium is not None and self.short_premium is not None else 0.0
+            return [Leg(option_type, self.short_strike, days, -self.quantity, net_credit + long_premium),
+                    Leg(option_type, self.long_strike, days, self.quantity, long_premium)]
+        if self.is_option_trade():
+            if not self.strike_price:
+                return []
+            return [Leg(self.get_option_type(), self.strike_price, self.get_days_to_expiration() or 0,
+                        self.quantity, self.entry_price)]
+        direction = 1 if self.trade_type == 'long' else -1
+        return [Leg('stock', None, 0, direction * self.quantity, self.entry_price)]
+    
+    def get_strategy(self):
+        """Strategy for this trade's legs, or None if the option fields are incomplete"""
+        legs = self.get_strategy_legs()
+        return Strategy(legs) if legs else None
+    
+    def get_option_legs(self):
+        """(option_type, strike) of each leg to mark, short leg first for spreads; empty if incomplete"""
+        if not self.expiration_date:
+            return []
+        return [(leg.option_type, leg.strike) for leg in self.get_strategy_legs() if leg.option_type != 'stock']
+    
+    def get_quote_symbols(self):
+        """Every symbol needed to mark this trade (the underlying plus any option legs)"""
+        return [self.symbol] + [occ_symbol(self.symbol, self.expiration_date, option_type, strike)
+                                for option_type, strike in self.get_option_legs()]
+    
     # ---------------------------------------------------------------
-    def get_current_market_price(self):
+    def get_current_market_price(self, quotes=None):
         """
         Live quote via Tradier.
         Works for stocks/ETFs and OCC‑formatted option symbols.
-        Returns entry_price on error so P&L won’t crash.
+        Pass a dict from market_data.fetch_quotes() to mark many trades from
+        one batched request. Returns entry_price on error so P&L won’t crash.
         """
-        token = Config.TRADIER_API_TOKEN or os.getenv("TRADIER_API_TOKEN")
-        if not token:
-            return self.entry_price
-
-        url = "https://api.tradier.com/v1/markets/quotes"
-        headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-
-        try:
-            r = requests.get(url, headers=headers, params={"symbols": self.symbol})
-            r.raise_for_status()
-            q = r.json()["quotes"]["quote"]
-            if isinstance(q, list): q = q[0]
-            last = q.get("last") or 0
-            if last == 0 and q.get("bid") and q.get("ask"):
-                last = (q["bid"] + q["ask"]) / 2
-            return float(last) if last else self.entry_price
-        except Exception:
-            return self.entry_price
+        if self.is_spread_trade():
+            return self._get_spread_market_value(quotes)
+        
+        symbol = self.get_quote_symbol()
+        if quotes is None:
+            quotes = fetch_quotes([symbol])
+        return quotes.get(symbol) or self.entry_price
+    
+    def _get_spread_market_value(self, quotes=None):
+        """Current cost to close one spread (short legs minus long legs), or None if unquoted"""
+        symbols = self.get_quote_symbols()[1:]
+        strategy = self.get_strategy()
+        if strategy is None or len(symbols) != len(strategy):
+            return None
+        if quotes is None:
+            quotes = fetch_quotes(symbols)
+        leg_prices = [quotes.get(symbol) for symbol in symbols]
+        if any(price is None for price in leg_prices):
+            return None
+        return -strategy.mark(leg_prices) / (self.quantity * CONTRACT_MULTIPLIER)
 
     # ---------------------------------------------------------------
-    def calculate_unrealized_pnl(self):
+    def calculate_unrealized_pnl(self, quotes=None):
         """Always mark open positions to the latest market price."""
         if self.exit_price is not None:
             return  # closed trade handled elsewhere
 
-        live = self.get_current_market_price()
+        live = self.get_current_market_price(quotes)
         if live is None:
             return
 
         if self.is_spread_trade():
-            pnl, pct = self.calculate_spread_pnl(live)
+            # Credit received minus what it costs to buy the spread back
+            pnl = ((self.net_credit or 0) - live) * self.quantity * 100
+            pct = _r((pnl / self.max_loss) * 100, 2) if self.max_loss else 0
         elif self.is_option_trade():
             pnl = (live - self.entry_price) * self.quantity * 100
             cost = self.entry_price * self.quantity * 100
@@ -515,6 +562,34 @@ def _r(val, places=2):
         return f'<Trade {self.symbol} - {self.trade_type}>'
 
 
+class PositionMark(db.Model):
+    """Append-only history of open-position marks (one row per change in a trade's mark)"""
+    __table_args__ = (
+        db.Index('ix_position_mark_trade_marked_at', 'trade_id', 'marked_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    trade_id = db.Column(db.Integer, db.ForeignKey('trade.id'), nullable=False)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    underlying_price = db.Column(db.Float)
+    option_price = db.Column(db.Float)  # Contract price, or cost to close for spreads
+    profit_loss = db.Column(db.Float)
+    implied_volatility = db.Column(db.Float)  # Percent, solved from option_price
+    
+    def to_dict(self):
+        return {
+            'marked_at': self.marked_at.isoformat(),
+            'underlying_price': self.underlying_price,
+            'option_price': self.option_price,
+            'profit_loss': self.profit_loss,
+            'implied_volatility': self.implied_volatility
+        }
+    
+    def __repr__(self):
+        return f'<PositionMark trade={self.trade_id} at {self.marked_at}>'
+
+
 class TradeAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     trade_id = db.Column(db.Integer, db.ForeignKey('trade.id'), nullable=False)
@@ -593,10 +668,14 @@ class TradeAnalysis(db.Model):
 
 class TradingJournal(db.Model):
     """Daily trading journal entries"""
+    __table_args__ = (
+        db.Index('ix_trading_journal_user_date', 'user_id', 'journal_date', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
-    journal_date = db.Column(db.Date, nullable=False, unique=True)
+    journal_date = db.Column(db.Date, nullable=False)  # Unique per user (ix_trading_journal_user_date)
     
     # Daily reflections
     daily_pnl = db.Column(db.Float)
@@ -628,11 +707,229 @@ class TradingJournal(db.Model):
     # Relationship
     user = db.relationship('User', backref=db.backref('journal_entries', lazy=True))
     
+    @staticmethod
+    def _trade_templates(trade):
+        """(setup description, entry template, market template) text describing a trade"""
+        trade_date = trade.entry_date.date()
+        
+        setup_description = f"Entered {trade.symbol} {trade.trade_type.replace('_', ' ').title()}"
+        if trade.setup_type:
+            setup_description += f" - {trade.setup_type} setup"
+        if trade.market_condition:
+            setup_description += f" in {trade.market_condition.replace('_', ' ')} market conditions"
+        
+        # Entry reason template
+        entry_template = ""
+        if trade.entry_reason:
+            entry_template = f"Trade Rationale: {trade.entry_reason}\n\n"
+        
+        # Market outlook template
+        market_template = ""
+        if trade.market_condition:
+            condition_desc = trade.market_condition.replace('_', ' ').title()
+            market_template = f"Market appeared to be {condition_desc.lower()}. "
+        
+        # Options-specific context
+        if trade.is_option_trade():
+            if trade.expiration_date:
+                days_to_exp = (trade.expiration_date - trade_date).days
+                entry_template += f"Options Trade: {trade.get_option_type().title()} option with {days_to_exp} days to expiration. "
+                if trade.strike_price:
+                    entry_template += f"Strike: ${trade.strike_price}. "
+            if trade.implied_volatility:
+                entry_template += f"IV: {trade.implied_volatility:.1f}%. "
+        
+        return setup_description, entry_template, market_template
+    
+    @classmethod
+    def from_trade(cls, trade):
+        """New journal entry for the trade's entry day, pre-filled from the trade"""
+        setup_description, entry_template, market_template = cls._trade_templates(trade)
+        journal = cls(
+            user_id=trade.user_id,
+            journal_date=trade.entry_date.date(),
+            market_outlook=market_template + "Focused on identifying quality setups.",
+            daily_goals=f"Execute {setup_description.lower()} with proper risk management.",
+            what_went_well="",  # To be filled later
+            what_went_wrong="",  # To be filled later  
+            lessons_learned="",  # To be filled later
+            tomorrow_focus="Review today's trades and prepare for tomorrow's setups.",
+            emotional_state="focused",  # Default starting state
+            stress_level=3,  # Default moderate level
+            discipline_score=8  # Default good discipline
+        )
+        
+        # Add trade-specific notes to daily goals
+        if entry_template:
+            journal.daily_goals += f"\n\n{entry_template.strip()}"
+        return journal
+    
+    def merge_trade(self, trade):
+        """Add another trade's notes to this entry, skipping text it already contains"""
+        setup_description, entry_template, market_template = self._trade_templates(trade)
+        
+        if entry_template and entry_template.strip() not in (self.daily_goals or ''):
+            self.daily_goals = (self.daily_goals or '') + f"\n\n{entry_template.strip()}"
+        
+        # Update market outlook if it's empty or add to it
+        if not self.market_outlook and market_template:
+            self.market_outlook = market_template + "Focused on identifying quality setups."
+        elif market_template and market_template.strip() not in self.market_outlook:
+            self.market_outlook += f" {market_template.strip()}"
+    
+    @classmethod
+    def upsert_from_trade(cls, trade):
+        """
+        Create the trade's journal entry, or merge the trade into the existing one, in the current transaction
+        
+        SQLite and PostgreSQL do this with a single INSERT ... ON CONFLICT (user_id, journal_date)
+        DO UPDATE; the merge rules of merge_trade() are expressed in the SET clause. Other
+        backends fall back to a lookup plus from_trade()/merge_trade(). Nothing is committed.
+        
+        Returns:
+            (journal id, True if the entry was created)
+        """
+        dialect = db.session.get_bind().dialect
+        if dialect.name == 'sqlite':
+            insert = sqlite.insert
+        elif dialect.name == 'postgresql':
+            insert = postgresql.insert
+        else:
+            insert = None
+        
+        if insert is None or not dialect.insert_returning:
+            journal = cls.query.filter_by(user_id=trade.user_id, journal_date=trade.entry_date.date()).first()
+            created = journal is None
+            if created:
+                journal = cls.from_trade(trade)
+                db.session.add(journal)
+            else:
+                journal.merge_trade(trade)
+            db.session.flush()
+            return journal.id, created
+        
+        statement = cls._upsert_statements.get(dialect.name)
+        if statement is None:
+            statement = cls._upsert_statements[dialect.name] = cls._build_upsert(insert, dialect.name)
+        
+        exists = None
+        if dialect.name == 'sqlite':
+            # RETURNING can't tell an insert from an update here, so probe first. The probe
+            # autoflushes the trade's INSERT, and SQLite serializes writers, so no other
+            # transaction can create the entry between the probe and the upsert
+            exists = db.session.execute(db.select(cls.id).filter_by(
+                user_id=trade.user_id, journal_date=trade.entry_date.date())).first() is not None
+        
+        now = datetime.utcnow()
+        template = cls.from_trade(trade)
+        params = {column.key: getattr(template, column.key) for column in cls.__table__.columns
+                  if column.key != 'id'}
+        setup_description, entry_template, market_template = cls._trade_templates(trade)
+        params.update(created_at=now, updated_at=now,
+                      merge_entry=entry_template.strip(), merge_market=market_template.strip())
+        
+        row = db.session.execute(statement, params).one()
+        return row.id, (not exists) if exists is not None else bool(row.inserted)
+    
+    # Compiled once per dialect; the per-trade text is bound as :merge_entry / :merge_market
+    _upsert_statements = {}
+    
+    @classmethod
+    def _build_upsert(cls, insert, dialect_name):
+        """INSERT ... ON CONFLICT DO UPDATE applying merge_trade()'s rules in SQL"""
+        table = cls.__table__
+        find = db.func.instr if dialect_name == 'sqlite' else db.func.strpos  # 1-based position, 0 if absent
+        entry = db.bindparam('merge_entry', type_=db.Text)
+        market = db.bindparam('merge_market', type_=db.Text)
+        daily_goals = db.func.coalesce(table.c.daily_goals, '')
+        market_outlook = db.func.coalesce(table.c.market_outlook, '')
+        
+        statement = insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.journal_date],
+            set_={
+                'daily_goals': db.case(
+                    (db.or_(entry == '', find(daily_goals, entry) > 0), table.c.daily_goals),
+                    else_=daily_goals + '\n\n' + entry
+                ),
+                'market_outlook': db.case(
+                    (market == '', table.c.market_outlook),
+                    (market_outlook == '', market + ' Focused on identifying quality setups.'),
+                    (find(market_outlook, market) > 0, table.c.market_outlook),
+                    else_=market_outlook + ' ' + market
+                ),
+                'updated_at': statement.excluded.updated_at
+            }
+        ).returning(table.c.id, *(
+            # xmax is 0 only on a row version this statement inserted
+            [db.literal_column('(xmax = 0)', db.Boolean).label('inserted')] if dialect_name == 'postgresql' else []
+        ))
+    
+    def day_trades_query(self):
+        """Query for the trades entered on this journal date"""
+        # Half-open [day, next day) range so the (user_id, entry_date) index can be used
+        day_start = datetime.combine(self.journal_date, datetime.min.time())
+        return Trade.query.filter_by(user_id=self.user_id).filter(
+            Trade.entry_date >= day_start,
+            Trade.entry_date < day_start + timedelta(days=1)
+        ).order_by(Trade.entry_date)
+    
     def get_day_trades(self):
         """Get all trades for this journal date"""
-        return Trade.query.filter_by(user_id=self.user_id).filter(
-            db.func.date(Trade.entry_date) == self.journal_date
-        ).all()
+        return self.day_trades_query().all()
+    
+    @staticmethod
+    def get_trades_by_day(user_id, journal_dates):
+        """
+        Trades for many journal dates from one query
+        
+        One [day, day + 1) entry_date range per date, OR'd together, so only
+        the requested days are read (each range still uses
+        ix_trade_user_entry_date) even when the dates are far apart.
+        
+        Args:
+            user_id: Owner of the trades
+            journal_dates: Dates to look up (e.g. one page of journal entries)
+        
+        Returns:
+            Dict of date -> list of trades entered that day (empty list if none)
+        """
+        trades_by_day = {day: [] for day in journal_dates}
+        if not trades_by_day:
+            return trades_by_day
+        
+        day_ranges = []
+        for day in sorted(trades_by_day):
+            day_start = datetime.combine(day, datetime.min.time())
+            day_ranges.append(db.and_(Trade.entry_date >= day_start,
+                                      Trade.entry_date < day_start + timedelta(days=1)))
+        trades = Trade.query.filter_by(user_id=user_id).filter(db.or_(*day_ranges))\
+                            .order_by(Trade.entry_date).all()
+        
+        for trade in trades:
+            day_trades = trades_by_day.get(trade.entry_date.date())
+            if day_trades is not None:
+                day_trades.append(trade)
+        return trades_by_day
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'journal_date': self.journal_date.isoformat(),
+            'daily_pnl': self.daily_pnl,
+            'market_outlook': self.market_outlook,
+            'daily_goals': self.daily_goals,
+            'what_went_well': self.what_went_well,
+            'what_went_wrong': self.what_went_wrong,
+            'lessons_learned': self.lessons_learned,
+            'tomorrow_focus': self.tomorrow_focus,
+            'emotional_state': self.emotional_state,
+            'stress_level': self.stress_level,
+            'discipline_score': self.discipline_score,
+            'daily_score': self.daily_score,
+            'market_trend': self.market_trend,
+            'volatility': self.volatility
+        }
     
     def __repr__(self):
         return f'<TradingJournal {self.journal_date}>'
@@ -668,4 +965,50 @@ class UserSettings(db.Model):
     user = db.relationship('User', backref=db.backref('settings', uselist=False, lazy=True))
     
     def __repr__(self):
-        return f'<UserSettings for User {self.user_id}>' 
\ No newline at end of file
+        return f'<UserSettings for User {self.user_id}>' 
+
+class PerformanceRollup(db.Model):
+    """
+    Running performance totals over a user's closed trades
+    
+    One row per (user, scope, bucket): scope 'all' has a single '' bucket, 'setup'
+    is bucketed by setup type and 'day' by exit date (ISO). Maintained
+    incrementally by rollups.py as trades change.
+    """
+    __table_args__ = (
+        db.Index('ix_performance_rollup_user_scope_bucket', 'user_id', 'scope', 'bucket', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    scope = db.Column(db.String(10), nullable=False)  # 'all', 'setup', 'day'
+    bucket = db.Column(db.String(100), nullable=False, default='')
+    
+    trade_count = db.Column(db.Integer, nullable=False, default=0)
+    winning_trades = db.Column(db.Integer, nullable=False, default=0)
+    losing_trades = db.Column(db.Integer, nullable=False, default=0)
+    total_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    gross_profit = db.Column(db.Float, nullable=False, default=0.0)
+    gross_loss = db.Column(db.Float, nullable=False, default=0.0)  # Sum of losing P&L (negative)
+    max_pnl = db.Column(db.Float)
+    min_pnl = db.Column(db.Float)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_stats(self):
+        """Stats in the shape the analytics page shows"""
+        return {
+            'total_trades': self.trade_count,
+            'winning_trades': self.winning_trades,
+            'losing_trades': self.losing_trades,
+            'win_rate': self.winning_trades / self.trade_count * 100 if self.trade_count else 0,
+            'total_pnl': self.total_pnl,
+            'avg_win': self.gross_profit / self.winning_trades if self.winning_trades else 0,
+            'avg_loss': self.gross_loss / self.losing_trades if self.losing_trades else 0,
+            'largest_win': self.max_pnl or 0,
+            'largest_loss': self.min_pnl or 0,
+            'profit_factor': abs(self.gross_profit / self.gross_loss) if self.gross_loss else 0
+        }
+    
+    def __repr__(self):
+        return f'<PerformanceRollup user={self.user_id} {self.scope}:{self.bucket}>'
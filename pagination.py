@@ -0,0 +1,116 @@
+"""
+Keyset Pagination
+
+Cursor-based paging for the trade and journal listings. Each page continues
+from the sort key of the last row on the previous page, so the database seeks
+straight to it through the (user_id, entry_date, id) / (user_id, journal_date)
+indexes: deep pages cost the same as the first and no COUNT(*) is issued.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from models import db, Trade, TradingJournal
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor string can't be decoded"""
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the next one"""
+
+    def __init__(self, items, next_cursor=None, cursor=None, per_page=DEFAULT_PER_PAGE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(*values):
+    """Opaque URL-safe cursor for a sort key (dates/datetimes and ints)"""
+    payload = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """List of raw sort-key values from encode_cursor (dates still as ISO strings)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def clamp_per_page(per_page):
+    return max(1, min(per_page or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+
+
+def paginated_trades_query(user_id, after=None):
+    """Trades newest first, optionally strictly after an (entry_date, id) key in that order"""
+    query = Trade.query.filter_by(user_id=user_id)
+    if after is not None:
+        entry_date, trade_id = after
+        # Expanded row-value comparison (entry_date, id) < (:entry_date, :id), portable across
+        # backends; the redundant <= bound lets the planner seek the index instead of scanning to the cursor
+        query = query.filter(Trade.entry_date <= entry_date, db.or_(
+            Trade.entry_date < entry_date,
+            db.and_(Trade.entry_date == entry_date, Trade.id < trade_id)
+        ))
+    return query.order_by(Trade.entry_date.desc(), Trade.id.desc())
+
+
+def paginate_trades(user_id, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """Trades newest first, keyed on (entry_date, id)"""
+    per_page = clamp_per_page(per_page)
+    after = None
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            after = (datetime.fromisoformat(values[0]), int(values[1]))
+        except (IndexError, TypeError, ValueError) as e:
+            raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+    rows = paginated_trades_query(user_id, after).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1].entry_date, items[-1].id) if len(rows) > per_page else None
+    return KeysetPage(items, next_cursor, cursor, per_page)
+
+
+def paginate_journals(user_id, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """Journal entries newest first, keyed on journal_date (one entry per user per day)"""
+    per_page = clamp_per_page(per_page)
+    query = TradingJournal.query.filter_by(user_id=user_id)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            journal_date = date.fromisoformat(values[0])
+        except (IndexError, TypeError, ValueError) as e:
+            raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+        query = query.filter(TradingJournal.journal_date < journal_date)
+
+    rows = query.order_by(TradingJournal.journal_date.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1].journal_date) if len(rows) > per_page else None
+    return KeysetPage(items, next_cursor, cursor, per_page)
@@ -0,0 +1,172 @@
+"""
+Portfolio Greeks
+
+Reprices a user's open positions in one vectorized pass. The legs of every
+trade are flattened into a single leg array (strategies.Strategy), their
+Greeks come from one bs_greeks call, and per-position and per-underlying
+figures are summed with bincount, so a 100-position book costs the same
+single evaluation as one option. Prices and IVs come from the market-data
+caches: the underlying quote, then each leg's IV from its expiration's chain.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yfinance as yf
+
+from config import Config
+from market_data import beta_cache, single_flight, occ_symbol
+from strategies import Strategy, GREEKS
+
+DEFAULT_BETA = 1.0
+FALLBACK_VOL = 0.3
+PORTFOLIO_RATE = 0.05
+
+# Reported per position, per underlying and in total (beta-weighted delta needs the benchmark price)
+REPORTED_GREEKS = GREEKS + ('beta_weighted_delta',)
+
+# Where each leg's volatility came from: the live chain, the IV recorded at entry, or FALLBACK_VOL
+IV_SOURCES = ('chain', 'entry', 'fallback')
+
+
+def get_betas(symbols, benchmark):
+    """
+    Beta of each symbol, cached for BETA_CACHE_TTL seconds
+
+    Betas are Yahoo Finance's (5-year monthly against the S&P 500), so the
+    benchmark should track the S&P 500. Symbols without a published beta get
+    DEFAULT_BETA; the benchmark itself is 1. Cache misses are looked up
+    concurrently, and a failed lookup is cached as DEFAULT_BETA for
+    BETA_FAILURE_TTL seconds so polling doesn't retry it every time.
+    """
+    betas = {}
+    missing = []
+    for symbol in dict.fromkeys(symbols):
+        if symbol == benchmark:
+            betas[symbol] = 1.0
+            continue
+        betas[symbol] = beta_cache.get(symbol)
+        if betas[symbol] is None:
+            missing.append(symbol)
+
+    if len(missing) == 1:
+        betas[missing[0]] = _lookup_beta(missing[0])
+    elif missing:
+        with ThreadPoolExecutor(max_workers=min(len(missing), Config.BETA_FETCH_WORKERS)) as pool:
+            betas.update(zip(missing, pool.map(_lookup_beta, missing)))
+    return betas
+
+
+def _lookup_beta(symbol):
+    # Concurrent requests for the same symbol share one in-flight fetch
+    try:
+        return single_flight.do(('beta', symbol), _fetch_beta, symbol)
+    except Exception as e:
+        print(f"Error fetching beta for {symbol}: {e}")
+        beta_cache.set(symbol, DEFAULT_BETA, ttl=Config.BETA_FAILURE_TTL)
+        return DEFAULT_BETA
+
+
+def _fetch_beta(symbol):
+    beta = yf.Ticker(symbol).info.get('beta')
+    beta = float(beta) if beta is not None else DEFAULT_BETA
+    beta_cache.set(symbol, beta)
+    return beta
+
+
+def leg_contracts(trade):
+    """OCC symbol of each of a trade's strategy legs (None for stock legs and undated options)"""
+    return [occ_symbol(trade.symbol, trade.expiration_date, leg.option_type, leg.strike)
+            if leg.option_type != 'stock' and trade.expiration_date else None
+            for leg in trade.get_strategy_legs()]
+
+
+def _sum_by(groups, count, values):
+    return np.bincount(groups, weights=values, minlength=count)
+
+
+def _rounded(greeks, index=None):
+    """Greek values at index (or summed) rounded for JSON; None for Greeks that weren't computed"""
+    return {name: round(float(greeks[name][index] if index is not None else greeks[name].sum()), 4)
+            if name in greeks else None for name in REPORTED_GREEKS}
+
+
+def portfolio_greeks(trades, underlying_prices, leg_vols, betas, benchmark_price=None, rate=PORTFOLIO_RATE):
+    """
+    Greeks per position, per underlying and in total
+
+    Greeks are in dollars per unit move: delta and gamma in shares of the
+    underlying, theta per day, vega and rho per percentage point.
+    beta_weighted_delta is delta converted to benchmark shares
+    (delta * price * beta / benchmark_price).
+
+    Args:
+        trades: Open trades
+        underlying_prices: Dict of symbol -> price
+        leg_vols: Dict of OCC symbol -> implied volatility (decimal), e.g. from the chains
+        betas: Dict of symbol -> beta against the benchmark
+        benchmark_price: Benchmark price (beta-weighted delta is None without it)
+        rate: Risk-free rate (decimal)
+
+    Returns:
+        Dict with positions, underlyings, totals and the ids of unpriced trades
+        (incomplete option fields or no underlying quote)
+    """
+    legs, owners, contracts = [], [], []
+    priced, unpriced = [], []
+    for trade in trades:
+        trade_legs = trade.get_strategy_legs()
+        if not trade_legs or not underlying_prices.get(trade.symbol):
+            unpriced.append(trade.id)
+            continue
+        legs.extend(trade_legs)
+        contracts.extend(leg_contracts(trade))
+        owners.extend([len(priced)] * len(trade_legs))
+        priced.append(trade)
+
+    result = {'positions': [], 'underlyings': [], 'totals': None, 'unpriced': unpriced}
+    if not priced:
+        result['totals'] = {name: 0.0 for name in REPORTED_GREEKS}
+        return result
+
+    owners = np.array(owners)
+    book = Strategy(legs)  # Every leg of every position, on different underlyings
+    spot = np.array([underlying_prices[priced[owner].symbol] for owner in owners], dtype=float)
+
+    # Chain IV, else the IV recorded at entry (percent), else the fallback
+    chain_vols = np.array([leg_vols.get(contract) or np.nan for contract in contracts], dtype=float)
+    entry_vols = np.array([(priced[owner].implied_volatility or np.nan) / 100.0 for owner in owners], dtype=float)
+    sources = np.where(np.isfinite(chain_vols), 0, np.where(np.isfinite(entry_vols) & (entry_vols > 0), 1, 2))
+    vols = np.choose(sources, (np.nan_to_num(chain_vols), np.nan_to_num(entry_vols), FALLBACK_VOL))
+
+    leg_greeks = book.leg_greeks(spot, vols, rate)
+    beta = np.array([betas.get(priced[owner].symbol, DEFAULT_BETA) for owner in owners], dtype=float)
+    if benchmark_price:
+        leg_greeks['beta_weighted_delta'] = leg_greeks['delta'] * spot * beta / benchmark_price
+
+    position_greeks = {name: _sum_by(owners, len(priced), values) for name, values in leg_greeks.items()}
+    symbols, symbol_index = np.unique([trade.symbol for trade in priced], return_inverse=True)
+    underlying_greeks = {name: _sum_by(symbol_index, len(symbols), values) for name, values in position_greeks.items()}
+
+    for i, trade in enumerate(priced):
+        leg_slice = owners == i
+        result['positions'].append({
+            'trade_id': trade.id,
+            'symbol': trade.symbol,
+            'trade_type': trade.trade_type,
+            'underlying_price': underlying_prices[trade.symbol],
+            'implied_volatility': np.round(vols[leg_slice] * 100, 2).tolist(),
+            'iv_source': [IV_SOURCES[source] for source in sources[leg_slice]],
+            **_rounded(position_greeks, i)
+        })
+    for i, symbol in enumerate(symbols.tolist()):
+        result['underlyings'].append({
+            'symbol': symbol,
+            'underlying_price': underlying_prices[symbol],
+            'beta': betas.get(symbol, DEFAULT_BETA),
+            'positions': int(np.count_nonzero(symbol_index == i)),
+            **_rounded(underlying_greeks, i)
+        })
+
+    result['totals'] = _rounded(position_greeks)
+    return result
@@ -0,0 +1,268 @@
+"""
+Options Pricing Module
+
+Vectorized Black-Scholes pricing and Greeks over NumPy arrays. Every argument
+may be a scalar or an array; inputs are broadcast against each other so a whole
+option chain or scenario grid is priced in a single call.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from scipy.special import ndtr
+
+CONTRACT_MULTIPLIER = 100
+DAYS_PER_YEAR = 365.0
+MIN_SCENARIO_VOL = 0.01  # Floor for shifted volatilities in scenario surfaces
+
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+def _norm_pdf(x):
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def is_call_flag(option_type):
+    """Convert 'call'/'put' labels (or booleans) to a boolean array, True for calls"""
+    flag = np.asarray(option_type)
+    if flag.dtype == bool:
+        return flag
+    return np.char.lower(flag.astype(str)) == 'call'
+
+
+def _d1_d2(S, K, T, r, sigma, q):
+    """d1/d2 terms; only meaningful where T > 0 and sigma > 0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_sqrt_t = sigma * np.sqrt(T)
+        d1 = (np.log(S) - np.log(K) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_t
+        d2 = d1 - vol_sqrt_t
+    return d1, d2
+
+
+def _broadcast_inputs(S, K, T, r, sigma, option_type, q):
+    S, K, T, r, sigma, q = (np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q))
+    is_call = is_call_flag(option_type)
+    return np.broadcast_arrays(S, K, np.maximum(T, 0.0), r, sigma, q, is_call)
+
+
+def intrinsic_value(S, K, option_type='call'):
+    """Intrinsic (expiry) value of calls/puts"""
+    S = np.asarray(S, dtype=float)
+    K = np.asarray(K, dtype=float)
+    is_call = is_call_flag(option_type)
+    return np.where(is_call, np.maximum(S - K, 0.0), np.maximum(K - S, 0.0))
+
+
+def bs_price(S, K, T, r, sigma, option_type='call', q=0.0):
+    """
+    Black-Scholes price for European options
+
+    Args:
+        S: Underlying price
+        K: Strike price
+        T: Time to expiration in years (<= 0 prices at intrinsic value)
+        r: Risk-free rate (decimal)
+        sigma: Volatility (decimal)
+        option_type: 'call'/'put' label, boolean (True = call) or array of either
+        q: Continuous dividend yield (decimal)
+
+    Returns:
+        ndarray of prices with the broadcast shape of the inputs
+    """
+    # Inputs keep their own shapes, so logs, roots and discount factors are taken per
+    # axis of a scenario grid and only d1/d2 and the CDFs span the full broadcast shape
+    S, K, T, r, sigma, q = (np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q))
+    T = np.maximum(T, 0.0)
+    is_call = is_call_flag(option_type)
+    d1, d2 = _d1_d2(S, K, T, r, sigma, q)
+
+    # Calls and puts share one formula with the sign flipped (+1 call, -1 put),
+    # so each element needs two normal CDFs instead of four
+    sign = np.where(is_call, 1.0, -1.0)
+    disc_s = S * np.exp(-q * T)
+    disc_k = K * np.exp(-r * T)
+    price = sign * (disc_s * ndtr(sign * d1) - disc_k * ndtr(sign * d2))
+
+    # Expired or zero-vol contracts are worth their (discounted) intrinsic value
+    degenerate = (T <= 0) | (sigma <= 0)
+    if np.any(degenerate):
+        forward_intrinsic = np.maximum(sign * (disc_s - disc_k), 0.0)
+        price = np.where(degenerate, forward_intrinsic, price)
+
+    return np.maximum(price, 0.0)
+
+
+def bs_greeks(S, K, T, r, sigma, option_type='call', q=0.0):
+    """
+    Black-Scholes Greeks for European options
+
+    Theta is per calendar day, vega and rho are per 1 percentage point move,
+    matching the units shown in the calculators. Expired contracts get zero
+    Greeks except delta, which is 1/-1/0 depending on moneyness.
+
+    Returns:
+        Dict of ndarrays: delta, gamma, theta, vega, rho
+    """
+    S, K, T, r, sigma, q, is_call = _broadcast_inputs(S, K, T, r, sigma, option_type, q)
+    d1, d2 = _d1_d2(S, K, T, r, sigma, q)
+
+    sqrt_t = np.sqrt(T)
+    disc_q = np.exp(-q * T)
+    disc_r = np.exp(-r * T)
+    pdf_d1 = _norm_pdf(d1)
+    cdf_d1 = ndtr(d1)
+    cdf_d2 = ndtr(d2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(is_call, disc_q * cdf_d1, disc_q * (cdf_d1 - 1.0))
+        gamma = disc_q * pdf_d1 / (S * sigma * sqrt_t)
+        decay = -(S * disc_q * pdf_d1 * sigma) / (2.0 * sqrt_t)
+        call_theta = decay - r * K * disc_r * cdf_d2 + q * S * disc_q * cdf_d1
+        put_theta = decay + r * K * disc_r * ndtr(-d2) - q * S * disc_q * ndtr(-d1)
+        theta = np.where(is_call, call_theta, put_theta) / DAYS_PER_YEAR
+        vega = S * disc_q * pdf_d1 * sqrt_t / 100.0
+        rho = np.where(is_call, K * T * disc_r * cdf_d2, -K * T * disc_r * ndtr(-d2)) / 100.0
+
+    live = (T > 0) & (sigma > 0)
+    if not np.all(live):
+        itm = np.where(is_call, S > K, S < K)
+        expired_delta = np.where(itm, np.where(is_call, 1.0, -1.0), 0.0)
+        delta = np.where(live, delta, expired_delta)
+        gamma = np.where(live, gamma, 0.0)
+        theta = np.where(live, theta, 0.0)
+        vega = np.where(live, vega, 0.0)
+        rho = np.where(live, rho, 0.0)
+
+    return {
+        'delta': delta,
+        'gamma': gamma,
+        'theta': theta,
+        'vega': vega,
+        'rho': rho,
+    }
+
+
+def scenario_grid(prices, days_remaining, strike, rate, sigma, option_type='call', q=0.0):
+    """
+    Theoretical option values over a price x time grid
+
+    Args:
+        prices: 1-D array of underlying prices (rows)
+        days_remaining: 1-D array of calendar days to expiration (columns)
+
+    Returns:
+        2-D ndarray of shape (len(prices), len(days_remaining))
+    """
+    prices = np.asarray(prices, dtype=float)[:, None]
+    years = np.asarray(days_remaining, dtype=float)[None, :] / DAYS_PER_YEAR
+    return bs_price(prices, strike, years, rate, sigma, option_type, q)
+
+
+# ---------------------------------------------------------------
+# Implied volatility
+# ---------------------------------------------------------------
+IV_CONVERGED = 0        # Newton-Raphson converged
+IV_BRACKETED = 1        # Newton failed, bisection fallback converged
+IV_NOT_CONVERGED = 2    # No solver reached the tolerance
+IV_INVALID = 3          # Price violates no-arbitrage bounds or contract expired
+
+IVResult = namedtuple('IVResult', ['iv', 'status'])
+
+
+def _price_bounds(S, K, T, r, q, is_call):
+    """No-arbitrage lower/upper bounds for European option prices"""
+    disc_s = S * np.exp(-q * T)
+    disc_k = K * np.exp(-r * T)
+    lower = np.where(is_call, np.maximum(disc_s - disc_k, 0.0), np.maximum(disc_k - disc_s, 0.0))
+    upper = np.where(is_call, disc_s, disc_k)
+    return lower, upper
+
+
+def implied_volatility(price, S, K, T, r, option_type='call', q=0.0,
+                       tol=1e-6, vol_tol=1e-6, max_iter=50, vol_lower=1e-4, vol_upper=5.0):
+    """
+    Solve Black-Scholes implied volatility for many options at once
+
+    Runs Newton-Raphson on every element together, then falls back to a
+    vectorized bisection over [vol_lower, vol_upper] for the elements Newton
+    could not finish (tiny vega, overshooting the bracket, slow convergence).
+
+    Args:
+        price: Market option prices
+        S, K, T, r, option_type, q: Same as bs_price (broadcastable)
+        tol: Absolute price tolerance
+        vol_tol: Volatility tolerance; both must be met, so tiny-vega contracts
+            are not reported as solved just because their price barely moves
+        max_iter: Newton iterations before falling back
+
+    Returns:
+        IVResult(iv, status) - iv is NaN where status is not IV_CONVERGED/IV_BRACKETED
+    """
+    price = np.asarray(price, dtype=float)
+    S, K, T, r, sigma, q, is_call = _broadcast_inputs(S, K, T, r, 0.0, option_type, q)
+    price, S, K, T, r, q, is_call = (np.array(x) for x in np.broadcast_arrays(price, S, K, T, r, q, is_call))
+
+    iv = np.full(price.shape, np.nan)
+    status = np.full(price.shape, IV_NOT_CONVERGED, dtype=np.int8)
+
+    lower, upper = _price_bounds(S, K, T, r, q, is_call)
+    valid = (T > 0) & (S > 0) & (K > 0) & np.isfinite(price) & (price > lower) & (price < upper)
+    status[~valid] = IV_INVALID
+
+    # Brenner-Subrahmanyam starting guess, kept inside a sane range
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.sqrt(2.0 * np.pi / T) * price / S
+    sigma = np.array(np.clip(np.nan_to_num(sigma, nan=0.3), 0.05, 1.0), dtype=float, ndmin=price.ndim)
+
+    active = np.flatnonzero(valid)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        args = (S.flat[active], K.flat[active], T.flat[active], r.flat[active])
+        s_act = sigma.flat[active]
+        diff = bs_price(*args, s_act, is_call.flat[active], q.flat[active]) - price.flat[active]
+        vega = bs_greeks(*args, s_act, is_call.flat[active], q.flat[active])['vega'] * 100.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = diff / vega
+        stepped = s_act - step
+
+        done = (np.abs(diff) < tol) & (np.abs(step) < vol_tol)
+        iv.flat[active[done]] = s_act[done]
+        status.flat[active[done]] = IV_CONVERGED
+
+        # Leave tiny-vega or out-of-bracket steps to the bisection fallback
+        stalled = ~done & ((vega < 1e-8) | ~np.isfinite(stepped) |
+                           (stepped <= vol_lower) | (stepped >= vol_upper))
+        sigma.flat[active] = stepped
+        active = active[~done & ~stalled]
+
+    remaining = np.flatnonzero(valid & (status == IV_NOT_CONVERGED))
+    if remaining.size:
+        iv.flat[remaining], status.flat[remaining] = _bisect_iv(
+            price.flat[remaining], S.flat[remaining], K.flat[remaining], T.flat[remaining],
+            r.flat[remaining], is_call.flat[remaining], q.flat[remaining],
+            vol_tol, vol_lower, vol_upper)
+
+    return IVResult(iv, status)
+
+
+def _bisect_iv(price, S, K, T, r, is_call, q, vol_tol, vol_lower, vol_upper, max_iter=100):
+    """Vectorized bisection for the elements Newton could not solve, run until the bracket is vol_tol wide"""
+    lo = np.full(price.shape, vol_lower)
+    hi = np.full(price.shape, vol_upper)
+    f_lo = bs_price(S, K, T, r, lo, is_call, q) - price
+    f_hi = bs_price(S, K, T, r, hi, is_call, q) - price
+    bracketed = (f_lo <= 0) & (f_hi >= 0)
+
+    for _ in range(max_iter):
+        if np.all(hi - lo < vol_tol):
+            break
+        mid = 0.5 * (lo + hi)
+        below = bs_price(S, K, T, r, mid, is_call, q) < price
+        lo = np.where(below, mid, lo)
+        hi = np.where(below, hi, mid)
+
+    converged = bracketed & (hi - lo < vol_tol)
+    iv = np.where(converged, 0.5 * (lo + hi), np.nan)
+    status = np.where(converged, IV_BRACKETED, IV_NOT_CONVERGED).astype(np.int8)
+    return iv, status
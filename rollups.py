@@ -0,0 +1,299 @@
+"""
+Performance Rollups
+
+Keeps PerformanceRollup rows in step with closed trades. Every flush that
+inserts, edits or deletes a Trade applies only that trade's change to its
+user's 'all', 'setup' and 'day' buckets, so analytics read a handful of rows
+instead of re-aggregating years of trades.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.base import NO_VALUE
+
+from models import db, Trade, PerformanceRollup
+
+# A closed trade's share of the rollups
+Contribution = namedtuple('Contribution', ['user_id', 'setup', 'day', 'pnl'])
+
+_TRACKED = ('user_id', 'setup_type', 'exit_price', 'exit_date', 'entry_date', 'profit_loss')
+
+
+def trade_contribution(user_id, setup_type, exit_price, exit_date, entry_date, profit_loss):
+    """Contribution of one trade, or None while it is still open"""
+    if exit_price is None:
+        return None
+    closed_at = exit_date or entry_date
+    return Contribution(user_id, setup_type or '', closed_at.date().isoformat() if closed_at else '',
+                        profit_loss or 0.0)
+
+
+def _buckets(contribution):
+    return [('all', ''), ('setup', contribution.setup), ('day', contribution.day)]
+
+
+class _BucketDelta:
+    """Net change to one rollup row from a flush"""
+
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.losses = 0
+        self.total = 0.0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.added_max = None
+        self.added_min = None
+        self.removed = []
+
+    def apply(self, pnl, sign):
+        self.count += sign
+        self.wins += sign if pnl > 0 else 0
+        self.losses += sign if pnl < 0 else 0
+        self.total += sign * pnl
+        self.gross_profit += sign * pnl if pnl > 0 else 0.0
+        self.gross_loss += sign * pnl if pnl < 0 else 0.0
+        if sign > 0:
+            self.added_max = pnl if self.added_max is None else max(self.added_max, pnl)
+            self.added_min = pnl if self.added_min is None else min(self.added_min, pnl)
+        else:
+            self.removed.append(pnl)
+
+    def extremes(self, current_max=None, current_min=None):
+        """Max/min after adding this delta's P&Ls to a bucket's current extremes"""
+        return (max((v for v in (current_max, self.added_max) if v is not None), default=None),
+                min((v for v in (current_min, self.added_min) if v is not None), default=None))
+
+
+def collect_deltas(changes):
+    """
+    Net per-bucket deltas for a list of (old, new) contribution pairs
+
+    Returns:
+        Dict of (user_id, scope, bucket) -> _BucketDelta
+    """
+    deltas = {}
+    for old, new in changes:
+        if old == new:
+            continue
+        for contribution, sign in ((old, -1), (new, 1)):
+            if contribution is None:
+                continue
+            for scope, bucket in _buckets(contribution):
+                key = (contribution.user_id, scope, bucket)
+                deltas.setdefault(key, _BucketDelta()).apply(contribution.pnl, sign)
+    return deltas
+
+
+# Running totals a delta is added to
+_COUNTERS = ('trade_count', 'winning_trades', 'losing_trades', 'total_pnl', 'gross_profit', 'gross_loss')
+_ADDED = _COUNTERS + ('max_pnl', 'min_pnl', 'updated_at')
+_KEY = ('user_id', 'scope', 'bucket')
+
+# Compiled once per dialect
+_upsert_statements = {}
+
+
+def _row_values(user_id, scope, bucket, delta, now):
+    """Insert values for a bucket holding exactly this delta"""
+    return {
+        'user_id': user_id, 'scope': scope, 'bucket': bucket,
+        'trade_count': delta.count, 'winning_trades': delta.wins, 'losing_trades': delta.losses,
+        'total_pnl': delta.total, 'gross_profit': delta.gross_profit, 'gross_loss': delta.gross_loss,
+        'max_pnl': delta.added_max, 'min_pnl': delta.added_min, 'updated_at': now
+    }
+
+
+def _incremented(table, values):
+    """SET clause adding values (columns or bind parameters) to the row's running totals"""
+    def larger(current, new):
+        return db.case((db.or_(current.is_(None), new > current), new), else_=current)
+
+    def smaller(current, new):
+        return db.case((db.or_(current.is_(None), new < current), new), else_=current)
+
+    c = table.c
+    return {
+        **{name: c[name] + values[name] for name in _COUNTERS},
+        'max_pnl': larger(c.max_pnl, values['max_pnl']),
+        'min_pnl': smaller(c.min_pnl, values['min_pnl']),
+        'updated_at': values['updated_at']
+    }
+
+
+def _upsert_statement(dialect_name):
+    """INSERT ... ON CONFLICT (user_id, scope, bucket) DO UPDATE adding to the existing row"""
+    statement = _upsert_statements.get(dialect_name)
+    if statement is None:
+        table = PerformanceRollup.__table__
+        insert = (sqlite.insert if dialect_name == 'sqlite' else postgresql.insert)(table)
+        statement = _upsert_statements[dialect_name] = insert.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.scope, table.c.bucket],
+            set_=_incremented(table, insert.excluded)
+        )
+    return statement
+
+
+def apply_deltas(connection, deltas):
+    """
+    Apply bucket deltas to the rollup table on the given connection (same transaction as the trades)
+
+    Totals are added in SQL (SET col = col + :delta), never read and written
+    back, so concurrent writers for the same user don't lose increments. On
+    SQLite and PostgreSQL a new bucket is created by the same statement
+    (INSERT ... ON CONFLICT DO UPDATE); other backends update first and insert
+    inside a savepoint, retrying the update if another writer inserted first.
+    """
+    if not deltas:
+        return
+    table = PerformanceRollup.__table__
+    now = datetime.utcnow()
+    rows = [_row_values(user_id, scope, bucket, delta, now) for (user_id, scope, bucket), delta in deltas.items()]
+
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        connection.execute(_upsert_statement(connection.dialect.name), rows)
+    else:
+        # Bind names must differ from the column names an UPDATE sets
+        update = table.update().where(*(table.c[name] == db.bindparam(f'key_{name}') for name in _KEY))\
+                               .values(_incremented(table, {name: db.bindparam(f'add_{name}') for name in _ADDED}))
+        for row in rows:
+            params = {**{f'key_{name}': row[name] for name in _KEY}, **{f'add_{name}': row[name] for name in _ADDED}}
+            if connection.execute(update, params).rowcount:
+                continue
+            try:
+                with connection.begin_nested():
+                    connection.execute(table.insert(), row)
+            except IntegrityError:  # Another transaction created the bucket first
+                connection.execute(update, params)
+
+    # Buckets left without trades
+    users = {user_id for user_id, _, _ in deltas}
+    connection.execute(table.delete().where(table.c.user_id.in_(users), table.c.trade_count <= 0))
+
+    # Removing a bucket's current extreme is the one change a running total can't undo
+    removals = {key: delta.removed for key, delta in deltas.items() if delta.removed}
+    for (user_id, scope, bucket), removed in removals.items():
+        row = connection.execute(db.select(table.c.max_pnl, table.c.min_pnl).where(
+            table.c.user_id == user_id, table.c.scope == scope, table.c.bucket == bucket)).first()
+        if row is None:
+            continue
+        if row.max_pnl is None or any(pnl >= row.max_pnl or pnl <= row.min_pnl for pnl in removed):
+            max_pnl, min_pnl = _bucket_extremes(connection, user_id, scope, bucket)
+            connection.execute(table.update().where(
+                table.c.user_id == user_id, table.c.scope == scope, table.c.bucket == bucket
+            ).values(max_pnl=max_pnl, min_pnl=min_pnl))
+
+
+def _bucket_extremes(connection, user_id, scope, bucket):
+    """Recompute max/min P&L for one bucket from the (already flushed) trades"""
+    pnl = db.func.coalesce(Trade.profit_loss, 0.0)
+    query = db.select(db.func.max(pnl), db.func.min(pnl))\
+              .where(Trade.user_id == user_id, Trade.exit_price.isnot(None))
+    if scope == 'setup':
+        query = query.where(db.func.coalesce(Trade.setup_type, '') == bucket)
+    elif scope == 'day':
+        day_start = datetime.fromisoformat(bucket)
+        closed_at = db.func.coalesce(Trade.exit_date, Trade.entry_date)
+        query = query.where(closed_at >= day_start, closed_at < day_start + timedelta(days=1))
+    return tuple(connection.execute(query).one())
+
+
+def _current_values(trade):
+    return [getattr(trade, name) for name in _TRACKED]
+
+
+def _committed_values(session, trade):
+    """Tracked attribute values as stored in the database before this flush"""
+    state = inspect(trade)
+    values = []
+    for name in _TRACKED:
+        history = state.attrs[name].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            values.append(state.attrs[name].loaded_value)
+
+    if NO_VALUE in values:
+        # Attribute was set while expired, so the old value was never loaded
+        columns = [getattr(Trade, name) for name in _TRACKED]
+        row = session.connection().execute(db.select(*columns).where(Trade.id == state.identity[0])).first()
+        return list(row) if row else [None] * len(_TRACKED)
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def _capture_trade_changes(session, flush_context, instances):
+    """Record each changed trade's old and new contribution before the flush writes it"""
+    changes = []
+    for trade in session.new:
+        if isinstance(trade, Trade):
+            changes.append((None, trade_contribution(*_current_values(trade))))
+    for trade in session.dirty:
+        if isinstance(trade, Trade) and session.is_modified(trade):
+            changes.append((trade_contribution(*_committed_values(session, trade)),
+                            trade_contribution(*_current_values(trade))))
+    for trade in session.deleted:
+        if isinstance(trade, Trade):
+            changes.append((trade_contribution(*_committed_values(session, trade)), None))
+    if changes:
+        session.info.setdefault('rollup_changes', []).extend(changes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_trade_changes(session, flush_context):
+    """Apply the recorded changes in the flush's own transaction"""
+    changes = session.info.pop('rollup_changes', None)
+    if changes:
+        apply_deltas(session.connection(), collect_deltas(changes))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_trade_changes(session):
+    session.info.pop('rollup_changes', None)
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Recompute rollups from the trades table (all users, or one)
+
+    For repairs after bulk SQL edits or data imported outside the ORM.
+
+    Returns:
+        Number of rollup rows written
+    """
+    table = PerformanceRollup.__table__
+    query = db.select(*[getattr(Trade, name) for name in _TRACKED]).where(Trade.exit_price.isnot(None))
+    delete = table.delete()
+    if user_id is not None:
+        query = query.where(Trade.user_id == user_id)
+        delete = delete.where(table.c.user_id == user_id)
+
+    connection = db.session.connection()
+    connection.execute(delete)
+    rows = connection.execute(query.execution_options(yield_per=1000))
+    deltas = collect_deltas((None, trade_contribution(*row)) for row in rows)
+
+    now = datetime.utcnow()
+    if deltas:
+        connection.execute(table.insert(), [_row_values(owner_id, scope, bucket, delta, now)
+                                            for (owner_id, scope, bucket), delta in deltas.items()])
+    db.session.commit()
+    return len(deltas)
+
+
+def get_rollups(user_id, scope):
+    """Rollup rows for one scope, ordered by bucket (day buckets sort by date)"""
+    return PerformanceRollup.query.filter_by(user_id=user_id, scope=scope)\
+                                  .order_by(PerformanceRollup.bucket).all()
+
+
+def get_rollup_summary(user_id):
+    """The user's 'all' rollup row, or None if they have no closed trades"""
+    return PerformanceRollup.query.filter_by(user_id=user_id, scope='all', bucket='').first()
@@ -0,0 +1,207 @@
+"""
+Scenario Surfaces
+
+P&L of an option strategy over a grid of underlying prices, days to
+expiration and implied-volatility shifts. The whole surface, every leg
+included, is priced in one broadcast Black-Scholes evaluation (or, for the
+american model, one batched lattice induction) and returned as flat arrays
+plus axes (columnar JSON) or as a NumPy .npz payload, never as per-cell dicts.
+"""
+
+import io
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from strategies import Leg, Strategy, LEG_TYPES, MODELS
+from lattice import LatticeError, MAX_CURVE_WORK
+
+DEFAULT_PRICE_POINTS = 200
+DEFAULT_DAY_POINTS = 60
+DEFAULT_PRICE_RANGE = 0.15  # +/- fraction of the current price
+DEFAULT_RATE = 0.05
+FALLBACK_VOL = 0.3
+DEFAULT_LATTICE_STEPS = 100  # Per tree on american surfaces; each (IV shift, day, leg) column is one tree
+
+MAX_PRICE_POINTS = 1000
+MAX_DAY_POINTS = 730
+MAX_IV_SHIFTS = 21
+MAX_LEGS = 8
+MAX_LATTICE_STEPS = 500
+MAX_CELLS = 500_000
+
+# Where leg volatilities come from: one given volatility, each leg's premium, or the symbol's fitted IV surface
+VOL_SOURCES = ('volatility', 'premium', 'surface')
+
+Surface = namedtuple('Surface', ['prices', 'days_remaining', 'iv_shifts', 'pnl', 'implied_volatility', 'rate', 'model',
+                                 'vol_source'])
+
+
+class ScenarioError(ValueError):
+    """Invalid scenario request (bad inputs or a grid that is too large)"""
+
+
+def days_until(expiration_date):
+    """Whole days from now until a YYYY-MM-DD expiration (negative once past)"""
+    return (datetime.strptime(expiration_date, '%Y-%m-%d') - datetime.now()).days
+
+
+def strategy_from_json(items):
+    """
+    Strategy from a request's list of legs
+
+    Each item has option_type ('call', 'put' or 'stock'), strike, quantity
+    (signed: negative = short), premium (entry price per share) and
+    expiration_date (YYYY-MM-DD) or days_to_expiration.
+
+    Raises:
+        ScenarioError: Missing or invalid leg fields
+    """
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_LEGS:
+        raise ScenarioError(f"legs must be a list of 1 to {MAX_LEGS} legs")
+    legs = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ScenarioError(f"Invalid leg {item!r}")
+        option_type = str(item.get('option_type', '')).lower()
+        if option_type not in LEG_TYPES:
+            raise ScenarioError(f"Leg option_type must be one of {', '.join(LEG_TYPES)}")
+        try:
+            if option_type == 'stock':
+                strike, days = None, 0
+            else:
+                strike = float(item['strike'])
+                if item.get('days_to_expiration') is not None:
+                    days = max(float(item['days_to_expiration']), 0)
+                else:
+                    days = max(days_until(item.get('expiration_date', '')), 0)
+            legs.append(Leg(option_type, strike, days, float(item.get('quantity', 1)), float(item.get('premium', 0))))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ScenarioError(f"Invalid leg {item!r}: {e}")
+    try:
+        return Strategy(legs)
+    except ValueError as e:
+        raise ScenarioError(str(e))
+
+
+def price_axis(current_price, points=DEFAULT_PRICE_POINTS, price_range=DEFAULT_PRICE_RANGE):
+    return np.linspace(current_price * (1 - price_range), current_price * (1 + price_range), points)
+
+
+def day_axis(days_to_expiration, points=DEFAULT_DAY_POINTS):
+    """Days remaining from today down to expiration (a single 0 column once expired)"""
+    if days_to_expiration <= 0:
+        return np.zeros(1)
+    return np.linspace(days_to_expiration, 0.0, points)
+
+
+def _check_size(name, value, upper):
+    if not 1 <= value <= upper:
+        raise ScenarioError(f"{name} must be between 1 and {upper}")
+
+
+def build_surface(strategy, current_price, price_points=DEFAULT_PRICE_POINTS, day_points=DEFAULT_DAY_POINTS,
+                  price_range=DEFAULT_PRICE_RANGE, iv_shifts=(0.0,), rate=DEFAULT_RATE, volatility=None, q=0.0,
+                  model='european', steps=DEFAULT_LATTICE_STEPS, vol_surface=None):
+    """
+    P&L surface for a strategy (any number of legs, one broadcast evaluation)
+
+    Args:
+        strategy: strategies.Strategy
+        current_price: Underlying price the price axis is centred on
+        price_points, day_points: Grid resolution
+        price_range: Price axis spans current_price * (1 +/- price_range)
+        iv_shifts: Volatility shifts in decimal (e.g. [-0.1, 0, 0.1])
+        rate: Risk-free rate (decimal)
+        volatility: Base volatility (decimal) for every leg; when None each
+            leg's IV is read off vol_surface, or backed out of its premium
+        q: Continuous dividend yield (decimal)
+        model: 'european' (Black-Scholes) or 'american' (trinomial lattice,
+            early exercise included)
+        steps: Lattice time steps for the american model
+        vol_surface: vol_surface.VolSurface of the underlying. Each leg's vol
+            follows its strike and remaining time along the day axis (sticky
+            strike); legs the surface can't price fall back to their premium IV
+
+    Returns:
+        Surface; pnl has shape (len(iv_shifts), price_points, len(days_remaining))
+        and days_remaining counts down to the front expiration
+
+    Raises:
+        ScenarioError: Invalid inputs, more than MAX_CELLS cells, or an
+            american surface over the lattice work limit (MAX_CURVE_WORK)
+    """
+    if current_price <= 0:
+        raise ScenarioError("current_price must be positive")
+    if not 0 < price_range < 1:
+        raise ScenarioError("price_range must be between 0 and 1")
+    _check_size('price_points', price_points, MAX_PRICE_POINTS)
+    _check_size('day_points', day_points, MAX_DAY_POINTS)
+    iv_shifts = np.asarray(iv_shifts if len(iv_shifts) else (0.0,), dtype=float)
+    _check_size('number of iv_shifts', iv_shifts.size, MAX_IV_SHIFTS)
+    if model not in MODELS:
+        raise ScenarioError(f"model must be one of {', '.join(MODELS)}")
+    if model == 'american':
+        _check_size('steps', steps, MAX_LATTICE_STEPS)
+
+    prices = price_axis(current_price, price_points, price_range)
+    days_remaining = day_axis(strategy.front_days, day_points)
+    if iv_shifts.size * prices.size * days_remaining.size > MAX_CELLS:
+        raise ScenarioError(f"Surface is limited to {MAX_CELLS} cells")
+    if model == 'american':
+        # One tree per (IV shift, day, option leg); each costs at least steps^2 node updates
+        trees = iv_shifts.size * days_remaining.size * int((~strategy.is_stock).sum())
+        if trees * steps * steps > MAX_CURVE_WORK:
+            raise ScenarioError(f"American surface needs {trees} trees of {steps} steps; "
+                                f"reduce iv_shifts, day_points or steps")
+
+    if volatility is not None:
+        vol_source, leg_vols = 'volatility', volatility
+    else:
+        volatility = leg_vols = strategy.implied_vols(current_price, rate, FALLBACK_VOL, q)
+        vol_source = 'premium'
+        if vol_surface is not None and len(vol_surface):
+            # (days, legs): each leg's time left on every column of the day axis
+            leg_days = np.maximum(strategy.days - (strategy.front_days - days_remaining)[:, None], 0.0)
+            strikes = np.where(strategy.is_stock, current_price, strategy.strikes)
+            surface_vols = vol_surface.iv(strikes, leg_days)
+            volatility = np.where(np.isfinite(surface_vols), surface_vols, leg_vols)
+            vol_source, leg_vols = 'surface', volatility[0]
+    try:
+        pnl = strategy.surface(prices, days_remaining, volatility, rate, iv_shifts, q, model, steps)
+    except LatticeError as e:  # Row widths pushed the lattice past its work limit
+        raise ScenarioError(str(e))
+    return Surface(prices, days_remaining, iv_shifts, pnl, np.broadcast_to(leg_vols, (len(strategy),)), rate, model,
+                   vol_source)
+
+
+def surface_to_columnar(surface, decimals=2):
+    """
+    JSON-ready surface: axes plus the P&L as one flat row-major list
+
+    pnl[(i * len(stock_price) + j) * len(days_remaining) + k] is the P&L for
+    iv_shift i, stock_price j and days_remaining k.
+    """
+    return {
+        'shape': list(surface.pnl.shape),
+        'axes': {
+            'iv_shift': np.round(surface.iv_shifts, 4).tolist(),
+            'stock_price': np.round(surface.prices, 2).tolist(),
+            'days_remaining': np.round(surface.days_remaining, 2).tolist(),
+        },
+        'pnl': np.round(surface.pnl, decimals).ravel().tolist(),
+        'implied_volatility': np.round(surface.implied_volatility, 4).tolist(),  # One per leg, today
+        'vol_source': surface.vol_source,
+        'rate': surface.rate,
+        'model': surface.model,
+    }
+
+
+def surface_to_npz(surface):
+    """Surface arrays as an uncompressed .npz payload (float32 P&L)"""
+    buffer = io.BytesIO()
+    np.savez(buffer, iv_shift=surface.iv_shifts, stock_price=surface.prices,
+             days_remaining=surface.days_remaining, pnl=surface.pnl.astype(np.float32),
+             implied_volatility=np.asarray(surface.implied_volatility, dtype=float))
+    return buffer.getvalue()
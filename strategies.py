@@ -0,0 +1,210 @@
+"""
+Multi-Leg Strategies
+
+A position is an array of legs (option type, strike, days to expiration,
+signed quantity, entry price). Payoff, value over time, Greeks, breakevens
+and max profit/loss are computed for every leg and price point at once: legs
+are the last axis of each broadcast and summed away at the end, so an iron
+condor surface is one bs_price call, the same as a single option.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from pricing import (bs_price, bs_greeks, implied_volatility, IV_CONVERGED, IV_BRACKETED,
+                     CONTRACT_MULTIPLIER, DAYS_PER_YEAR, MIN_SCENARIO_VOL)
+from lattice import american_price_curve, DEFAULT_STEPS
+
+LEG_TYPES = ('call', 'put', 'stock')
+GREEKS = ('delta', 'gamma', 'theta', 'vega', 'rho')
+MODELS = ('european', 'american')  # Black-Scholes, or a trinomial lattice with early exercise
+
+# quantity is signed: positive = long, negative = short (contracts, or shares for stock legs)
+Leg = namedtuple('Leg', ['option_type', 'strike', 'days_to_expiration', 'quantity', 'entry_price'])
+
+
+class Strategy:
+    """A multi-leg position priced as arrays over its legs"""
+
+    def __init__(self, legs):
+        legs = list(legs)
+        if not legs:
+            raise ValueError("A strategy needs at least one leg")
+        for leg in legs:
+            if leg.option_type not in LEG_TYPES:
+                raise ValueError(f"Unknown leg type {leg.option_type!r}")
+            if leg.option_type != 'stock' and not (leg.strike and leg.strike > 0):
+                raise ValueError("Option legs need a positive strike")
+
+        self.legs = legs
+        types = np.array([leg.option_type for leg in legs])
+        self.is_stock = types == 'stock'
+        self.is_call = types == 'call'
+        self.strikes = np.array([leg.strike or 0.0 for leg in legs], dtype=float)
+        self.days = np.array([leg.days_to_expiration or 0.0 for leg in legs], dtype=float)
+        self.quantities = np.array([leg.quantity for leg in legs], dtype=float)
+        self.entry_prices = np.array([leg.entry_price or 0.0 for leg in legs], dtype=float)
+        # Dollar value of a 1.00 move in each leg's price
+        self.weights = self.quantities * np.where(self.is_stock, 1.0, CONTRACT_MULTIPLIER)
+
+    def __len__(self):
+        return len(self.legs)
+
+    @property
+    def cost(self):
+        """Net opening cost in dollars (positive = debit paid, negative = credit received)"""
+        return float(self.weights @ self.entry_prices)
+
+    @property
+    def front_days(self):
+        """Days until the first option leg expires (0 for stock-only positions)"""
+        option_days = self.days[~self.is_stock]
+        return float(option_days.min()) if option_days.size else 0.0
+
+    # ---------------------------------------------------------------
+    # Value and P&L
+    # ---------------------------------------------------------------
+    def mark(self, leg_prices):
+        """Position value in dollars from one market price per leg"""
+        return float(self.weights @ np.asarray(leg_prices, dtype=float))
+
+    def expiry_value(self, prices):
+        """Position value at expiration for an array of underlying prices (legs expiring together)"""
+        prices = np.asarray(prices, dtype=float)[..., None]
+        leg_values = np.where(self.is_stock, prices,
+                              np.where(self.is_call, np.maximum(prices - self.strikes, 0.0),
+                                       np.maximum(self.strikes - prices, 0.0)))
+        return leg_values @ self.weights
+
+    def payoff(self, prices):
+        """P&L at expiration for an array of underlying prices"""
+        return self.expiry_value(prices) - self.cost
+
+    def value(self, prices, days_elapsed=0.0, sigma=0.3, rate=0.05, q=0.0):
+        """
+        Theoretical position value
+
+        prices, days_elapsed and sigma are broadcast against each other with
+        the legs as an extra trailing axis; sigma may also carry that axis
+        (one volatility per leg). Legs past expiration price at intrinsic.
+        """
+        prices = np.asarray(prices, dtype=float)[..., None]
+        years = np.maximum(self.days - np.asarray(days_elapsed, dtype=float)[..., None], 0.0) / DAYS_PER_YEAR
+        leg_values = bs_price(prices, self.strikes, years, rate, sigma, self.is_call, q)
+        if self.is_stock.any():
+            leg_values = np.where(self.is_stock, prices, leg_values)
+        return leg_values @ self.weights
+
+    def pnl(self, prices, days_elapsed=0.0, sigma=0.3, rate=0.05, q=0.0):
+        return self.value(prices, days_elapsed, sigma, rate, q) - self.cost
+
+    def surface(self, prices, days_remaining, sigma, rate=0.05, iv_shifts=(0.0,), q=0.0,
+                model='european', steps=DEFAULT_STEPS):
+        """
+        P&L over an IV shift x price x time cube in one broadcast evaluation
+
+        Args:
+            prices: 1-D underlying prices
+            days_remaining: 1-D days left until the front expiration
+            sigma: Volatility, scalar or one per leg
+            iv_shifts: 1-D volatility shifts applied to every leg (floored at MIN_SCENARIO_VOL)
+            model: 'european' (Black-Scholes) or 'american' (lattice with early exercise)
+            steps: Lattice time steps per tree for the american model
+
+        Returns:
+            ndarray of shape (len(iv_shifts), len(prices), len(days_remaining))
+        """
+        prices = np.asarray(prices, dtype=float)
+        days_elapsed = self.front_days - np.asarray(days_remaining, dtype=float)
+        vols = np.asarray(sigma, dtype=float) + np.asarray(iv_shifts, dtype=float)[:, None, None, None]
+        vols = np.maximum(vols, MIN_SCENARIO_VOL)
+        if model == 'american':
+            return self._american_surface(prices, days_elapsed, vols[:, 0], rate, q, steps)
+        return self.pnl(prices[None, :, None], days_elapsed[None, None, :], vols, rate, q)
+
+    def _american_surface(self, prices, days_elapsed, vols, rate, q, steps):
+        """Lattice surface: one tree per (IV shift, day, option leg) spans the whole price axis"""
+        years = np.maximum(self.days - days_elapsed[:, None], 0.0) / DAYS_PER_YEAR  # (days, legs)
+        vols = np.broadcast_to(vols, (len(vols),) + years.shape)                    # (shifts, days, legs)
+        leg_values = np.broadcast_to(prices, vols.shape + prices.shape).copy()     # Stock legs track the price
+
+        options = ~self.is_stock
+        if options.any():
+            leg_values[:, :, options] = american_price_curve(
+                prices, self.strikes[options], years[:, options], rate, vols[:, :, options],
+                self.is_call[options], q, steps)
+        return np.einsum('sdlp,l->spd', leg_values, self.weights) - self.cost
+
+    def greeks(self, price, days_elapsed=0.0, sigma=0.3, rate=0.05, q=0.0):
+        """Position Greeks in dollars per unit move (theta per day, vega/rho per vol/rate point)"""
+        price = np.asarray(price, dtype=float)[..., None]
+        years = np.maximum(self.days - np.asarray(days_elapsed, dtype=float)[..., None], 0.0) / DAYS_PER_YEAR
+        leg_greeks = bs_greeks(price, self.strikes, years, rate, sigma, self.is_call, q)
+        result = {}
+        for name in GREEKS:
+            per_leg = np.where(self.is_stock, 1.0 if name == 'delta' else 0.0, leg_greeks[name])
+            result[name] = per_leg @ self.weights
+        return result
+
+    def leg_greeks(self, underlying_prices, sigma=0.3, rate=0.05, q=0.0):
+        """
+        Dollar Greeks of each leg (delta and gamma in shares), one underlying price per leg
+
+        Legs need not share an underlying, so a whole book flattened into one
+        Strategy is priced in a single call.
+        """
+        years = self.days / DAYS_PER_YEAR
+        leg_greeks = bs_greeks(underlying_prices, self.strikes, years, rate, sigma, self.is_call, q)
+        return {name: np.where(self.is_stock, 1.0 if name == 'delta' else 0.0, leg_greeks[name]) * self.weights
+                for name in GREEKS}
+
+    def implied_vols(self, underlying_price, rate=0.05, fallback=0.3, q=0.0):
+        """Per-leg IV backed out of the entry prices (fallback where it can't be solved, and for stock)"""
+        result = implied_volatility(self.entry_prices, underlying_price, np.where(self.is_stock, 1.0, self.strikes),
+                                    self.days / DAYS_PER_YEAR, rate, self.is_call, q)
+        solved = np.isin(result.status, (IV_CONVERGED, IV_BRACKETED)) & ~self.is_stock
+        return np.where(solved, result.iv, fallback)
+
+    # ---------------------------------------------------------------
+    # Expiration profile (piecewise linear, kinks at the strikes)
+    # ---------------------------------------------------------------
+    def _profile(self):
+        """Kink prices (0 and every strike), payoff at each, and the slope beyond the last kink"""
+        kinks = np.unique(np.concatenate(([0.0], self.strikes[~self.is_stock])))
+        tail_slope = float(self.weights[self.is_call | self.is_stock].sum())
+        return kinks, self.payoff(kinks), tail_slope
+
+    def breakevens(self, decimals=4):
+        """Underlying prices where the expiration P&L crosses zero, ascending"""
+        kinks, payoff, tail_slope = self._profile()
+        scale = max(1.0, float(np.abs(payoff).max()))
+        zero = np.abs(payoff) <= 1e-9 * scale
+        right = np.append(payoff[1:], tail_slope)  # Next kink's payoff, or the tail direction
+
+        points = []
+        for i in range(len(kinks)):
+            if zero[i]:
+                # A zero kink counts unless the P&L stays flat at zero on both sides
+                left_flat = i == 0 or zero[i - 1]
+                right_flat = abs(right[i]) <= 1e-9 * scale
+                if kinks[i] > 0 and not (left_flat and right_flat):
+                    points.append(kinks[i])
+                continue
+            if i + 1 < len(kinks):
+                if not zero[i + 1] and payoff[i] * payoff[i + 1] < 0:
+                    step = (kinks[i + 1] - kinks[i]) / (payoff[i + 1] - payoff[i])
+                    points.append(kinks[i] - payoff[i] * step)
+            elif tail_slope and payoff[i] * tail_slope < 0:
+                points.append(kinks[i] - payoff[i] / tail_slope)
+        return [round(float(point), decimals) for point in points]
+
+    def max_profit(self):
+        """Largest expiration P&L in dollars (inf when unbounded)"""
+        kinks, payoff, tail_slope = self._profile()
+        return float('inf') if tail_slope > 0 else float(payoff.max())
+
+    def max_loss(self):
+        """Largest expiration loss in dollars as a positive amount (inf when unbounded)"""
+        kinks, payoff, tail_slope = self._profile()
+        return float('inf') if tail_slope < 0 else float(-payoff.min())
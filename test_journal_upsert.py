@@ -0,0 +1,86 @@
+"""
+Check that journal entries are unique per user and day, not per day
+
+Two users journal the same date through the upsert, and a database created
+with the old table-wide UNIQUE (journal_date) is migrated in place.
+
+Usage:
+    python -m pytest test_journal_upsert.py
+"""
+
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from config import TestingConfig
+from database import init_db
+from migrations import upgrade_schema
+from models import db, User, Trade, TradingJournal
+
+DAY = datetime(2026, 1, 5, 10, 30)
+
+
+def _app():
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    init_db(app)
+    return app
+
+
+def _users(*names):
+    users = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in names]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def _enter_trade(user):
+    trade = Trade(user_id=user.id, symbol='AAPL', trade_type='long', entry_price=100, quantity=1, entry_date=DAY)
+    db.session.add(trade)
+    result = TradingJournal.upsert_from_trade(trade)
+    db.session.commit()
+    return result
+
+
+def test_two_users_journal_the_same_day():
+    with _app().app_context():
+        db.create_all()
+        alice, bob = _users('alice', 'bob')
+
+        alice_journal, alice_created = _enter_trade(alice)
+        bob_journal, bob_created = _enter_trade(bob)
+        again_journal, again_created = _enter_trade(alice)
+
+        assert alice_created and bob_created and not again_created
+        assert alice_journal != bob_journal and again_journal == alice_journal
+        assert TradingJournal.query.filter_by(journal_date=DAY.date()).count() == 2
+
+
+def test_upgrade_drops_table_wide_journal_date_unique():
+    with _app().app_context():
+        db.create_all()
+        alice, bob = _users('alice', 'bob')
+        # Recreate the table as older versions did, with one existing entry
+        TradingJournal.__table__.drop(db.engine)
+        with db.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE trading_journal (id INTEGER PRIMARY KEY, "
+                              "user_id INTEGER NOT NULL REFERENCES user (id), journal_date DATE NOT NULL UNIQUE, "
+                              "daily_pnl FLOAT, created_at DATETIME, updated_at DATETIME)"))
+            conn.execute(text("INSERT INTO trading_journal (user_id, journal_date, daily_pnl) "
+                              "VALUES (:user_id, '2026-01-05', 12.5)"), {'user_id': alice.id})
+
+        changes = upgrade_schema()
+        assert 'trading_journal UNIQUE (journal_date)' in changes
+        assert not inspect(db.engine).get_unique_constraints('trading_journal')
+        assert TradingJournal.query.one().daily_pnl == 12.5
+
+        bob_journal, bob_created = _enter_trade(bob)
+        assert bob_created
+        assert TradingJournal.query.filter_by(journal_date=DAY.date()).count() == 2
+
+
+if __name__ == '__main__':
+    test_two_users_journal_the_same_day()
+    test_upgrade_drops_table_wide_journal_date_unique()
+    print("OK")
@@ -0,0 +1,73 @@
+"""
+Checks for the CSV trade import
+
+Rows closed at 0.0 (worthless expirations) import as closed trades with
+realized P&L, and importing on a day another user has journaled creates the
+importer's own journal entry.
+
+Usage:
+    python -m pytest test_trade_import.py
+"""
+
+import io
+
+from flask import Flask
+
+from config import TestingConfig
+from database import init_db
+from models import db, User, Trade, TradingJournal
+from rollups import get_rollup_summary
+from trade_import import import_trades_csv
+
+CSV = """symbol,trade_type,entry_date,exit_date,entry_price,exit_price,quantity,strike_price,expiration_date,short_strike,long_strike,net_credit
+AAPL,option_call,2024-01-02,2024-01-19,2.50,0,2,190,2024-01-19,,,
+AAPL,long,2024-01-02,2024-01-19,10,0,5,,,,,
+SPY,credit_put_spread,2024-01-02,2024-01-19,1.50,0,1,,2024-01-19,470,465,1.50
+"""
+
+
+def _app():
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    init_db(app)
+    return app
+
+
+def test_zero_exit_rows_import_with_realized_pnl():
+    with _app().app_context():
+        db.create_all()
+        user = User(username='importer', email='importer@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+
+        result = import_trades_csv(io.StringIO(CSV), user.id)
+        assert result.imported == 3 and result.skipped == 0
+
+        pnl = {trade.trade_type: trade.profit_loss for trade in Trade.query.filter_by(user_id=user.id)}
+        assert pnl == {'option_call': -500.0, 'long': -50.0, 'credit_put_spread': 150.0}
+
+        summary = get_rollup_summary(user.id)
+        assert summary.trade_count == 3
+        assert summary.total_pnl == -400.0
+
+
+def test_import_on_a_day_another_user_journaled():
+    with _app().app_context():
+        db.create_all()
+        other = User(username='other', email='other@example.com', password_hash='x')
+        importer = User(username='importer', email='importer@example.com', password_hash='x')
+        db.session.add_all([other, importer])
+        db.session.commit()
+        import_trades_csv(io.StringIO(CSV), other.id)
+
+        result = import_trades_csv(io.StringIO(CSV), importer.id)
+        assert result.imported == 3 and result.journals_created == 1
+        assert Trade.query.filter_by(user_id=importer.id).count() == 3
+        assert [journal.user_id for journal in TradingJournal.query.order_by(TradingJournal.user_id)] == \
+            [other.id, importer.id]
+
+
+if __name__ == '__main__':
+    test_zero_exit_rows_import_with_realized_pnl()
+    test_import_on_a_day_another_user_journaled()
+    print("OK")
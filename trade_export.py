@@ -0,0 +1,186 @@
+"""
+Trade Export
+
+Streams a user's trades out as CSV, JSON Lines, Parquet or Arrow. Rows are
+read straight from the trades table with yield_per (no ORM objects, no
+per-row derived fields) and written a chunk at a time, so memory stays flat
+however long the history is. CSV columns use the trade field names, so an
+export can be fed back through the bulk import.
+
+Parquet/Arrow need pyarrow, which is optional.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from models import db, Trade
+from database import replica_reads
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Stored columns only; derived values (days to expiration, moneyness, ...) are left to the reader
+EXPORT_COLUMNS = [column for column in Trade.__table__.columns
+                  if column.key not in ('user_id', 'entry_chart_image', 'exit_chart_image')]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+
+class ExportFormatError(ValueError):
+    """Unknown export format, or a columnar format without pyarrow installed"""
+
+
+def check_format(export_format):
+    """Validate an export format name (raises ExportFormatError)"""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportFormatError(f"Unknown export format {export_format!r} "
+                                f"(expected one of {', '.join(EXPORT_FORMATS)})")
+    if export_format in COLUMNAR_FORMATS and pa is None:
+        raise ExportFormatError(f"{export_format} export needs pyarrow (pip install pyarrow)")
+
+
+def iter_trade_chunks(user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of trade rows (tuples in EXPORT_FIELDS order), oldest first
+
+    The query is read from the replica when one is configured. The caller
+    must keep the app context alive while iterating (stream_with_context).
+    """
+    query = db.select(*EXPORT_COLUMNS).where(Trade.user_id == user_id)\
+              .order_by(Trade.entry_date, Trade.id)\
+              .execution_options(yield_per=chunk_size)
+    with replica_reads() as session:
+        result = session.execute(query)
+        try:
+            for partition in result.partitions():
+                yield partition
+        finally:
+            result.close()
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def stream_csv(user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """CSV text, header first, one chunk of rows per yielded string"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in iter_trade_chunks(user_id, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """JSON Lines, one object per trade, one chunk of lines per yielded string"""
+    dumps = json.JSONEncoder(default=_json_default).encode
+    for rows in iter_trade_chunks(user_id, chunk_size):
+        yield ''.join(dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
+
+
+def _arrow_type(column):
+    python_type = column.type.python_type
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp('us')
+    if python_type is date:
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema():
+    return pa.schema([pa.field(column.key, _arrow_type(column)) for column in EXPORT_COLUMNS])
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_columnar(user_id, export_format='parquet', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parquet (one row group per chunk) or Arrow IPC stream (one record batch per chunk) bytes
+
+    Raises:
+        ExportFormatError: pyarrow isn't installed
+    """
+    check_format(export_format)
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        for rows in iter_trade_chunks(user_id, chunk_size):
+            columns = zip(*rows)
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            )
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(user_id, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generator of response chunks for any export format"""
+    check_format(export_format)
+    if export_format == 'csv':
+        return stream_csv(user_id, chunk_size)
+    if export_format == 'jsonl':
+        return stream_jsonl(user_id, chunk_size)
+    return stream_columnar(user_id, export_format, chunk_size)
@@ -0,0 +1,245 @@
+"""
+Bulk Trade Import
+
+Streams a CSV of trades (e.g. a broker statement export) into the trades
+table. Rows are validated and priced a chunk at a time, each chunk is written
+with one bulk INSERT in its own transaction, and the journal entries for every
+day in the chunk are created or merged from one lookup. Nothing is analyzed
+on import; run bulk analysis afterwards if wanted.
+"""
+
+import csv
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import inspect
+
+from market_data import fetch_quotes
+from models import db, Trade, TradingJournal
+from rollups import trade_contribution, collect_deltas, apply_deltas
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+TRADE_TYPES = ('long', 'short', 'option_call', 'option_put', 'credit_put_spread', 'credit_call_spread')
+SPREAD_TYPES = ('credit_put_spread', 'credit_call_spread')
+REQUIRED_COLUMNS = ('symbol', 'trade_type', 'entry_date', 'entry_price', 'quantity')
+
+DATETIME_COLUMNS = ('entry_date', 'exit_date')
+DATE_COLUMNS = ('expiration_date',)
+INTEGER_COLUMNS = ('quantity',)
+FLOAT_COLUMNS = ('entry_price', 'exit_price', 'stop_loss', 'take_profit', 'risk_amount',
+                 'strike_price', 'premium_paid', 'underlying_price_at_entry', 'underlying_price_at_exit',
+                 'implied_volatility', 'delta', 'gamma', 'theta', 'vega',
+                 'long_strike', 'short_strike', 'long_premium', 'short_premium', 'net_credit')
+TEXT_COLUMNS = ('setup_type', 'market_condition', 'timeframe', 'entry_reason', 'exit_reason', 'notes', 'tags')
+
+# Date formats seen in broker exports, tried after ISO 8601
+DATETIME_FORMATS = ('%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y', '%m/%d/%y')
+
+ImportResult = namedtuple('ImportResult', ['imported', 'skipped', 'journals_created', 'journals_updated',
+                                           'errors'])
+
+
+class ImportRowError(ValueError):
+    """A CSV row that can't be turned into a trade"""
+
+
+def _parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ImportRowError(f"unrecognised date {value!r}")
+
+
+def _parse_number(value, cast):
+    try:
+        return cast(value.replace('$', '').replace(',', ''))
+    except ValueError:
+        raise ImportRowError(f"not a number: {value!r}")
+
+
+def parse_row(row):
+    """
+    Validate one CSV row (keys are lower-cased column names) into Trade field values
+
+    Raises:
+        ImportRowError: Missing required column or unparseable value
+    """
+    values = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+    missing = [column for column in REQUIRED_COLUMNS if not values.get(column)]
+    if missing:
+        raise ImportRowError(f"missing {', '.join(missing)}")
+
+    fields = {'symbol': values['symbol'].upper()[:10], 'trade_type': values['trade_type'].lower()}
+    if fields['trade_type'] not in TRADE_TYPES:
+        raise ImportRowError(f"unknown trade_type {values['trade_type']!r}")
+
+    for column in DATETIME_COLUMNS:
+        if values.get(column):
+            fields[column] = _parse_datetime(values[column])
+    for column in DATE_COLUMNS:
+        if values.get(column):
+            fields[column] = _parse_datetime(values[column]).date()
+    for column in INTEGER_COLUMNS:
+        if values.get(column):
+            fields[column] = _parse_number(values[column], lambda v: int(float(v)))
+    for column in FLOAT_COLUMNS:
+        if values.get(column):
+            fields[column] = _parse_number(values[column], float)
+    for column in TEXT_COLUMNS:
+        if values.get(column):
+            fields[column] = values[column]
+
+    if fields['entry_price'] <= 0 or fields['quantity'] < 1:
+        raise ImportRowError("entry_price and quantity must be positive")
+    if fields['trade_type'] in SPREAD_TYPES and not (fields.get('long_strike') and fields.get('short_strike')):
+        raise ImportRowError("spreads need long_strike and short_strike")
+    return fields
+
+
+def build_trade(user_id, fields):
+    """Transient Trade with option/spread fields set up the same way add_trade does"""
+    trade = Trade(user_id=user_id, **fields)
+    if trade.trade_type == 'option_call':
+        trade.option_type = 'call'
+    elif trade.trade_type == 'option_put':
+        trade.option_type = 'put'
+    elif trade.trade_type in SPREAD_TYPES:
+        trade.is_spread = True
+        trade.spread_type = trade.trade_type
+        trade.option_type = 'put' if 'put' in trade.trade_type else 'call'
+        trade.calculate_spread_metrics()
+    return trade
+
+
+def price_trades(trades):
+    """P&L for a batch: closed trades from their exit, open ones marked from one batched quote request"""
+    open_trades = []
+    for trade in trades:
+        if trade.exit_price is not None:
+            trade.calculate_pnl()
+        else:
+            open_trades.append(trade)
+
+    if open_trades:
+        quotes = fetch_quotes(symbol for trade in open_trades for symbol in trade.get_quote_symbols())
+        for trade in open_trades:
+            trade.calculate_unrealized_pnl(quotes)
+
+
+_TRADE_COLUMNS = frozenset(column.key for column in Trade.__table__.columns)
+
+
+def _trade_row(trade):
+    """Column values for a bulk INSERT (unset columns are left to their defaults)"""
+    return {key: value for key, value in inspect(trade).dict.items()
+            if key in _TRADE_COLUMNS and value is not None}
+
+
+def merge_journals(user_id, trades):
+    """
+    Create or update the journal entry for each entry day of the trades
+
+    Existing entries for all the days are loaded with one query; each day is
+    then merged in memory and added to the session.
+
+    Returns:
+        (created, updated) counts
+    """
+    days = {}
+    for trade in trades:
+        days.setdefault(trade.entry_date.date(), []).append(trade)
+    if not days:
+        return 0, 0
+
+    existing = {journal.journal_date: journal for journal in TradingJournal.query.filter(
+        TradingJournal.user_id == user_id, TradingJournal.journal_date.in_(list(days))
+    )}
+
+    created = updated = 0
+    for day, day_trades in days.items():
+        journal = existing.get(day)
+        if journal is None:
+            journal = TradingJournal.from_trade(day_trades[0])
+            day_trades = day_trades[1:]
+            db.session.add(journal)
+            created += 1
+        else:
+            updated += 1
+        for trade in day_trades:
+            journal.merge_trade(trade)
+    return created, updated
+
+
+def import_chunk(user_id, trades, create_journals=True):
+    """Insert one validated chunk of trades (plus journals and rollups) in a single transaction"""
+    price_trades(trades)
+    try:
+        db.session.execute(db.insert(Trade), [_trade_row(trade) for trade in trades])
+        # Bulk INSERTs skip the flush-time rollup hook, so apply the chunk's contribution here
+        apply_deltas(db.session.connection(), collect_deltas(
+            (None, trade_contribution(trade.user_id, trade.setup_type, trade.exit_price,
+                                      trade.exit_date, trade.entry_date, trade.profit_loss))
+            for trade in trades
+        ))
+        created, updated = merge_journals(user_id, trades) if create_journals else (0, 0)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created, updated
+
+
+def import_trades_csv(stream, user_id, chunk_size=DEFAULT_CHUNK_SIZE, create_journals=True):
+    """
+    Import trades from a CSV text stream
+
+    The header row names the columns (case-insensitive Trade field names;
+    symbol, trade_type, entry_date, entry_price and quantity are required).
+    Invalid rows are skipped and reported; valid rows are committed chunk by
+    chunk, so a failure part-way keeps the chunks already imported.
+
+    Args:
+        stream: Text file object (opened with newline='')
+        user_id: Owner of the imported trades
+        chunk_size: Rows validated and inserted per transaction
+        create_journals: Create/merge a journal entry for each trading day
+
+    Returns:
+        ImportResult
+    """
+    imported = skipped = journals_created = journals_updated = 0
+    errors = []
+    chunk = []
+
+    def flush_chunk():
+        nonlocal imported, journals_created, journals_updated
+        if not chunk:
+            return
+        created, updated = import_chunk(user_id, chunk, create_journals)
+        imported += len(chunk)
+        journals_created += created
+        journals_updated += updated
+        chunk.clear()
+
+    reader = csv.DictReader(stream)
+    for line_number, row in enumerate(reader, start=2):  # Line 1 is the header
+        try:
+            chunk.append(build_trade(user_id, parse_row(row)))
+        except (ImportRowError, TypeError) as e:
+            skipped += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"line {line_number}: {e}")
+            continue
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+    flush_chunk()
+
+    return ImportResult(imported, skipped, journals_created, journals_updated, errors)
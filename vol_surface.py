@@ -0,0 +1,296 @@
+"""
+Implied Volatility Surfaces
+
+Fits a smile per expiration from the cached option chains of a symbol and
+keeps the fits as one small parameter array per symbol: seven floats per
+expiration (expiry, forward, three smile coefficients and the fitted
+moneyness range). IV at any (strike, days to expiration) is interpolated from
+that array in a single vectorized pass, so scenario P&L and marks for strikes
+nobody quotes all read the same surface.
+
+Each expiration is fitted on its own when its chain is fetched, so a refresh
+of one expiry refits one smile and leaves the rest of the surface alone.
+
+Smile model: implied vol is quadratic in log forward moneyness
+k = ln(K / F), fitted by vega-weighted least squares to the out-of-the-money
+calls and puts, and held flat beyond the fitted strikes. Between expirations
+total variance (vol^2 * T) is interpolated linearly in time at fixed
+moneyness; before the first and after the last expiration the vol is flat.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+
+import numpy as np
+
+from config import Config
+from market_data import chain_ivs
+from pricing import bs_price, bs_greeks, DAYS_PER_YEAR
+
+SURFACE_RATE = 0.05
+MIN_SMILE_VOL = 0.01
+MAX_SMILE_VOL = 5.0
+MIN_SMILE_POINTS = 3  # Fewer usable strikes fit a flat smile
+MAX_GRID_STRIKES = 200  # Limits on an IV grid read off a surface
+MAX_GRID_DAYS = 100
+
+# Columns of VolSurface.params
+EXPIRY, FORWARD, C0, C1, C2, K_MIN, K_MAX = range(7)
+
+SmileFit = namedtuple('SmileFit', ['expiration', 'params', 'points', 'rmse', 'fitted_at', 'source'])
+
+
+def _expiry_ordinal(expiration):
+    if isinstance(expiration, str):
+        expiration = datetime.strptime(expiration, '%Y-%m-%d').date()
+    return expiration.toordinal()
+
+
+def _smile_points(calls_df, puts_df, forward):
+    """(strikes, ivs) of the out-of-the-money contracts with a usable IV"""
+    strikes, ivs = [], []
+    for chain_df, otm in ((puts_df, lambda k: k < forward), (calls_df, lambda k: k >= forward)):
+        if chain_df is None or chain_df.empty:
+            continue
+        strike = chain_df['strike'].to_numpy(dtype=float)
+        iv = chain_ivs(chain_df)
+        keep = otm(strike) & np.isfinite(iv) & (iv > MIN_SMILE_VOL) & (iv < MAX_SMILE_VOL)
+        strikes.append(strike[keep])
+        ivs.append(iv[keep])
+    if not strikes:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(strikes), np.concatenate(ivs)
+
+
+def fit_smile(calls_df, puts_df, underlying_price, expiration, rate=SURFACE_RATE, as_of=None):
+    """
+    Fit one expiration's smile
+
+    Args:
+        calls_df, puts_df: Parsed chain sides (strike plus calculated_iv in
+            percent and/or implied_volatility in decimal)
+        underlying_price: Spot when the chain was taken
+        expiration: 'YYYY-MM-DD' or date
+
+    Returns:
+        SmileFit, or None if the expiry has passed or no strike has a usable IV
+    """
+    as_of = as_of or date.today()
+    expiry = _expiry_ordinal(expiration)
+    years = (expiry - as_of.toordinal()) / DAYS_PER_YEAR
+    if years <= 0 or not underlying_price:
+        return None
+
+    forward = underlying_price * np.exp(rate * years)
+    strikes, ivs = _smile_points(calls_df, puts_df, forward)
+    if strikes.size == 0:
+        return None
+
+    k = np.log(strikes / forward)
+    # Vega weights: the wings, where IVs are noisy and cheap to move, count for less
+    weights = np.sqrt(np.maximum(bs_greeks(underlying_price, strikes, years, rate, ivs)['vega'], 1e-8))
+    design = np.stack([np.ones_like(k), k, k * k], axis=1)
+    if strikes.size >= MIN_SMILE_POINTS:
+        coefficients = np.linalg.lstsq(design * weights[:, None], ivs * weights, rcond=None)[0]
+        if coefficients[2] < 0:
+            # A concave smile is an artefact of a few noisy strikes; fall back to a skew line
+            coefficients = np.append(np.linalg.lstsq(design[:, :2] * weights[:, None], ivs * weights,
+                                                     rcond=None)[0], 0.0)
+    else:
+        coefficients = np.array([np.average(ivs, weights=weights), 0.0, 0.0])
+
+    rmse = float(np.sqrt(np.mean((design @ coefficients - ivs) ** 2)))
+    params = np.array([expiry, forward, *coefficients, k.min(), k.max()])
+    return SmileFit(expiration, params, int(strikes.size), rmse, datetime.utcnow(), None)
+
+
+class VolSurface:
+    """Fitted smiles of one symbol, one parameter row per expiration"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.fits = {}  # expiry ordinal -> SmileFit
+        self.params = np.empty((0, 7))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.params)
+
+    def update(self, expiration, calls_df, puts_df, underlying_price, rate=SURFACE_RATE):
+        """
+        Refit one expiration from its chain (other expirations are untouched)
+
+        Returns:
+            True if the smile was refitted; False if it was already fitted from
+            these exact DataFrames or the chain has no usable IVs
+        """
+        expiry = _expiry_ordinal(expiration)
+        current = self.fits.get(expiry)
+        if current is not None and current.source is not None and current.source() is calls_df:
+            return False
+        fit = fit_smile(calls_df, puts_df, underlying_price, expiration, rate)
+        if fit is None:
+            return False
+
+        source = weakref.ref(calls_df) if calls_df is not None else None
+        with self._lock:
+            self.fits[expiry] = fit._replace(source=source)
+            self._rebuild()
+        return True
+
+    def _rebuild(self):
+        """Drop expired smiles and re-stack the parameter rows by expiry"""
+        today = date.today().toordinal()
+        for expiry in [e for e in self.fits if e <= today]:
+            del self.fits[expiry]
+        rows = [self.fits[expiry].params for expiry in sorted(self.fits)]
+        self.params = np.array(rows) if rows else np.empty((0, 7))
+
+    def iv(self, strikes, days):
+        """
+        Implied volatility (decimal) at arbitrary strikes and days to expiration
+
+        strikes and days broadcast against each other. NaN when the surface
+        has no unexpired smiles.
+        """
+        strikes = np.asarray(strikes, dtype=float)
+        days = np.asarray(days, dtype=float)
+        params = self.params  # One consistent snapshot even if an update lands meanwhile
+        shape = np.broadcast_shapes(strikes.shape, days.shape)
+
+        # Smiles expiring today or earlier (until the next refit drops them) have no variance to
+        # interpolate: a zero-year row would make the target 0 and the vol 0/0
+        expiry_years = (params[:, EXPIRY] - date.today().toordinal()) / DAYS_PER_YEAR
+        live = expiry_years > 0
+        params, expiry_years = params[live], expiry_years[live]
+        if len(params) == 0:
+            return np.full(shape, np.nan)
+
+        years = np.maximum(days, 0.0) / DAYS_PER_YEAR
+
+        # Smile of every expiration at every requested strike: (..., expirations)
+        k = np.clip(np.log(strikes[..., None] / params[:, FORWARD]), params[:, K_MIN], params[:, K_MAX])
+        smile = np.maximum(params[:, C0] + params[:, C1] * k + params[:, C2] * k * k, MIN_SMILE_VOL)
+        smile = np.broadcast_to(smile, shape + (len(params),))
+        if len(params) == 1:
+            return smile[..., 0]
+
+        # Linear in total variance between the two expirations around each target
+        upper = np.clip(np.searchsorted(expiry_years, years), 1, len(params) - 1)
+        upper = np.broadcast_to(upper, shape)[..., None]
+        t0, t1 = expiry_years[upper - 1][..., 0], expiry_years[upper][..., 0]
+        v0 = np.take_along_axis(smile, upper - 1, axis=-1)[..., 0]
+        v1 = np.take_along_axis(smile, upper, axis=-1)[..., 0]
+        target = np.clip(np.broadcast_to(years, shape), t0, t1)
+        weight = (target - t0) / (t1 - t0)
+        variance = (1.0 - weight) * v0 * v0 * t0 + weight * v1 * v1 * t1
+        return np.sqrt(variance / target)
+
+    def price(self, underlying_price, strikes, days, option_type='call', rate=SURFACE_RATE):
+        """Black-Scholes prices with each contract's vol read off the surface"""
+        return bs_price(underlying_price, strikes, np.asarray(days, dtype=float) / DAYS_PER_YEAR, rate,
+                        self.iv(strikes, days), option_type)
+
+    def to_dict(self):
+        """Compact JSON form: one row of smile parameters per expiration"""
+        today = date.today().toordinal()
+        return {
+            'symbol': self.symbol,
+            'expirations': [{
+                'expiration': date.fromordinal(int(row[EXPIRY])).isoformat(),
+                'days_to_expiration': int(row[EXPIRY]) - today,
+                'forward': round(float(row[FORWARD]), 4),
+                'coefficients': [round(float(c), 6) for c in row[C0:C2 + 1]],  # vol = c0 + c1*k + c2*k^2
+                'moneyness_range': [round(float(row[K_MIN]), 4), round(float(row[K_MAX]), 4)],
+                'points': fit.points,
+                'rmse': round(fit.rmse, 6),
+                'fitted_at': fit.fitted_at.isoformat()
+            } for row, fit in zip(self.params, (self.fits[e] for e in sorted(self.fits)))]
+        }
+
+
+class VolSurfaceStore:
+    """Thread-safe per-symbol surfaces with LRU eviction"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._surfaces = OrderedDict()
+        self._lock = threading.Lock()
+        self.fits = 0
+        self.skipped = 0
+
+    def get(self, symbol):
+        with self._lock:
+            surface = self._surfaces.get(symbol)
+            if surface is not None:
+                self._surfaces.move_to_end(symbol)
+            return surface
+
+    def update(self, symbol, expiration, calls_df, puts_df, underlying_price, rate=SURFACE_RATE):
+        """Refit one expiration of a symbol's surface from a freshly parsed chain"""
+        with self._lock:
+            surface = self._surfaces.get(symbol)
+            if surface is None:
+                surface = self._surfaces[symbol] = VolSurface(symbol)
+            self._surfaces.move_to_end(symbol)
+            while len(self._surfaces) > self.maxsize:
+                self._surfaces.popitem(last=False)
+
+        refitted = surface.update(expiration, calls_df, puts_df, underlying_price, rate)
+        with self._lock:
+            if refitted:
+                self.fits += 1
+            else:
+                self.skipped += 1
+        return refitted
+
+    def clear(self):
+        with self._lock:
+            self._surfaces.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'symbols': len(self._surfaces),
+                'maxsize': self.maxsize,
+                'expirations': sum(len(surface) for surface in self._surfaces.values()),
+                'fits': self.fits,
+                'skipped': self.skipped
+            }
+
+
+# Fitted surfaces: symbol -> VolSurface, refitted one expiration at a time as chains are fetched
+vol_surfaces = VolSurfaceStore(maxsize=Config.VOL_SURFACE_MAXSIZE)
+
+
+def surface_marks(legs, underlying_prices, surfaces=vol_surfaces, rate=SURFACE_RATE):
+    """
+    Model prices for option legs nobody quotes, read off each symbol's surface
+
+    Args:
+        legs: Iterable of (contract, symbol, expiration date, option_type, strike)
+        underlying_prices: Dict of symbol -> price
+        surfaces: VolSurfaceStore (the shared one by default)
+
+    Returns:
+        Dict of contract -> price for the legs whose symbol has a surface and a quote
+    """
+    by_symbol = {}
+    for leg in legs:
+        by_symbol.setdefault(leg[1], []).append(leg)
+
+    today = date.today()
+    marks = {}
+    for symbol, symbol_legs in by_symbol.items():
+        surface = surfaces.get(symbol)
+        spot = underlying_prices.get(symbol)
+        if surface is None or not len(surface) or not spot:
+            continue
+        contracts, _, expirations, option_types, strikes = zip(*symbol_legs)
+        days = [(expiration - today).days for expiration in expirations]
+        prices = surface.price(spot, list(strikes), days, list(option_types), rate)
+        marks.update((contract, float(price)) for contract, price in zip(contracts, prices)
+                     if np.isfinite(price) and price > 0)
+    return marks